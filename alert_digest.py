@@ -0,0 +1,348 @@
+"""
+Alert coalescing before email fan-out
+
+Flight, budget and rebooking alerts are buffered per (user, trip) for a
+short window and then sent as one digest email instead of one email per
+event. Within a window a newer alert about the same subject (the same
+flight, the trip budget, the same original flight's rebooking) replaces
+the older one, so a flapping delay ends up as its latest state only.
+Critical alerts close the window at once.
+
+Pending alerts live in SQLite, so a restart does not lose them. Due
+groups are claimed for claim_ttl seconds while they are sent and only
+deleted once the email went out; a failed send releases them for the
+next flush, and a crash mid-send lets the claim expire.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import sqlite3
+import threading
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIGEST_DB = os.getenv("ALERT_DIGEST_DB", "alert_digest.db")
+
+KIND_FLIGHT = 'flight'
+KIND_BUDGET = 'budget'
+KIND_REBOOKING = 'rebooking'
+
+
+class AlertDigester:
+    """Buffers alerts per (user, trip) and emails one digest per window"""
+
+    def __init__(self, email_service, window: float = 600.0,
+                 db_path: Optional[str] = None,
+                 flush_interval: Optional[float] = None,
+                 claim_ttl: float = 300.0):
+        """
+        Args:
+            email_service: EmailService used for the single alert / digest emails
+            window: Seconds from a group's first alert until it is sent
+            db_path: SQLite file, defaults to $ALERT_DIGEST_DB
+            flush_interval: How often the background thread checks for due
+                groups (default: window / 10, at least 1s)
+            claim_ttl: Seconds a group being sent stays claimed before
+                another flush may take it over (e.g. after a crash)
+        """
+        self.email_service = email_service
+        self.window = window
+        self.db_path = db_path or DEFAULT_DIGEST_DB
+        self.flush_interval = flush_interval or max(1.0, window / 10)
+        self.claim_ttl = claim_ttl
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats = {'alerts': 0, 'superseded': 0, 'emails': 0}
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize pending alert table"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pending_alerts (
+            user_email TEXT NOT NULL,
+            trip_key TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            subject_key TEXT NOT NULL,
+            user_name TEXT,
+            trip_name TEXT,
+            payload TEXT NOT NULL,
+            severity TEXT,
+            due_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            claimed_by TEXT,
+            claimed_until REAL,
+            PRIMARY KEY (user_email, trip_key, kind, subject_key)
+        )
+        """)
+        # Databases created before send claims lack the claim columns
+        columns = [row['name'] for row in cursor.execute("PRAGMA table_info(pending_alerts)")]
+        if 'claimed_by' not in columns:
+            cursor.execute("ALTER TABLE pending_alerts ADD COLUMN claimed_by TEXT")
+            cursor.execute("ALTER TABLE pending_alerts ADD COLUMN claimed_until REAL")
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pending_alerts_due
+        ON pending_alerts (due_at)
+        """)
+        conn.commit()
+        conn.close()
+
+    def add(self, to_email: str, user_name: str, trip_key: str, kind: str,
+            subject_key: str, payload: Dict, severity: str = 'info',
+            trip_name: Optional[str] = None, now: Optional[float] = None):
+        """
+        Buffer one alert
+
+        Args:
+            to_email: Recipient
+            user_name: Greeting name
+            trip_key: Trip id (or any stable trip identifier)
+            kind: KIND_FLIGHT, KIND_BUDGET or KIND_REBOOKING
+            subject_key: What the alert is about; a newer alert with the same
+                (kind, subject_key) supersedes the pending one
+            payload: Arguments for the alert's email (kept as JSON)
+            severity: 'critical' sends the whole group without waiting
+        """
+        now = time.time() if now is None else now
+        trip_key = str(trip_key)
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # The group keeps the due time of its first pending alert
+            # (alerts being sent right now belong to the previous window)
+            row = conn.execute("""
+            SELECT MIN(due_at) FROM pending_alerts
+            WHERE user_email = ? AND trip_key = ? AND claimed_by IS NULL
+            """, (to_email, trip_key)).fetchone()
+            due_at = row[0] if row[0] is not None else now + self.window
+            if severity == 'critical':
+                due_at = now
+
+            # Superseding a claimed alert releases it, so the send in
+            # flight does not delete the newer state
+            cursor = conn.execute("""
+            UPDATE pending_alerts SET payload = ?, severity = ?, user_name = ?,
+                trip_name = COALESCE(?, trip_name), updated_at = ?,
+                claimed_by = NULL, claimed_until = NULL
+            WHERE user_email = ? AND trip_key = ? AND kind = ? AND subject_key = ?
+            """, (json.dumps(payload), severity, user_name, trip_name, now,
+                  to_email, trip_key, kind, subject_key))
+            if cursor.rowcount:
+                self.stats['superseded'] += 1
+            else:
+                conn.execute("""
+                INSERT INTO pending_alerts
+                    (user_email, trip_key, kind, subject_key, user_name, trip_name,
+                     payload, severity, due_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (to_email, trip_key, kind, subject_key, user_name, trip_name,
+                      json.dumps(payload), severity, due_at, now, now))
+            conn.execute("""
+            UPDATE pending_alerts SET due_at = ?
+            WHERE user_email = ? AND trip_key = ? AND claimed_by IS NULL
+            """, (due_at, to_email, trip_key))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self.stats['alerts'] += 1
+        if severity == 'critical':
+            self._wake.set()
+
+    # Drop-in counterparts of the EmailService alert methods
+
+    def send_flight_alert(self, to_email: str, user_name: str, alert_type: str,
+                          flight_info: dict, message: str, trip_id=None) -> bool:
+        severity = alert_type.split('_')[0] if '_' in alert_type else 'info'
+        flight_number = flight_info.get('flight_number', '')
+        self.add(to_email, user_name, trip_id or flight_number, KIND_FLIGHT, flight_number,
+                 {'alert_type': alert_type, 'flight_info': flight_info, 'message': message},
+                 severity=severity)
+        return True
+
+    def send_budget_alert(self, to_email: str, user_name: str, trip_name: str,
+                          budget: float, current_cost: float, over_budget: bool,
+                          trip_id=None) -> bool:
+        self.add(to_email, user_name, trip_id or trip_name, KIND_BUDGET, 'budget',
+                 {'trip_name': trip_name, 'budget': budget,
+                  'current_cost': current_cost, 'over_budget': over_budget},
+                 severity='warning' if over_budget else 'info', trip_name=trip_name)
+        return True
+
+    def add_rebooking(self, to_email: str, user_name: str, trip_id, subject: str,
+                      html_body: str, summary: str, original_flight: str,
+                      link: Optional[str] = None,
+                      calendar_update: Optional[bytes] = None) -> bool:
+        """
+        Buffer a rebooking suggestion (the newest per original flight wins)
+
+        Args:
+            calendar_update: trip-update.ics delta attached to the email that
+                carries this suggestion
+        """
+        self.add(to_email, user_name, trip_id or original_flight, KIND_REBOOKING, original_flight,
+                 {'subject': subject, 'html_body': html_body, 'summary': summary, 'link': link,
+                  'calendar_update': calendar_update.decode('utf-8') if calendar_update else None},
+                 severity='warning')
+        return True
+
+    def _claim_due(self, now: float, token: str) -> Dict[tuple, List[Dict]]:
+        """Claim and return due groups: (user_email, trip_key) -> alerts"""
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("""
+            SELECT * FROM pending_alerts
+            WHERE due_at <= ? AND (claimed_by IS NULL OR claimed_until < ?)
+            ORDER BY created_at
+            """, (now, time.time())).fetchall()
+            conn.executemany("""
+            UPDATE pending_alerts SET claimed_by = ?, claimed_until = ?
+            WHERE user_email = ? AND trip_key = ? AND kind = ? AND subject_key = ?
+            """, [(token, time.time() + self.claim_ttl, row['user_email'], row['trip_key'],
+                   row['kind'], row['subject_key']) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        groups: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            alert = dict(row)
+            alert['payload'] = json.loads(alert['payload'])
+            groups.setdefault((alert['user_email'], alert['trip_key']), []).append(alert)
+        return groups
+
+    def _settle(self, token: str, user_email: str, trip_key: str, sent: bool):
+        """Delete a claimed group after a successful send, else release it"""
+        conn = self.get_connection()
+        if sent:
+            conn.execute("""
+            DELETE FROM pending_alerts WHERE claimed_by = ? AND user_email = ? AND trip_key = ?
+            """, (token, user_email, trip_key))
+        else:
+            conn.execute("""
+            UPDATE pending_alerts SET claimed_by = NULL, claimed_until = NULL
+            WHERE claimed_by = ? AND user_email = ? AND trip_key = ?
+            """, (token, user_email, trip_key))
+        conn.commit()
+        conn.close()
+
+    def _send_single(self, alert: Dict, key: str) -> bool:
+        p = alert['payload']
+        if alert['kind'] == KIND_FLIGHT:
+            return self.email_service.send_flight_alert(
+                alert['user_email'], alert['user_name'], p['alert_type'],
+                p['flight_info'], p['message'], idempotency_key=key)
+        if alert['kind'] == KIND_BUDGET:
+            return self.email_service.send_budget_alert(
+                alert['user_email'], alert['user_name'], p['trip_name'], p['budget'],
+                p['current_cost'], p['over_budget'], idempotency_key=key)
+        return self.email_service.send_email(alert['user_email'], p['subject'], p['html_body'],
+                                             self._attachments([alert]), idempotency_key=key)
+
+    @staticmethod
+    def _attachments(alerts: List[Dict]) -> Optional[List[Dict]]:
+        """Calendar deltas of the rebooking alerts in a group, as email attachments"""
+        updates = [a['payload']['calendar_update'] for a in alerts
+                   if a['kind'] == KIND_REBOOKING and a['payload'].get('calendar_update')]
+        return [{'filename': 'trip-update.ics' if i == 0 else f'trip-update-{i + 1}.ics',
+                 'content': update.encode('utf-8')}
+                for i, update in enumerate(updates)] or None
+
+    @staticmethod
+    def _idempotency_key(user_email: str, trip_key: str, alerts: List[Dict]) -> str:
+        """
+        Same key for a retry of the same alerts; a superseded alert (new
+        updated_at) gets a new key, so the outbox does not drop it as a duplicate
+        """
+        versions = sorted(f"{a['kind']}|{a['subject_key']}|{a['updated_at']!r}" for a in alerts)
+        digest = hashlib.sha1("\n".join(versions).encode('utf-8')).hexdigest()[:16]
+        return f"digest:{user_email}:{trip_key}:{digest}"
+
+    def flush_due(self, now: Optional[float] = None) -> int:
+        """Send every group whose window has closed; returns emails sent"""
+        now = time.time() if now is None else now
+        token = f"digest:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        sent = 0
+        for (user_email, trip_key), alerts in self._claim_due(now, token).items():
+            key = self._idempotency_key(user_email, trip_key, alerts)
+            try:
+                if len(alerts) == 1:
+                    ok = self._send_single(alerts[0], key)
+                else:
+                    trip_name = next((a['trip_name'] for a in alerts if a['trip_name']), trip_key)
+                    ok = self.email_service.send_alert_digest(
+                        user_email, alerts[-1]['user_name'], trip_name, alerts,
+                        attachments=self._attachments(alerts), idempotency_key=key)
+            except Exception as e:
+                logger.error(f"Alert digest to {user_email} for {trip_key} raised: {e}")
+                ok = False
+            self._settle(token, user_email, trip_key, ok)
+            if ok:
+                sent += 1
+            else:
+                logger.error(f"Alert digest to {user_email} for {trip_key} failed "
+                             f"({len(alerts)} alerts kept for the next flush)")
+        self.stats['emails'] += sent
+        return sent
+
+    def flush_all(self) -> int:
+        """Send everything pending regardless of window (e.g. at shutdown)"""
+        return self.flush_due(now=float('inf'))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.flush_due()
+            except Exception as e:
+                logger.error(f"Alert digest flush failed: {e}")
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background flush thread (idempotent)"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="alert-digest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+# Singleton instance
+_alert_digester = None
+
+def get_alert_digester() -> AlertDigester:
+    """Get singleton digester (window from $ALERT_DIGEST_WINDOW seconds), started"""
+    global _alert_digester
+    if _alert_digester is None:
+        from email_service import get_email_service
+        _alert_digester = AlertDigester(get_email_service(),
+                                        window=float(os.getenv("ALERT_DIGEST_WINDOW", "600")))
+        _alert_digester.start()
+    return _alert_digester
@@ -18,7 +18,6 @@ import time
 import uuid
 import sqlite3
 import datetime
-from io import BytesIO
 from typing import Tuple, Optional, Dict, List, Any
 
 import streamlit as st
@@ -42,16 +41,9 @@ from monitoring_agent import get_monitoring_agent
 from payment_service import VirtualPaymentService
 
 # ---- PDF deps ----
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_CENTER
-    REPORTLAB = True
-except Exception:
-    REPORTLAB = False
+from pdf_renderer import REPORTLAB, get_pdf_renderer
+from artifact_store import get_artifact_store
+from trip_calendar import build_calendar, stored_trip_calendar
 
 # =========================
 # Presence / Online Counter
@@ -845,123 +837,36 @@ def parse_agent_output(raw_text: str) -> Tuple[str, Optional[Dict]]:
 
     return plan_md, payload
 
-def build_beautiful_pdf(plan_md: str, meta: Dict, actions: List[Dict], budget_status: Optional[Dict] = None) -> bytes:
-    if not REPORTLAB:
-        return b""
-
-    buf = BytesIO()
-    doc = SimpleDocTemplate(
-        buf,
-        pagesize=A4,
-        leftMargin=0.65 * inch,
-        rightMargin=0.65 * inch,
-        topMargin=0.65 * inch,
-        bottomMargin=0.65 * inch
-    )
+def pdf_action_rows(actions: List[Dict]) -> List[List[str]]:
+    rows = []
+    for a in actions:
+        ttype = (a.get("type") or "").lower()
+        if ttype == "hotel":
+            time_notes = f"{a.get('check_in','')}→{a.get('check_out','')}  {a.get('nights','')} nights"
+        else:
+            time_notes = (str(a.get("departure_time_local") or a.get("departure") or "") + " " + str(a.get("duration") or "")).strip()
 
-    styles = getSampleStyleSheet()
-    title = ParagraphStyle("title", parent=styles["Title"], alignment=TA_CENTER, fontSize=20, spaceAfter=14)
-    h2 = ParagraphStyle("h2", parent=styles["Heading2"], fontSize=13, spaceAfter=8)
-    normal = ParagraphStyle("normal", parent=styles["BodyText"], fontSize=10.5, leading=14)
-
-    story = []
-    story.append(Paragraph("MyAgent Booking — Travel Itinerary", title))
-    story.append(Paragraph(
-        f"<b>Destination:</b> {meta.get('destination_city','')} &nbsp;&nbsp; "
-        f"<b>From:</b> {meta.get('origin_city','')}<br/>"
-        f"<b>Depart:</b> {meta.get('depart_date','')} &nbsp;&nbsp; "
-        f"<b>Return:</b> {meta.get('return_date','')}",
-        normal
-    ))
-    story.append(Spacer(1, 10))
-
-    if budget_status:
-        story.append(Paragraph("Budget Summary", h2))
-        story.append(Paragraph(
-            f"<b>Total:</b> ${budget_status.get('total_budget',0):.2f} &nbsp;&nbsp; "
-            f"<b>Spent:</b> ${budget_status.get('used',0):.2f} &nbsp;&nbsp; "
-            f"<b>Remaining:</b> ${budget_status.get('remaining',0):.2f} &nbsp;&nbsp; "
-            f"<b>Usage:</b> {budget_status.get('percentage',0):.1f}%",
-            normal
-        ))
-        story.append(Spacer(1, 10))
-
-    story.append(Paragraph("Itinerary (AI Plan)", h2))
-    safe_text = (
-        plan_md.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-    )
-    safe_text = "<br/>".join([line.strip() for line in safe_text.splitlines()])
-    story.append(Paragraph(safe_text, normal))
-    story.append(Spacer(1, 14))
-
-    if actions:
-        story.append(Paragraph("Bookings / Actions", h2))
-        table_data = [["Type", "Title", "Price", "Time/Notes"]]
-        for a in actions:
-            ttype = (a.get("type") or "").lower()
-            if ttype == "hotel":
-                time_notes = f"{a.get('check_in','')}→{a.get('check_out','')}  {a.get('nights','')} nights"
-            else:
-                time_notes = (str(a.get("departure_time_local") or a.get("departure") or "") + " " + str(a.get("duration") or "")).strip()
-
-            table_data.append([
-                str(a.get("type", "")),
-                str(a.get("title", ""))[:60],
-                format_usd(get_total_price(a)),
-                time_notes[:70]
-            ])
-
-        tbl = Table(table_data, colWidths=[0.9*inch, 3.2*inch, 1.1*inch, 1.8*inch])
-        tbl.setStyle(TableStyle([
-            ("BACKGROUND", (0,0), (-1,0), colors.HexColor("#667eea")),
-            ("TEXTCOLOR", (0,0), (-1,0), colors.white),
-            ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-            ("FONTSIZE", (0,0), (-1,0), 10),
-            ("ROWBACKGROUNDS", (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey]),
-            ("GRID", (0,0), (-1,-1), 0.25, colors.grey),
-            ("VALIGN", (0,0), (-1,-1), "TOP"),
-            ("FONTSIZE", (0,1), (-1,-1), 9.5),
-            ("LEFTPADDING", (0,0), (-1,-1), 6),
-            ("RIGHTPADDING", (0,0), (-1,-1), 6),
-            ("TOPPADDING", (0,0), (-1,-1), 6),
-            ("BOTTOMPADDING", (0,0), (-1,-1), 6),
-        ]))
-        story.append(tbl)
-
-    doc.build(story)
-    return buf.getvalue()
+        rows.append([
+            str(a.get("type", "")),
+            str(a.get("title", ""))[:60],
+            format_usd(get_total_price(a)),
+            time_notes[:70]
+        ])
+    return rows
+
+def submit_itinerary_pdf(plan_md: str, meta: Dict, actions: List[Dict], budget_status: Optional[Dict] = None, trip_id=None):
+    """Start the PDF in a render worker (cached per content hash); returns a Future"""
+    return get_pdf_renderer().submit(plan_md, meta, actions, budget_status, rows=pdf_action_rows(actions), trip_id=trip_id)
+
+def build_beautiful_pdf(plan_md: str, meta: Dict, actions: List[Dict], budget_status: Optional[Dict] = None) -> bytes:
+    return submit_itinerary_pdf(plan_md, meta, actions, budget_status).result()
 
 def build_ics(meta: Dict, actions: List[Dict]) -> bytes:
-    dtstamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-
-    def ymd(d: str) -> str:
-        return d.replace("-", "") if d else ""
-
-    dest = meta.get("destination_city", "Trip")
-    depart = ymd(meta.get("depart_date", ""))
-    ret = ymd(meta.get("return_date", ""))
-
-    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//MyAgentBooking//EN"]
-    if depart:
-        lines += [
-            "BEGIN:VEVENT",
-            f"UID:depart-{dtstamp}@myagentbooking",
-            f"DTSTAMP:{dtstamp}",
-            f"DTSTART;VALUE=DATE:{depart}",
-            f"SUMMARY:Depart for {dest}",
-            "END:VEVENT",
-        ]
-    if ret:
-        lines += [
-            "BEGIN:VEVENT",
-            f"UID:return-{dtstamp}@myagentbooking",
-            f"DTSTAMP:{dtstamp}",
-            f"DTSTART;VALUE=DATE:{ret}",
-            f"SUMMARY:Return from {dest}",
-            "END:VEVENT",
-        ]
-    lines.append("END:VCALENDAR")
-    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+    return build_calendar(meta, actions)[0]
+
+def export_ics(meta: Dict, actions: List[Dict], trip_id=None) -> bytes:
+    """Trip calendar through the artifact store (unchanged trips are read back, not rebuilt)"""
+    return stored_trip_calendar(meta, actions, trip_id, get_artifact_store())
 
 # =========================
 # Location helper (IP-based)
@@ -1369,7 +1274,7 @@ def new_trip_page():
                         depart_date=meta.get("depart_date", ""),
                         return_date=meta.get("return_date", ""),
                         budget=budget,
-                        itinerary_json=json.dumps(payload)
+                        itinerary_json=json.dumps({**payload, "plan_md": plan_md})
                     )
                     st.session_state.current_trip_id = trip_id
 
@@ -1393,6 +1298,11 @@ def new_trip_page():
         meta = payload.get("meta", {})
         actions = payload.get("actions", [])
 
+        # Render the PDF off the script thread while the tabs draw
+        budget_status = budget_tracker.get_budget_status() if budget_tracker else None
+        pdf_future = submit_itinerary_pdf(plan_md, meta, actions, budget_status=budget_status,
+                                          trip_id=st.session_state.get("current_trip_id"))
+
         if budget_tracker:
             render_budget_tracker_glass(budget_tracker)
 
@@ -1652,9 +1562,8 @@ def new_trip_page():
             st.markdown(t("export_title"))
             col1, col2, col3 = st.columns(3)
 
-            budget_status = budget_tracker.get_budget_status() if budget_tracker else None
-            pdf_bytes = build_beautiful_pdf(plan_md, meta, actions, budget_status=budget_status)
-            ics_bytes = build_ics(meta, actions)
+            pdf_bytes = pdf_future.result()
+            ics_bytes = export_ics(meta, actions, trip_id=st.session_state.get("current_trip_id"))
 
             with col1:
                 if REPORTLAB and pdf_bytes:
@@ -1711,6 +1620,16 @@ def trip_history_page():
             with c3:
                 st.metric("Status", trip["status"].title())
 
+                artifacts = get_artifact_store()
+                saved_pdf = artifacts.get_for_trip(trip["id"], "pdf")
+                saved_ics = artifacts.get_for_trip(trip["id"], "ics")
+                if saved_pdf:
+                    st.download_button(t("dl_pdf"), data=saved_pdf, file_name="itinerary.pdf",
+                                       mime="application/pdf", key=f"pdf_{trip['id']}")
+                if saved_ics:
+                    st.download_button(t("dl_ics"), data=saved_ics, file_name="trip.ics",
+                                       mime="text/calendar", key=f"ics_{trip['id']}")
+
                 if trip["status"] == "ongoing":
                     flight_num = st.text_input(t("track_external"), key=f"flight_{trip['id']}", placeholder="e.g., UA123")
                     if st.button(t("add_monitoring"), key=f"btn_{trip['id']}"):
@@ -0,0 +1,256 @@
+"""
+Content-addressed store for exported artifacts (PDF, ICS, ...)
+
+Artifacts are keyed by a sha256 of the normalized itinerary payload plus
+export options, so an unchanged trip maps to the same key on every
+export, rerun and email re-send. Bytes live in files under the store
+root (one file per key, sharded by prefix); a SQLite index tracks sizes
+and last access for size-bounded LRU eviction, and which artifacts belong
+to which trip_history id.
+
+A hit costs one hash and one file read.
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", "artifacts")
+DEFAULT_MAX_BYTES = int(float(os.getenv("ARTIFACT_STORE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def artifact_key(kind: str, payload: Any, options: Optional[Dict] = None) -> str:
+    """Stable sha256 of (kind, payload, options); dict order does not matter"""
+    normalized = json.dumps({'kind': kind, 'payload': payload, 'options': options or {}},
+                            sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class ArtifactStore:
+    """Disk-backed artifact cache with LRU eviction and per-trip lookup"""
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None,
+                 touch_interval: float = 60.0):
+        """
+        Args:
+            root: Directory for artifact files and the index, defaults to $ARTIFACT_STORE_DIR
+            max_bytes: Evict least recently used artifacts above this total size
+            touch_interval: Minimum seconds between last-access updates of one
+                artifact (keeps hits from writing to the index every time)
+        """
+        self.root = root or DEFAULT_STORE_DIR
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.touch_interval = touch_interval
+        self.db_path = os.path.join(self.root, "index.db")
+        self._touched: Dict[str, float] = {}
+        self._links: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+        os.makedirs(self.root, exist_ok=True)
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize artifact index tables"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artifacts (
+            key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artifacts_last_access
+        ON artifacts (last_access)
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS trip_artifacts (
+            trip_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (trip_id, kind)
+        )
+        """)
+        conn.commit()
+        conn.close()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _touch(self, key: str, now: float):
+        with self._lock:
+            if now - self._touched.get(key, 0) < self.touch_interval:
+                return
+            self._touched[key] = now
+        conn = self.get_connection()
+        conn.execute("UPDATE artifacts SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        conn.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Artifact bytes, or None if not stored (or evicted)"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        try:
+            self._touch(key, time.time())
+        except sqlite3.Error as e:
+            logger.warning(f"Artifact access time not updated: {e}")
+        return data
+
+    def put(self, key: str, kind: str, data: bytes, trip_id=None):
+        """Store an artifact (atomic file replace) and evict down to max_bytes"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+            INSERT INTO artifacts (key, kind, size, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET size = excluded.size, last_access = excluded.last_access
+            """, (key, kind, len(data), now, now))
+            if trip_id is not None:
+                self._link(conn, trip_id, kind, key, now)
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._touched[key] = now
+            if trip_id is not None:
+                self._links[(str(trip_id), kind)] = key
+        self.stats['writes'] += 1
+        self._evict()
+
+    def _link(self, conn, trip_id, kind: str, key: str, now: float):
+        conn.execute("""
+        INSERT INTO trip_artifacts (trip_id, kind, key, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT(trip_id, kind) DO UPDATE SET key = excluded.key, updated_at = excluded.updated_at
+        """, (str(trip_id), kind, key, now))
+
+    def link_trip(self, trip_id, kind: str, key: str):
+        """Record `key` as the current `kind` artifact of a trip_history row"""
+        with self._lock:
+            if self._links.get((str(trip_id), kind)) == key:
+                return
+            self._links[(str(trip_id), kind)] = key
+        conn = self.get_connection()
+        try:
+            self._link(conn, trip_id, kind, key, time.time())
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_or_create(self, kind: str, payload: Any, builder: Callable[[], bytes],
+                      options: Optional[Dict] = None, trip_id=None) -> bytes:
+        """
+        Return the stored artifact for (kind, payload, options) or build and store it
+
+        Args:
+            kind: Artifact kind, e.g. 'pdf' or 'ics'
+            payload: Normalizable itinerary content the artifact is built from
+            builder: Called on a miss; returns the artifact bytes
+            options: Export options that change the output (layout version, locale, ...)
+            trip_id: trip_history id to link the artifact to
+        """
+        key = artifact_key(kind, payload, options)
+        data = self.get(key)
+        if data is None:
+            data = builder()
+            self.put(key, kind, data, trip_id=trip_id)
+        elif trip_id is not None:
+            self.link_trip(trip_id, kind, key)
+        return data
+
+    def get_trip_key(self, trip_id, kind: str) -> Optional[str]:
+        conn = self.get_connection()
+        row = conn.execute("SELECT key FROM trip_artifacts WHERE trip_id = ? AND kind = ?",
+                           (str(trip_id), kind)).fetchone()
+        conn.close()
+        return row['key'] if row else None
+
+    def get_for_trip(self, trip_id, kind: str) -> Optional[bytes]:
+        """Latest `kind` artifact exported for a trip_history id"""
+        key = self.get_trip_key(trip_id, kind)
+        return self.get(key) if key else None
+
+    def total_bytes(self) -> int:
+        conn = self.get_connection()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        conn.close()
+        return total
+
+    def _evict(self):
+        """Drop least recently used artifacts until the store fits max_bytes"""
+        conn = self.get_connection()
+        try:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for row in conn.execute("SELECT key, size FROM artifacts ORDER BY last_access"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(row['key'])
+                total -= row['size']
+            conn.executemany("DELETE FROM artifacts WHERE key = ?", [(k,) for k in victims])
+            conn.executemany("DELETE FROM trip_artifacts WHERE key = ?", [(k,) for k in victims])
+            conn.commit()
+        finally:
+            conn.close()
+
+        for key in victims:
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            dropped = set(victims)
+            for key in victims:
+                self._touched.pop(key, None)
+            self._links = {link: key for link, key in self._links.items() if key not in dropped}
+        self.stats['evicted'] += len(victims)
+        logger.info(f"Evicted {len(victims)} artifacts from {self.root}")
+
+
+# Singleton instance
+_artifact_store = None
+
+def get_artifact_store() -> ArtifactStore:
+    """Get singleton artifact store ($ARTIFACT_STORE_DIR, $ARTIFACT_STORE_MAX_MB)"""
+    global _artifact_store
+    if _artifact_store is None:
+        _artifact_store = ArtifactStore()
+    return _artifact_store
@@ -0,0 +1,465 @@
+"""
+Offline prebuilt attraction index
+
+Build once from a local OSM extract (Overpass JSON, GeoJSON or .osm.pbf
+with pyosmium installed) plus an optional Wikipedia pageviews dump, then
+query by city or bounding box with no network at all.
+
+The index is a single binary file opened with mmap:
+
+    header | city table | attraction records | UTF-8 string blob
+
+Records are fixed-size and grouped by city (most popular first), so a
+city lookup is a dict hit plus a contiguous slice of the mapped file.
+
+Usage:
+    python attraction_index.py build --osm extract.json --out attractions.idx
+    python attraction_index.py build --osm planet.osm.pbf --pageviews pageviews-2025 --out attractions.idx
+    python attraction_index.py query --index attractions.idx --city Tokyo
+"""
+import os
+import sys
+import json
+import math
+import mmap
+import struct
+import argparse
+import logging
+from typing import Dict, List, Optional, Tuple, Iterator
+
+try:
+    import numpy as np
+    NUMPY = True
+except Exception:
+    NUMPY = False
+
+try:
+    import osmium
+    OSMIUM = True
+except Exception:
+    OSMIUM = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.getenv("ATTRACTION_INDEX_PATH", "attractions.idx")
+
+MAGIC = b"MAIX"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQQQQ")  # magic, version, n_records, n_cities, offsets...
+CITY = struct.Struct("<IHxxIIffffff")  # name_off, name_len, start, count, bbox(4), center(2)
+RECORD = struct.Struct("<fffIIHBx")  # lat, lon, popularity, city_id, name_off, name_len, category
+
+# Category ids are stored in one byte
+CATEGORIES = [
+    'attraction', 'museum', 'gallery', 'viewpoint', 'artwork', 'zoo',
+    'theme_park', 'aquarium', 'monument', 'historic', 'castle',
+    'religious', 'park', 'garden', 'landmark',
+]
+CATEGORY_ID = {name: i for i, name in enumerate(CATEGORIES)}
+
+# Base popularity prior by category
+CATEGORY_WEIGHT = {
+    'museum': 3.0, 'zoo': 3.0, 'theme_park': 3.0, 'aquarium': 2.5,
+    'castle': 2.5, 'landmark': 2.5, 'viewpoint': 2.0, 'gallery': 2.0,
+    'monument': 2.0, 'religious': 1.5, 'park': 1.5, 'garden': 1.5,
+    'historic': 1.0, 'artwork': 0.5, 'attraction': 2.0,
+}
+
+CITY_PLACES = {'city', 'town'}
+MAX_CITY_DISTANCE_KM = 40.0
+
+
+def normalize_city(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+def classify_tags(tags: Dict[str, str]) -> Optional[str]:
+    """Map OSM tags to an index category, or None if not an attraction"""
+    tourism = tags.get('tourism')
+    if tourism in CATEGORY_ID:
+        return tourism
+    if tourism == 'attraction':
+        return 'attraction'
+    if tags.get('amenity') == 'place_of_worship' and (tags.get('wikipedia') or tags.get('wikidata')):
+        return 'religious'
+    historic = tags.get('historic')
+    if historic in ('castle', 'fort'):
+        return 'castle'
+    if historic in ('monument', 'memorial'):
+        return 'monument'
+    if historic:
+        return 'historic'
+    if tags.get('leisure') == 'park' and tags.get('wikidata'):
+        return 'park'
+    if tags.get('leisure') == 'garden' and tags.get('wikidata'):
+        return 'garden'
+    if tags.get('man_made') in ('tower', 'lighthouse') and tags.get('wikidata'):
+        return 'landmark'
+    return None
+
+
+# =========================
+# Input readers
+# =========================
+def _iter_overpass_json(data: Dict) -> Iterator[Tuple[Dict, float, float]]:
+    for el in data.get('elements', []):
+        tags = el.get('tags') or {}
+        if 'lat' in el:
+            yield tags, el['lat'], el['lon']
+        elif el.get('center'):
+            yield tags, el['center']['lat'], el['center']['lon']
+
+
+def _iter_geojson(data: Dict) -> Iterator[Tuple[Dict, float, float]]:
+    for feature in data.get('features', []):
+        geom = feature.get('geometry') or {}
+        coords = geom.get('coordinates')
+        if not coords:
+            continue
+        # Reduce lines/polygons to the mean of their first ring
+        while isinstance(coords[0], list) and isinstance(coords[0][0], list):
+            coords = coords[0]
+        if isinstance(coords[0], list):
+            lon = sum(c[0] for c in coords) / len(coords)
+            lat = sum(c[1] for c in coords) / len(coords)
+        else:
+            lon, lat = coords[0], coords[1]
+        yield feature.get('properties') or {}, lat, lon
+
+
+def _iter_pbf(path: str) -> Iterator[Tuple[Dict, float, float]]:
+    if not OSMIUM:
+        raise RuntimeError("Reading .pbf extracts requires pyosmium (pip install osmium)")
+
+    items = []
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            if 'name' in n.tags and ('place' in n.tags or classify_tags(dict(n.tags))):
+                items.append((dict(n.tags), n.location.lat, n.location.lon))
+
+        def area(self, a):
+            if 'name' not in a.tags or not classify_tags(dict(a.tags)):
+                return
+            try:
+                ring = next(iter(a.outer_rings()))
+                pts = [(p.lat, p.lon) for p in ring]
+            except Exception:
+                return
+            if pts:
+                items.append((dict(a.tags), sum(p[0] for p in pts) / len(pts),
+                              sum(p[1] for p in pts) / len(pts)))
+
+    Handler().apply_file(path, locations=True)
+    return iter(items)
+
+
+def read_osm_features(path: str) -> Iterator[Tuple[Dict, float, float]]:
+    """Yield (tags, lat, lon) from an Overpass JSON, GeoJSON or PBF file"""
+    if path.endswith('.pbf'):
+        return _iter_pbf(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('type') == 'FeatureCollection':
+        return _iter_geojson(data)
+    return _iter_overpass_json(data)
+
+
+def read_pageviews(path: str, project: str = "en.wikipedia") -> Dict[str, int]:
+    """
+    Read a Wikimedia pageviews dump ("project Title views bytes" per line)
+
+    Returns:
+        Title (spaces, not underscores) -> views
+    """
+    views: Dict[str, int] = {}
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parts = line.split(' ')
+            if len(parts) < 3 or parts[0] not in (project, project.split('.')[0]):
+                continue
+            title = parts[1].replace('_', ' ')
+            try:
+                views[title] = views.get(title, 0) + int(parts[2])
+            except ValueError:
+                continue
+    return views
+
+
+# =========================
+# Build
+# =========================
+def _haversine_km(lat1, lon1, lat2, lon2) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return 6371.0 * 2 * math.asin(math.sqrt(a))
+
+
+def _popularity(tags: Dict, category: str, views: Dict[str, int]) -> float:
+    score = CATEGORY_WEIGHT.get(category, 1.0)
+    if tags.get('wikidata'):
+        score += 1.0
+    wiki = tags.get('wikipedia')
+    if wiki:
+        score += 1.0
+        title = wiki.split(':', 1)[-1]
+        if views.get(title):
+            score += math.log10(1 + views[title])
+    return score
+
+
+def build_index(osm_path: str, out_path: str, pageviews_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Build an attraction index file from a local OSM extract
+
+    Each named attraction is assigned to the nearest city/town within
+    MAX_CITY_DISTANCE_KM; attractions with no city nearby are dropped.
+
+    Returns:
+        Build stats (cities, attractions, skipped)
+    """
+    views = read_pageviews(pageviews_path) if pageviews_path else {}
+
+    places = []
+    attractions = []
+    for tags, lat, lon in read_osm_features(osm_path):
+        name = tags.get('name')
+        if not name:
+            continue
+        if tags.get('place') in CITY_PLACES:
+            places.append((name, lat, lon))
+            continue
+        category = classify_tags(tags)
+        if category:
+            attractions.append((name, category, lat, lon, _popularity(tags, category, views)))
+
+    # Grid of 0.5° cells for nearest-city lookup
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for i, (_, lat, lon) in enumerate(places):
+        grid.setdefault((int(math.floor(lat * 2)), int(math.floor(lon * 2))), []).append(i)
+
+    by_city: Dict[int, List[tuple]] = {}
+    skipped = 0
+    for name, category, lat, lon, pop in attractions:
+        cy, cx = int(math.floor(lat * 2)), int(math.floor(lon * 2))
+        best, best_d = None, MAX_CITY_DISTANCE_KM
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for i in grid.get((cy + dy, cx + dx), ()):
+                    d = _haversine_km(lat, lon, places[i][1], places[i][2])
+                    if d < best_d:
+                        best, best_d = i, d
+        if best is None:
+            skipped += 1
+            continue
+        by_city.setdefault(best, []).append((name, category, lat, lon, pop))
+
+    # Cities sorted by normalized name; records grouped by city, popular first
+    city_ids = sorted(by_city, key=lambda i: (normalize_city(places[i][0]), -len(by_city[i])))
+
+    strings = bytearray()
+
+    def intern(text: str) -> Tuple[int, int]:
+        raw = text.encode('utf-8')[:65535]
+        off = len(strings)
+        strings.extend(raw)
+        return off, len(raw)
+
+    city_blob = bytearray()
+    record_blob = bytearray()
+    n_records = 0
+    for new_id, i in enumerate(city_ids):
+        items = sorted(by_city[i], key=lambda r: -r[4])
+        lats = [r[2] for r in items]
+        lons = [r[3] for r in items]
+        name_off, name_len = intern(places[i][0])
+        city_blob += CITY.pack(name_off, name_len, n_records, len(items),
+                               min(lats), min(lons), max(lats), max(lons),
+                               places[i][1], places[i][2])
+        for name, category, lat, lon, pop in items:
+            off, ln = intern(name)
+            record_blob += RECORD.pack(lat, lon, pop, new_id, off, ln, CATEGORY_ID[category])
+        n_records += len(items)
+
+    cities_off = HEADER.size
+    records_off = cities_off + len(city_blob)
+    strings_off = records_off + len(record_blob)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n_records, len(city_ids),
+                            records_off, cities_off, strings_off, len(strings)))
+        f.write(city_blob)
+        f.write(record_blob)
+        f.write(strings)
+    os.replace(tmp_path, out_path)
+
+    stats = {'cities': len(city_ids), 'attractions': n_records, 'skipped': skipped}
+    logger.info(f"Built attraction index {out_path}: {stats}")
+    return stats
+
+
+# =========================
+# Query
+# =========================
+class AttractionIndex:
+    """Read-only, memory-mapped attraction index"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.n_records, self.n_cities, self._records_off,
+         self._cities_off, self._strings_off, _) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an attraction index (v{VERSION})")
+
+        # City table is small enough to decode eagerly
+        self._cities = [CITY.unpack_from(self._mm, self._cities_off + i * CITY.size)
+                        for i in range(self.n_cities)]
+        self._city_lookup: Dict[str, int] = {}
+        for city_id, row in enumerate(self._cities):
+            key = normalize_city(self._string(row[0], row[1]))
+            # Same name in several places: keep the one with most attractions
+            if key not in self._city_lookup or row[3] > self._cities[self._city_lookup[key]][3]:
+                self._city_lookup[key] = city_id
+
+        if NUMPY:
+            dtype = np.dtype([('lat', '<f4'), ('lon', '<f4'), ('popularity', '<f4'),
+                              ('city_id', '<u4'), ('name_off', '<u4'), ('name_len', '<u2'),
+                              ('category', 'u1'), ('pad', 'u1')])
+            self._records = np.frombuffer(self._mm, dtype=dtype, count=self.n_records,
+                                          offset=self._records_off)
+            self._city_bbox = np.array([row[4:8] for row in self._cities], dtype=np.float32).reshape(-1, 4)
+
+    def close(self):
+        self._records = None
+        self._mm.close()
+        self._file.close()
+
+    def _string(self, off: int, length: int) -> str:
+        start = self._strings_off + off
+        return self._mm[start:start + length].decode('utf-8')
+
+    def _record(self, i: int) -> Dict:
+        lat, lon, pop, city_id, off, ln, cat = RECORD.unpack_from(
+            self._mm, self._records_off + i * RECORD.size)
+        return {
+            'name': self._string(off, ln),
+            'category': CATEGORIES[cat],
+            'lat': lat,
+            'lon': lon,
+            'popularity': pop,
+            'city': self._string(*self._cities[city_id][:2]),
+            'source': 'offline_index',
+        }
+
+    def find_city(self, destination: str) -> Optional[int]:
+        """City id for 'Tokyo', 'tokyo, japan', ... or None"""
+        key = normalize_city(destination)
+        if key in self._city_lookup:
+            return self._city_lookup[key]
+        head = normalize_city(destination.split(',')[0])
+        return self._city_lookup.get(head)
+
+    def city_center(self, destination: str) -> Optional[Tuple[float, float]]:
+        city_id = self.find_city(destination)
+        if city_id is None:
+            return None
+        return self._cities[city_id][8], self._cities[city_id][9]
+
+    def by_city(self, destination: str, limit: int = 20) -> List[Dict]:
+        """Most popular attractions of a city"""
+        city_id = self.find_city(destination)
+        if city_id is None:
+            return []
+        start, count = self._cities[city_id][2], self._cities[city_id][3]
+        return [self._record(i) for i in range(start, start + min(count, limit))]
+
+    def by_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                limit: int = 50) -> List[Dict]:
+        """Most popular attractions inside a bounding box"""
+        if NUMPY:
+            b = self._city_bbox
+            cities = np.nonzero((b[:, 0] <= max_lat) & (b[:, 2] >= min_lat) &
+                                (b[:, 1] <= max_lon) & (b[:, 3] >= min_lon))[0]
+            hits = []
+            for city_id in cities:
+                start, count = self._cities[city_id][2], self._cities[city_id][3]
+                rec = self._records[start:start + count]
+                inside = np.nonzero((rec['lat'] >= min_lat) & (rec['lat'] <= max_lat) &
+                                    (rec['lon'] >= min_lon) & (rec['lon'] <= max_lon))[0]
+                hits.extend((float(rec['popularity'][j]), start + int(j)) for j in inside)
+        else:
+            hits = []
+            for city in self._cities:
+                if city[4] > max_lat or city[6] < min_lat or city[5] > max_lon or city[7] < min_lon:
+                    continue
+                for i in range(city[2], city[2] + city[3]):
+                    lat, lon, pop = RECORD.unpack_from(self._mm, self._records_off + i * RECORD.size)[:3]
+                    if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                        hits.append((pop, i))
+        hits.sort(reverse=True)
+        return [self._record(i) for _, i in hits[:limit]]
+
+
+_shared_index = None
+
+
+def get_attraction_index(path: Optional[str] = None) -> Optional[AttractionIndex]:
+    """Shared index instance, or None if no index file has been built"""
+    global _shared_index
+    path = path or DEFAULT_INDEX_PATH
+    if _shared_index is None or _shared_index.path != path:
+        if not os.path.exists(path):
+            return None
+        try:
+            _shared_index = AttractionIndex(path)
+        except Exception as e:
+            logger.error(f"Could not open attraction index {path}: {e}")
+            return None
+    return _shared_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline attraction index')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Build an index from a local OSM extract')
+    build.add_argument('--osm', required=True, help='Overpass JSON, GeoJSON or .osm.pbf extract')
+    build.add_argument('--pageviews', help='Wikimedia pageviews dump for the popularity prior')
+    build.add_argument('--out', default=DEFAULT_INDEX_PATH, help='Index file to write')
+
+    query = sub.add_parser('query', help='Query an index')
+    query.add_argument('--index', default=DEFAULT_INDEX_PATH)
+    query.add_argument('--city', help='City name')
+    query.add_argument('--bbox', nargs=4, type=float, metavar=('MIN_LAT', 'MIN_LON', 'MAX_LAT', 'MAX_LON'))
+    query.add_argument('--limit', type=int, default=10)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'build':
+        stats = build_index(args.osm, args.out, args.pageviews)
+        print(f"✅ {stats['attractions']} attractions in {stats['cities']} cities "
+              f"({stats['skipped']} without a nearby city) → {args.out}")
+        return
+
+    index = AttractionIndex(args.index)
+    if args.city:
+        results = index.by_city(args.city, args.limit)
+    elif args.bbox:
+        results = index.by_bbox(*args.bbox, limit=args.limit)
+    else:
+        parser.error("query needs --city or --bbox")
+        return
+    for i, a in enumerate(results, 1):
+        print(f"{i}. {a['name']} ({a['category']}, {a['city']}) "
+              f"pop={a['popularity']:.2f} @ {a['lat']:.4f},{a['lon']:.4f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Vectorized attraction scoring and ranking
+
+Scores a whole candidate set at once instead of one dict at a time:
+categories are de-duplicated, matched against the user's interests once
+as a small (categories x interests) boolean matrix, and the weighted
+interest boost is gathered back to candidates by index. Budget
+filtering and distance decay are applied to the same score vector.
+"""
+import math
+import logging
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY = True
+except Exception:
+    NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+# Price strings allowed per budget; an attraction without 'price' counts as '$'
+BUDGET_PRICES = {
+    'low': ('$',),
+    'medium': ('$', '$$'),
+    'high': ('$', '$$', '$$$', '$$$$')
+}
+
+
+def filter_by_budget(candidates: List[Dict], budget: str) -> List[Dict]:
+    """Candidates whose price is allowed for the budget (unknown budget = 'medium')"""
+    allowed = BUDGET_PRICES.get(budget, BUDGET_PRICES['medium'])
+    return [c for c in candidates if c.get('price', '$') in allowed]
+
+
+class AttractionRanker:
+    """Score and rank attraction candidates in one vectorized pass"""
+
+    def __init__(self, interest_boost: float = 20.0,
+                 source_boosts: Optional[Dict[str, float]] = None,
+                 description_boost: float = 10.0,
+                 base_score: Optional[float] = 50.0,
+                 max_score: Optional[float] = 100.0):
+        """
+        Args:
+            interest_boost: Points per matching interest (times its weight)
+            source_boosts: source name -> points (Wikipedia by default)
+            description_boost: Points for having a description
+            base_score: Starting score; None uses each candidate's own 'score'
+            max_score: Cap applied before distance decay (None for no cap)
+        """
+        self.interest_boost = interest_boost
+        self.source_boosts = {'wikipedia': 15.0} if source_boosts is None else source_boosts
+        self.description_boost = description_boost
+        self.base_score = base_score
+        self.max_score = max_score
+
+    @staticmethod
+    def _interest_matrix(categories: List[str], interests: List[str]) -> List[List[bool]]:
+        """match[c][i]: interest i is a substring of category c"""
+        needles = [interest.lower() for interest in interests]
+        return [[needle in category for needle in needles] for category in categories]
+
+    def score(self, candidates: List[Dict], interests: List[str] = None,
+              interest_weights: Optional[Dict[str, float]] = None):
+        """
+        Scores for all candidates (array, or list without NumPy)
+
+        Args:
+            candidates: Attraction dicts
+            interests: Interests matched against each candidate's category
+            interest_weights: interest -> weight (default 1.0 each)
+        """
+        n = len(candidates)
+        interests = list(interests or [])
+        weights = [float((interest_weights or {}).get(i, 1.0)) for i in interests]
+
+        if self.base_score is None:
+            base = [float(c.get('score') or 50) for c in candidates]
+        else:
+            base = [self.base_score] * n
+        extra = [
+            self.source_boosts.get(c.get('source'), 0.0)
+            + (self.description_boost if c.get('description') else 0.0)
+            for c in candidates
+        ]
+
+        if not NUMPY:
+            return self._score_python(candidates, interests, weights, base, extra)
+
+        scores = np.asarray(base, dtype=np.float64) + np.asarray(extra, dtype=np.float64)
+        if interests and n:
+            categories, cat_index = np.unique(
+                [(c.get('category') or '').lower() for c in candidates], return_inverse=True)
+            match = np.asarray(self._interest_matrix(list(categories), interests), dtype=np.float64)
+            per_category = match @ np.asarray(weights, dtype=np.float64) * self.interest_boost
+            scores += per_category[cat_index]
+        if self.max_score is not None:
+            np.minimum(scores, self.max_score, out=scores)
+        return scores
+
+    def _score_python(self, candidates, interests, weights, base, extra):
+        """Fallback when NumPy is unavailable (same output, slower)"""
+        boosts: Dict[str, float] = {}
+        scores = []
+        for c, b, e in zip(candidates, base, extra):
+            category = (c.get('category') or '').lower()
+            if category not in boosts:
+                row = self._interest_matrix([category], interests)[0]
+                boosts[category] = sum(w for hit, w in zip(row, weights) if hit) * self.interest_boost
+            s = b + e + boosts[category]
+            scores.append(min(s, self.max_score) if self.max_score is not None else s)
+        return scores
+
+    def rank(self, candidates: List[Dict], interests: List[str] = None,
+             interest_weights: Optional[Dict[str, float]] = None,
+             budget: Optional[str] = None,
+             decay_m: Optional[float] = None,
+             limit: Optional[int] = 10,
+             score_key: str = 'score') -> List[Dict]:
+        """
+        Filter by budget, score, apply distance decay and return the top candidates
+
+        Args:
+            candidates: Attraction dicts (optionally with 'distance_m')
+            interests: Interests to boost
+            interest_weights: interest -> weight
+            budget: 'low', 'medium' or 'high'; None keeps every price level
+            decay_m: Multiply scores by exp(-distance_m / decay_m)
+            limit: Max results (None for all)
+            score_key: Key the final score is written to
+
+        Returns:
+            Copies of the best candidates, best first (ties keep input order)
+        """
+        if budget is not None:
+            candidates = filter_by_budget(candidates, budget)
+        if not candidates:
+            return []
+
+        scores = self.score(candidates, interests, interest_weights)
+        distances = None
+        if decay_m:
+            distances = [float(c.get('distance_m') or 0) for c in candidates]
+
+        if NUMPY:
+            if distances is not None:
+                scores = scores * np.exp(-np.asarray(distances) / decay_m)
+            order = np.argsort(-scores, kind='stable')
+            if limit is not None:
+                order = order[:limit]
+            picked = [(int(i), float(scores[i])) for i in order]
+        else:
+            if distances is not None:
+                scores = [s * math.exp(-d / decay_m) for s, d in zip(scores, distances)]
+            picked = sorted(enumerate(scores), key=lambda p: -p[1])[:limit]
+
+        results = []
+        for i, s in picked:
+            item = dict(candidates[i])
+            item[score_key] = round(s, 2)
+            results.append(item)
+        return results
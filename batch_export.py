@@ -0,0 +1,242 @@
+"""
+Batch itinerary export
+
+Exports many trip_history rows at once into a ZIP of per-trip PDFs and ICS
+files, or one merged calendar. PDFs are rendered by the PDF process pool
+(one worker per core by default) with a bounded number of renders in
+flight; finished files go straight into the ZIP, which can be a file or a
+non-seekable stream, so memory stays flat regardless of the trip count.
+
+Usage:
+    python batch_export.py --out trips.zip                      # every trip
+    python batch_export.py --out trips.zip --user-id 3 --status planned
+    python batch_export.py --out all.ics --merged-calendar
+"""
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+import argparse
+import logging
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from database import Database, get_database
+from pdf_renderer import PDFRenderService, default_action_rows
+from trip_calendar import (MergedCalendarWriter, build_calendar, get_calendar_state_store,
+                           trip_key_for)
+
+logger = logging.getLogger(__name__)
+
+# progress(done, total, trip) after each exported trip; total is None when unknown
+ProgressCallback = Callable[[int, Optional[int], Dict], None]
+
+
+def trip_payload(trip: Dict) -> Dict:
+    """Itinerary payload of a trip_history row, with meta filled from the row"""
+    try:
+        payload = json.loads(trip.get('itinerary_json') or '{}') or {}
+    except json.JSONDecodeError:
+        logger.warning(f"Trip {trip.get('id')}: unreadable itinerary_json")
+        payload = {}
+    meta = dict(payload.get('meta') or {})
+    meta.setdefault('destination_city', trip.get('destination', ''))
+    meta.setdefault('depart_date', trip.get('depart_date', ''))
+    meta.setdefault('return_date', trip.get('return_date', ''))
+    return {'meta': meta, 'actions': payload.get('actions') or [],
+            'plan_md': payload.get('plan_md') or ''}
+
+
+def trip_budget_status(trip: Dict) -> Optional[Dict]:
+    budget = trip.get('budget') or 0
+    if not budget:
+        return None
+    used = trip.get('actual_cost') or 0
+    return {'total_budget': budget, 'used': used, 'remaining': budget - used,
+            'percentage': used / budget * 100}
+
+
+def trip_file_stem(trip: Dict) -> str:
+    name = re.sub(r"[^\w\-]+", "_", str(trip.get('trip_name') or trip.get('destination') or 'trip'))
+    return f"{trip['id']:06d}_{name.strip('_')[:60]}"
+
+
+class BatchExporter:
+    """Exports trips to a ZIP (PDF/ICS) or a merged calendar"""
+
+    def __init__(self, db: Optional[Database] = None,
+                 renderer: Optional[PDFRenderService] = None,
+                 workers: Optional[int] = None, max_inflight: Optional[int] = None,
+                 use_calendar_state: bool = True):
+        """
+        Args:
+            db: Database to read trips from (default: singleton)
+            renderer: PDF render service (default: a pool with `workers` processes)
+            workers: PDF worker processes (default: CPU count)
+            max_inflight: PDFs rendering or waiting to be written at once
+                (default: 2 per worker); bounds memory
+            use_calendar_state: Give ICS events the SEQUENCE last published for
+                the trip (read-only; exports never bump it)
+        """
+        self.db = db or get_database()
+        workers = workers or os.cpu_count() or 1
+        self.renderer = renderer or PDFRenderService(workers=workers, cache_size=0)
+        self.max_inflight = max_inflight or 2 * max(1, self.renderer.workers)
+        self.use_calendar_state = use_calendar_state
+        self.stats = {'trips': 0, 'pdf': 0, 'ics': 0, 'errors': 0}
+
+    def _calendar_state(self, trip_key: str) -> Dict:
+        if not self.use_calendar_state:
+            return {}
+        return get_calendar_state_store().load(trip_key)
+
+    def _select(self, trips: Optional[Iterable[Dict]], filters: Dict):
+        if trips is not None:
+            return trips, (len(trips) if isinstance(trips, Sequence) else None)
+        return self.db.iter_trips(**filters), self.db.count_trips(**filters)
+
+    def export_zip(self, out, trips: Optional[Iterable[Dict]] = None,
+                   formats: Sequence[str] = ('pdf', 'ics'),
+                   progress: Optional[ProgressCallback] = None, **filters) -> Dict:
+        """
+        Write one PDF and/or ICS per trip into a ZIP
+
+        Args:
+            out: ZIP filename or writable binary stream (need not be seekable)
+            trips: trip_history rows; default: db.iter_trips(**filters)
+            formats: Any of 'pdf', 'ics'
+            progress: Called after each trip
+            **filters: user_id, status, trip_ids for db.iter_trips
+
+        Returns:
+            Export statistics
+        """
+        trips, total = self._select(trips, filters)
+        started = time.time()
+        window = deque()  # (trip, stem, future) in submission order
+        done = 0
+
+        with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            def finish(trip, stem, future):
+                nonlocal done
+                if future is not None:
+                    try:
+                        pdf = future.result()
+                        # PDF content streams are already compressed
+                        archive.writestr(zipfile.ZipInfo(f"{stem}.pdf", time.localtime()[:6]), pdf,
+                                         compress_type=zipfile.ZIP_STORED)
+                        self.stats['pdf'] += 1
+                    except Exception as e:
+                        self.stats['errors'] += 1
+                        logger.error(f"Trip {trip['id']}: PDF export failed: {e}")
+                done += 1
+                self.stats['trips'] += 1
+                if progress:
+                    progress(done, total, trip)
+
+            for trip in trips:
+                payload = trip_payload(trip)
+                stem = trip_file_stem(trip)
+                if 'ics' in formats:
+                    try:
+                        trip_key = trip_key_for(payload['meta'], trip['id'])
+                        ics, _ = build_calendar(payload['meta'], payload['actions'], trip_key,
+                                                state=self._calendar_state(trip_key))
+                        archive.writestr(f"{stem}.ics", ics)
+                        self.stats['ics'] += 1
+                    except Exception as e:
+                        self.stats['errors'] += 1
+                        logger.error(f"Trip {trip['id']}: ICS export failed: {e}")
+                future = None
+                if 'pdf' in formats:
+                    future = self.renderer.submit(payload['plan_md'], payload['meta'], payload['actions'],
+                                                  trip_budget_status(trip),
+                                                  rows=default_action_rows(payload['actions']))
+                window.append((trip, stem, future))
+                while len(window) >= self.max_inflight:
+                    finish(*window.popleft())
+            while window:
+                finish(*window.popleft())
+
+        self.stats['elapsed'] = time.time() - started
+        return dict(self.stats)
+
+    def export_merged_calendar(self, out, trips: Optional[Iterable[Dict]] = None,
+                               progress: Optional[ProgressCallback] = None, **filters) -> Dict:
+        """Write every selected trip's events into one calendar (filename or binary stream)"""
+        trips, total = self._select(trips, filters)
+        started = time.time()
+        writer = MergedCalendarWriter()
+        try:
+            for done, trip in enumerate(trips, 1):
+                payload = trip_payload(trip)
+                trip_key = trip_key_for(payload['meta'], trip['id'])
+                writer.add(payload['meta'], payload['actions'], trip_key,
+                           state=self._calendar_state(trip_key))
+                self.stats['trips'] += 1
+                if progress:
+                    progress(done, total, trip)
+            if isinstance(out, (str, os.PathLike)):
+                with open(out, 'wb') as f:
+                    writer.write_to(f)
+            else:
+                writer.write_to(out)
+            self.stats['ics'] = 1
+            self.stats['events'] = writer.events
+        finally:
+            writer.close()
+        self.stats['elapsed'] = time.time() - started
+        return dict(self.stats)
+
+    def close(self):
+        self.renderer.shutdown()
+
+
+class ProgressPrinter:
+    """CLI progress line on stderr"""
+
+    def __init__(self):
+        self.started = time.time()
+
+    def __call__(self, done: int, total: Optional[int], trip: Dict):
+        rate = done / max(time.time() - self.started, 1e-6)
+        of = f"/{total} ({done / total * 100:.1f}%)" if total else ""
+        sys.stderr.write(f"\r   {done}{of}  {rate:.1f} trips/s  ")
+        if total and done == total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export many trips at once')
+    parser.add_argument('--out', required=True, help="Output .zip (or .ics with --merged-calendar); '-' for stdout")
+    parser.add_argument('--db', default='travel_agent.db', help='Trip database')
+    parser.add_argument('--user-id', type=int, help='Only this user\'s trips')
+    parser.add_argument('--status', help='Only trips with this status')
+    parser.add_argument('--trip-ids', help='Comma-separated trip ids')
+    parser.add_argument('--formats', default='pdf,ics', help='pdf, ics or both (ZIP mode)')
+    parser.add_argument('--merged-calendar', action='store_true', help='One .ics for all trips')
+    parser.add_argument('--workers', type=int, help='PDF worker processes (default: CPU count)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    filters = {'user_id': args.user_id, 'status': args.status,
+               'trip_ids': [int(t) for t in args.trip_ids.split(',')] if args.trip_ids else None}
+    exporter = BatchExporter(db=Database(args.db), workers=args.workers)
+    out = sys.stdout.buffer if args.out == '-' else args.out
+    try:
+        if args.merged_calendar:
+            stats = exporter.export_merged_calendar(out, progress=ProgressPrinter(), **filters)
+        else:
+            formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+            stats = exporter.export_zip(out, formats=formats, progress=ProgressPrinter(), **filters)
+    finally:
+        exporter.close()
+    sys.stderr.write(f"✅ {stats['trips']} trips exported in {stats['elapsed']:.1f}s: {stats}\n")
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Email throughput benchmark
+
+Drives itinerary emails (with PDF and ICS attachments) and flight alerts
+through the full EmailService path (templates, MIME build, SMTP pool, or
+the outbox) against a local SMTP sink, and reports messages per second
+and send latency percentiles. Nothing reaches a real inbox.
+
+Usage:
+    python benchmark_email.py --itineraries 200 --alerts 800 --latency 0.02
+    python benchmark_email.py --mode outbox --fail-rate 0.05
+    python benchmark_email.py --per-message-connections   # pre-pooling baseline
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from smtp_sink import SMTPSink
+
+logger = logging.getLogger(__name__)
+
+
+def sample_pdf(kb: int) -> bytes:
+    """Itinerary-sized PDF payload (a real PDF when reportlab is available)"""
+    try:
+        from io import BytesIO
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfgen import canvas
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=letter)
+        pdf.drawString(72, 720, "Benchmark itinerary")
+        pdf.showPage()
+        pdf.save()
+        head = buffer.getvalue()
+    except Exception:
+        head = b"%PDF-1.4\n%%EOF\n"
+    # Pad with incompressible bytes to the requested size
+    return head + os.urandom(max(0, kb * 1024 - len(head)))
+
+
+def sample_ics(events: int = 12) -> bytes:
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//MyAgent//Benchmark//EN"]
+    for i in range(events):
+        lines += ["BEGIN:VEVENT", f"UID:bench-{i}@myagent", f"DTSTART:20260101T{8 + i % 12:02d}0000Z",
+                  f"SUMMARY:Activity {i}", "END:VEVENT"]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines).encode('utf-8')
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_jobs(itineraries: int, alerts: int, pdf: bytes, ics: bytes) -> List[Dict]:
+    jobs = [{'kind': 'itinerary', 'to': f"traveler{i}@bench.local", 'name': f"Traveler {i}"}
+            for i in range(itineraries)]
+    jobs += [{'kind': 'alert', 'to': f"passenger{i}@bench.local", 'name': f"Passenger {i}"}
+             for i in range(alerts)]
+    for job in jobs:
+        job['pdf'], job['ics'] = pdf, ics
+    return jobs
+
+
+def send_job(service, job: Dict) -> bool:
+    if job['kind'] == 'itinerary':
+        return service.send_itinerary_email(
+            job['to'], job['name'], "Tokyo Getaway", "Tokyo",
+            "2026-03-01", "2026-03-08", job['pdf'], job['ics'])
+    return service.send_flight_alert(
+        job['to'], job['name'], 'warning_delay',
+        {'flight_number': 'UA837', 'route': 'SFO → NRT',
+         'scheduled_time': '2026-03-01 11:05', 'updated_time': '2026-03-01 13:40'},
+        "Your flight is delayed by 2h 35m")
+
+
+def run_inline(service, jobs: List[Dict], concurrency: int) -> Dict:
+    """Callers send synchronously over the pool; latency is what they wait"""
+    latencies = []
+
+    def timed(job):
+        start = time.perf_counter()
+        ok = send_job(service, job)
+        latencies.append(time.perf_counter() - start)
+        return ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, jobs))
+    elapsed = time.perf_counter() - start
+    return {'elapsed': elapsed, 'latencies': latencies,
+            'ok': sum(results), 'failed': len(results) - sum(results)}
+
+
+def run_outbox(service, jobs: List[Dict], concurrency: int, timeout: float) -> Dict:
+    """Callers enqueue; workers drain. Latency is enqueue -> accepted by SMTP"""
+    from email_outbox import EmailOutbox
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="email-bench-"), "outbox.db")
+    outbox = EmailOutbox(service, db_path=db_path, workers=concurrency,
+                         base_delay=0.05, max_delay=0.5, poll_interval=0.05)
+    service.outbox = outbox  # enqueue without starting workers yet
+
+    enqueue_latencies = []
+    for job in jobs:
+        start = time.perf_counter()
+        send_job(service, job)
+        enqueue_latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    outbox.start()
+    while time.perf_counter() - start < timeout:
+        stats = outbox.get_stats()
+        if stats.get('pending', 0) + stats.get('sending', 0) == 0:
+            break
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - start
+    outbox.stop()
+
+    conn = outbox.get_connection()
+    rows = conn.execute("SELECT sent_at - created_at FROM email_outbox WHERE status = 'sent'").fetchall()
+    conn.close()
+    stats = outbox.get_stats()
+    return {'elapsed': elapsed, 'latencies': [row[0] for row in rows],
+            'enqueue_latencies': enqueue_latencies,
+            'ok': stats.get('sent', 0), 'failed': stats.get('dead', 0),
+            'unfinished': stats.get('pending', 0) + stats.get('sending', 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EmailService throughput benchmark')
+    parser.add_argument('--itineraries', type=int, default=100, help='Itinerary emails (PDF + ICS)')
+    parser.add_argument('--alerts', type=int, default=400, help='Flight alert emails')
+    parser.add_argument('--pdf-kb', type=int, default=150, help='Itinerary PDF size')
+    parser.add_argument('--mode', choices=['inline', 'outbox'], default='inline')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Sending threads (inline) or outbox workers; also the SMTP pool size')
+    parser.add_argument('--per-message-connections', action='store_true',
+                        help='New SMTP connection per message (pre-pooling baseline)')
+    parser.add_argument('--host', help='Use an already running SMTP sink/server instead of an in-process sink')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency', type=float, default=0.0, help='Sink seconds per message')
+    parser.add_argument('--connect-latency', type=float, default=0.0,
+                        help='Sink seconds per new connection (simulates TLS + AUTH round trips)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Sink 451 probability')
+    parser.add_argument('--timeout', type=float, default=300.0, help='Outbox drain timeout')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    sink = None
+    if args.host:
+        host, port = args.host, args.port
+    else:
+        sink = SMTPSink(latency=args.latency, connect_latency=args.connect_latency,
+                        fail_rate=args.fail_rate, capture=False, seed=42).start()
+        host, port = sink.address
+
+    # EmailService reads its SMTP settings from the environment
+    os.environ.update({
+        'SMTP_HOST': str(host), 'SMTP_PORT': str(port), 'EMAIL_USE_TLS': 'false',
+        'SMTP_POOL_SIZE': str(args.concurrency),
+        'SMTP_MAX_MESSAGES_PER_CONNECTION': '1' if args.per_message_connections else '100',
+    })
+    from email_service import EmailService
+    service = EmailService()
+
+    jobs = build_jobs(args.itineraries, args.alerts, sample_pdf(args.pdf_kb), sample_ics())
+    print(f"📧 {len(jobs)} emails ({args.itineraries} itineraries with {args.pdf_kb} KB PDF, "
+          f"{args.alerts} alerts) → {host}:{port}, mode={args.mode}, concurrency={args.concurrency}"
+          f"{', one connection per message' if args.per_message_connections else ''}")
+
+    if args.mode == 'inline':
+        result = run_inline(service, jobs, args.concurrency)
+    else:
+        result = run_outbox(service, jobs, args.concurrency, args.timeout)
+    service.pool.close()
+
+    latencies_ms = [v * 1000 for v in result['latencies']]
+    print(f"\n  Sent:        {result['ok']} ok, {result['failed']} failed"
+          + (f", {result['unfinished']} unfinished" if result.get('unfinished') else ""))
+    print(f"  Elapsed:     {result['elapsed']:.2f}s")
+    print(f"  Throughput:  {result['ok'] / result['elapsed'] if result['elapsed'] else 0:.1f} msg/s")
+    print(f"  Latency:     p50 {percentile(latencies_ms, 50):.1f} ms, "
+          f"p95 {percentile(latencies_ms, 95):.1f} ms, p99 {percentile(latencies_ms, 99):.1f} ms")
+    if 'enqueue_latencies' in result:
+        enqueue_ms = [v * 1000 for v in result['enqueue_latencies']]
+        print(f"  Enqueue:     p50 {percentile(enqueue_ms, 50):.2f} ms, p99 {percentile(enqueue_ms, 99):.2f} ms")
+    print(f"  SMTP pool:   {service.pool.stats}")
+    if sink:
+        print(f"  Sink:        {sink.stats}")
+        sink.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,8 @@ from typing import Dict, List, Optional, Tuple
 import logging
 from dataclasses import dataclass
 
+from keyword_matcher import KeywordMatcher
+
 logger = logging.getLogger(__name__)
 
 
@@ -215,17 +217,22 @@ class AttractionScorer:
 class ConferenceDetector:
     """Detect and handle conference/meeting trips"""
     
+    CONFERENCE_KEYWORDS = [
+        'conference', 'summit', 'meeting', 'convention', 
+        'symposium', 'expo', 'business trip', 'workshop',
+        'seminar', 'event'
+    ]
+    _matcher = KeywordMatcher((kw, 'conference') for kw in CONFERENCE_KEYWORDS)
+    
     @staticmethod
     def is_conference_trip(query: str, actions: List[Dict]) -> bool:
         """Detect if trip is for a conference or meeting"""
-        conference_keywords = [
-            'conference', 'summit', 'meeting', 'convention', 
-            'symposium', 'expo', 'business trip', 'workshop',
-            'seminar', 'event'
-        ]
-        
-        query_lower = query.lower()
-        return any(keyword in query_lower for keyword in conference_keywords)
+        return ConferenceDetector._matcher.contains_any(query)
+    
+    @staticmethod
+    def detect_many(queries: List[str]) -> List[bool]:
+        """is_conference_trip for a batch of queries"""
+        return [bool(labels) for labels in ConferenceDetector._matcher.labels_many(queries)]
     
     @staticmethod
     def extract_conference_details(query: str) -> Dict:
@@ -0,0 +1,178 @@
+"""
+Persistent key/value cache (SQLite)
+
+Shared by every process that points at the same database file
+(Streamlit workers, the monitoring service, CLI scripts). Values are
+stored as JSON with an optional expiry time. A namespace can be capped
+to a number of entries (least recently used are evicted) and can cache
+empty results for a shorter negative TTL.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import Any, Optional, Dict, List
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DB = os.getenv("MYAGENT_CACHE_DB", "myagent_cache.db")
+
+# Sentinel for "not cached" (None is a valid cached value)
+MISSING = object()
+
+
+class SQLiteCache:
+    """Namespaced JSON cache with per-entry TTL and optional LRU cap"""
+
+    def __init__(self, namespace: str, db_path: Optional[str] = None,
+                 default_ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None,
+                 negative_ttl: Optional[float] = None):
+        """
+        Args:
+            namespace: Logical cache name (keys are unique per namespace)
+            db_path: SQLite file, defaults to $MYAGENT_CACHE_DB
+            default_ttl: Seconds until expiry when set() gets no ttl;
+                None means entries never expire
+            max_entries: Evict least recently used entries above this size
+            negative_ttl: TTL used instead of default_ttl for empty values
+                (None, [], {}), so "no results" is cached but retried sooner
+        """
+        self.namespace = namespace
+        self.db_path = db_path or DEFAULT_CACHE_DB
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize cache table"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            namespace TEXT NOT NULL,
+            cache_key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL,
+            created_at REAL NOT NULL,
+            last_access REAL,
+            PRIMARY KEY (namespace, cache_key)
+        )
+        """)
+
+        # Databases created before LRU support lack last_access
+        columns = [row['name'] for row in cursor.execute("PRAGMA table_info(cache_entries)")]
+        if 'last_access' not in columns:
+            cursor.execute("ALTER TABLE cache_entries ADD COLUMN last_access REAL")
+
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cache_entries_lru
+        ON cache_entries (namespace, last_access)
+        """)
+        conn.commit()
+        conn.close()
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Return the cached value, or default if missing/expired"""
+        conn = self.get_connection()
+        row = conn.execute("""
+        SELECT value, expires_at FROM cache_entries
+        WHERE namespace = ? AND cache_key = ?
+        """, (self.namespace, key)).fetchone()
+
+        now = time.time()
+        if row is None or (row['expires_at'] is not None and row['expires_at'] <= now):
+            conn.close()
+            return default
+
+        if self.max_entries:
+            conn.execute("""
+            UPDATE cache_entries SET last_access = ?
+            WHERE namespace = ? AND cache_key = ?
+            """, (now, self.namespace, key))
+            conn.commit()
+        conn.close()
+        return json.loads(row['value'])
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Return {key: value} for the keys that are cached and fresh"""
+        if not keys:
+            return {}
+        conn = self.get_connection()
+        rows = conn.execute(f"""
+        SELECT cache_key, value, expires_at FROM cache_entries
+        WHERE namespace = ? AND cache_key IN ({','.join('?' * len(keys))})
+        """, [self.namespace, *keys]).fetchall()
+        conn.close()
+
+        now = time.time()
+        return {
+            row['cache_key']: json.loads(row['value'])
+            for row in rows
+            if row['expires_at'] is None or row['expires_at'] > now
+        }
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = MISSING):
+        """Store a JSON-serializable value; ttl=None stores it permanently"""
+        if ttl is MISSING:
+            empty = value is None or value == [] or value == {}
+            ttl = self.negative_ttl if (empty and self.negative_ttl is not None) else self.default_ttl
+        now = time.time()
+        conn = self.get_connection()
+        conn.execute("""
+        INSERT INTO cache_entries (namespace, cache_key, value, expires_at, created_at, last_access)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(namespace, cache_key) DO UPDATE SET
+            value = excluded.value,
+            expires_at = excluded.expires_at,
+            created_at = excluded.created_at,
+            last_access = excluded.last_access
+        """, (self.namespace, key, json.dumps(value), now + ttl if ttl is not None else None, now, now))
+        if self.max_entries:
+            self._evict(conn)
+        conn.commit()
+        conn.close()
+
+    def _evict(self, conn):
+        """Drop least recently used entries above max_entries"""
+        count = conn.execute("SELECT COUNT(*) FROM cache_entries WHERE namespace = ?",
+                             (self.namespace,)).fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute("""
+            DELETE FROM cache_entries
+            WHERE namespace = ? AND cache_key IN (
+                SELECT cache_key FROM cache_entries
+                WHERE namespace = ?
+                ORDER BY COALESCE(last_access, created_at)
+                LIMIT ?
+            )
+            """, (self.namespace, self.namespace, excess))
+
+    def delete(self, key: str):
+        conn = self.get_connection()
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND cache_key = ?",
+                     (self.namespace, key))
+        conn.commit()
+        conn.close()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries in this namespace; returns rows removed"""
+        conn = self.get_connection()
+        cursor = conn.execute("""
+        DELETE FROM cache_entries
+        WHERE namespace = ? AND expires_at IS NOT NULL AND expires_at <= ?
+        """, (self.namespace, time.time()))
+        conn.commit()
+        removed = cursor.rowcount
+        conn.close()
+        return removed
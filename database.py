@@ -48,7 +48,7 @@ class MonitoringAlert:
     """Real-time monitoring alert"""
     id: int
     trip_id: int
-    alert_type: str  # flight_delay, price_change, weather, event
+    alert_type: str  # flight_delay, price_change, weather_<rule>, event
     severity: str  # low, medium, high, critical
     message: str
     action_required: bool
@@ -244,6 +244,45 @@ class Database:
         conn.close()
         return trips
     
+    def _trip_filter(self, user_id: Optional[int] = None, status: Optional[str] = None,
+                     trip_ids: Optional[List[int]] = None) -> tuple:
+        clauses, params = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            params.append(user_id)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if trip_ids:
+            clauses.append(f"id IN ({','.join('?' * len(trip_ids))})")
+            params.extend(trip_ids)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def count_trips(self, user_id: Optional[int] = None, status: Optional[str] = None,
+                    trip_ids: Optional[List[int]] = None) -> int:
+        """Count trips matching the filters (all users when user_id is None)"""
+        where, params = self._trip_filter(user_id, status, trip_ids)
+        conn = self.get_connection()
+        count = conn.execute(f"SELECT COUNT(*) FROM trip_history{where}", params).fetchone()[0]
+        conn.close()
+        return count
+
+    def iter_trips(self, user_id: Optional[int] = None, status: Optional[str] = None,
+                   trip_ids: Optional[List[int]] = None, batch_size: int = 200):
+        """Yield trips matching the filters in id order, fetching batch_size rows at a time"""
+        where, params = self._trip_filter(user_id, status, trip_ids)
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(f"SELECT * FROM trip_history{where} ORDER BY id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
     def update_trip_cost(self, trip_id: int, actual_cost: float):
         """Update actual trip cost"""
         conn = self.get_connection()
@@ -258,6 +297,20 @@ class Database:
         conn.commit()
         conn.close()
     
+    def update_trip_itinerary(self, trip_id: int, itinerary_json: str):
+        """Replace a trip's itinerary payload (e.g. after a rebooking)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+        UPDATE trip_history 
+        SET itinerary_json = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """, (itinerary_json, trip_id))
+        
+        conn.commit()
+        conn.close()
+    
     def create_alert(self, trip_id: int, alert_type: str, severity: str,
                      message: str, action_required: bool = False) -> int:
         """Create monitoring alert"""
@@ -290,6 +343,46 @@ class Database:
         conn.close()
         return alerts
     
+    def create_alerts_bulk(self, alerts: List[tuple]) -> int:
+        """
+        Create many monitoring alerts in one transaction
+        
+        Args:
+            alerts: (trip_id, alert_type, severity, message, action_required) tuples
+        """
+        if not alerts:
+            return 0
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.executemany("""
+        INSERT INTO monitoring_alerts 
+        (trip_id, alert_type, severity, message, action_required)
+        VALUES (?, ?, ?, ?, ?)
+        """, alerts)
+        
+        conn.commit()
+        conn.close()
+        return len(alerts)
+    
+    def get_unresolved_alert_types(self, trip_ids: List[int], prefix: str = '') -> set:
+        """Get (trip_id, alert_type) of unresolved alerts, for de-duplication"""
+        trip_ids = list(set(trip_ids))
+        if not trip_ids:
+            return set()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+        SELECT DISTINCT trip_id, alert_type FROM monitoring_alerts 
+        WHERE alert_type GLOB ? AND resolved = FALSE
+        AND trip_id IN ({','.join('?' * len(trip_ids))})
+        """, [prefix + '*', *trip_ids])
+        
+        keys = {(row['trip_id'], row['alert_type']) for row in cursor.fetchall()}
+        conn.close()
+        return keys
+    
     def resolve_alert(self, alert_id: int):
         """Mark alert as resolved"""
         conn = self.get_connection()
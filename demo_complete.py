@@ -376,6 +376,11 @@ alternative that matches your schedule.
     print("\n🛑 Stopping monitoring agent...")
     agent.stop()
     
+    # Outbox workers are daemon threads; send what is queued before exiting
+    left = email_service.flush()
+    if left:
+        print(f"⚠️  {left} email(s) still queued for retry (email_outbox.db)")
+    
     print("\n✅ Demo finished successfully!")
     print()
     print("="*70)
@@ -430,7 +435,8 @@ def test_email_only():
                 </ul>
             </div>
         </div>
-        """
+        """,
+        queue=False  # report the real SMTP result
     )
     
     if success:
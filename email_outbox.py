@@ -0,0 +1,372 @@
+"""
+Durable email outbox (SQLite)
+
+Callers enqueue a message and return immediately; background worker
+threads drain the outbox through EmailService. Each message is:
+- deduplicated by an optional idempotency key
+- retried with exponential backoff (plus jitter) on transient failures
+- dead-lettered after max_attempts, or at once if the server refuses the
+  message itself (not on auth/connection errors)
+
+Claims are short leases, so a message held by a crashed process is
+picked up again by any other process sharing the same database.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import random
+import sqlite3
+import smtplib
+import threading
+import logging
+from typing import Optional, List, Dict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_DB = os.getenv("EMAIL_OUTBOX_DB", "email_outbox.db")
+
+def _is_permanent(error: Exception) -> bool:
+    """
+    True only when the server refused this message (5xx to MAIL FROM, RCPT
+    or DATA); retrying will not help. Authentication, connection and HELO
+    failures are account/config problems and are retried with backoff.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(500 <= code < 600 for code in codes)
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+class EmailOutbox:
+    """SQLite-backed outbox with background dispatch workers"""
+
+    def __init__(self, email_service, db_path: Optional[str] = None,
+                 workers: int = 2, max_attempts: int = 6,
+                 base_delay: float = 30.0, max_delay: float = 3600.0,
+                 claim_ttl: float = 300.0, poll_interval: float = 5.0,
+                 retention: float = 7 * 24 * 3600, purge_interval: float = 3600.0):
+        """
+        Args:
+            email_service: EmailService used to deliver messages
+            db_path: SQLite file, defaults to $EMAIL_OUTBOX_DB
+            workers: Dispatch threads started by start()
+            max_attempts: Attempts before a message is dead-lettered
+            base_delay: First retry delay in seconds (doubles per attempt)
+            max_delay: Cap on the retry delay
+            claim_ttl: Seconds a claimed message stays locked to one worker
+            poll_interval: Idle workers re-check the outbox this often
+            retention: Seconds sent messages are kept before purge_sent drops them
+            purge_interval: Workers run purge_sent at most this often
+        """
+        self.email_service = email_service
+        self.db_path = db_path or DEFAULT_OUTBOX_DB
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.claim_ttl = claim_ttl
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.purge_interval = purge_interval
+
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize outbox table"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT UNIQUE,
+            to_email TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            html_body TEXT NOT NULL,
+            attachments TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            locked_by TEXT,
+            locked_until REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )
+        """)
+        # Attachment bytes stored once however many messages reference them
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS email_attachments (
+            sha256 TEXT PRIMARY KEY,
+            content BLOB NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+        ON email_outbox (status, next_attempt_at)
+        """)
+        conn.commit()
+        conn.close()
+
+    def enqueue(self, to_email: str, subject: str, html_body: str,
+                attachments: Optional[List[dict]] = None,
+                idempotency_key: Optional[str] = None,
+                send_after: Optional[float] = None) -> int:
+        """
+        Queue a message and return its outbox id without waiting on SMTP
+
+        A second enqueue with the same idempotency_key returns the
+        existing id and queues nothing.
+        """
+        refs, blobs = None, []
+        if attachments:
+            refs = []
+            for a in attachments:
+                content = a['content'].encode('utf-8') if isinstance(a['content'], str) else a['content']
+                digest = hashlib.sha256(content).hexdigest()
+                refs.append({'filename': a['filename'], 'sha256': digest})
+                blobs.append((digest, content))
+            refs = json.dumps(refs)
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            conn.executemany("""
+            INSERT OR IGNORE INTO email_attachments (sha256, content, created_at) VALUES (?, ?, ?)
+            """, [(digest, sqlite3.Binary(content), now) for digest, content in blobs])
+            cursor = conn.execute("""
+            INSERT INTO email_outbox
+                (idempotency_key, to_email, subject, html_body, attachments,
+                 next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(idempotency_key) DO NOTHING
+            """, (idempotency_key, to_email, subject, html_body, refs,
+                  send_after or now, now))
+            conn.commit()
+            if cursor.rowcount:
+                message_id = cursor.lastrowid
+            else:
+                message_id = conn.execute("SELECT id FROM email_outbox WHERE idempotency_key = ?",
+                                          (idempotency_key,)).fetchone()[0]
+                logger.info(f"Outbox: duplicate {idempotency_key!r} ignored")
+        finally:
+            conn.close()
+        self._wake.set()
+        return message_id
+
+    def claim(self, worker_id: str, limit: int = 10, now: Optional[float] = None) -> List[Dict]:
+        """Lock up to `limit` due messages to worker_id"""
+        now = time.time() if now is None else now
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("""
+            SELECT * FROM email_outbox
+            WHERE (status = 'pending' AND next_attempt_at <= ?)
+               OR (status = 'sending' AND locked_until < ?)
+            ORDER BY next_attempt_at
+            LIMIT ?
+            """, (now, now, limit)).fetchall()
+            conn.executemany("""
+            UPDATE email_outbox SET status = 'sending', locked_by = ?, locked_until = ?
+            WHERE id = ?
+            """, [(worker_id, now + self.claim_ttl, row['id']) for row in rows])
+            conn.commit()
+            return [dict(row) for row in rows]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _load_attachments(self, refs: List[Dict]) -> List[Dict]:
+        digests = [r['sha256'] for r in refs]
+        blobs = {}
+        if digests:
+            conn = self.get_connection()
+            rows = conn.execute(f"""
+            SELECT sha256, content FROM email_attachments
+            WHERE sha256 IN ({','.join('?' * len(digests))})
+            """, digests).fetchall()
+            conn.close()
+            blobs = {row['sha256']: bytes(row['content']) for row in rows}
+        return [
+            {'filename': r['filename'],
+             'content': blobs[r['sha256']]}
+            for r in refs
+        ]
+
+    def _deliver(self, message: Dict):
+        attachments = None
+        if message['attachments']:
+            attachments = self._load_attachments(json.loads(message['attachments']))
+        self.email_service.deliver(message['to_email'], message['subject'],
+                                   message['html_body'], attachments)
+
+    def _finish(self, message: Dict, worker_id: str, error: Optional[Exception]):
+        now = time.time()
+        attempts = message['attempts'] + 1
+        conn = self.get_connection()
+        if error is None:
+            conn.execute("""
+            UPDATE email_outbox SET status = 'sent', attempts = ?, sent_at = ?,
+                locked_by = NULL, locked_until = NULL, last_error = NULL
+            WHERE id = ? AND locked_by = ?
+            """, (attempts, now, message['id'], worker_id))
+        elif _is_permanent(error) or attempts >= self.max_attempts:
+            conn.execute("""
+            UPDATE email_outbox SET status = 'dead', attempts = ?, last_error = ?,
+                locked_by = NULL, locked_until = NULL
+            WHERE id = ? AND locked_by = ?
+            """, (attempts, str(error)[:500], message['id'], worker_id))
+            logger.error(f"Outbox: message {message['id']} to {message['to_email']} "
+                         f"dead-lettered after {attempts} attempts: {error}")
+        else:
+            conn.execute("""
+            UPDATE email_outbox SET status = 'pending', attempts = ?, last_error = ?,
+                next_attempt_at = ?, locked_by = NULL, locked_until = NULL
+            WHERE id = ? AND locked_by = ?
+            """, (attempts, str(error)[:500], now + self._retry_delay(attempts),
+                  message['id'], worker_id))
+            logger.warning(f"Outbox: message {message['id']} attempt {attempts} failed: {error}")
+        conn.commit()
+        conn.close()
+
+    def dispatch_once(self, worker_id: Optional[str] = None, limit: int = 10) -> int:
+        """Claim and send one batch; returns number of messages attempted"""
+        worker_id = worker_id or f"outbox:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        messages = self.claim(worker_id, limit)
+        for message in messages:
+            try:
+                self._deliver(message)
+            except Exception as e:
+                self._finish(message, worker_id, e)
+            else:
+                self._finish(message, worker_id, None)
+        return len(messages)
+
+    def _purge_if_due(self):
+        """Run purge_sent from whichever worker finds it due"""
+        with self._purge_lock:
+            now = time.time()
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        removed = self.purge_sent(self.retention)
+        if removed:
+            logger.info(f"Email outbox purged {removed} sent messages")
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stop.is_set():
+            # Clear before claiming so an enqueue during dispatch is not missed
+            self._wake.clear()
+            try:
+                self._purge_if_due()
+                if self.dispatch_once(worker_id):
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox worker {worker_id} error: {e}")
+            self._wake.wait(self.poll_interval)
+
+    def start(self):
+        """Start background dispatch threads (idempotent)"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            worker_id = f"outbox:{os.getpid()}:{i}:{uuid.uuid4().hex[:6]}"
+            thread = threading.Thread(target=self._worker_loop, args=(worker_id,),
+                                      name=f"email-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Email outbox started with {self.workers} workers ({self.db_path})")
+
+    def stop(self, timeout: float = 10.0):
+        """Stop workers; undelivered messages stay queued in the database"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def flush(self, timeout: float = 30.0) -> int:
+        """
+        Send every message that is due now from the calling thread (for
+        short-lived scripts whose daemon workers die at exit)
+
+        Returns:
+            Messages still pending or sending afterwards (e.g. in retry backoff)
+        """
+        deadline = time.time() + timeout
+        worker_id = f"outbox:{os.getpid()}:flush:{uuid.uuid4().hex[:6]}"
+        while time.time() < deadline and self.dispatch_once(worker_id):
+            pass
+        stats = self.get_stats()
+        return stats.get('pending', 0) + stats.get('sending', 0)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Message counts by status"""
+        conn = self.get_connection()
+        rows = conn.execute("SELECT status, COUNT(*) FROM email_outbox GROUP BY status").fetchall()
+        conn.close()
+        return {row[0]: row[1] for row in rows}
+
+    def get_dead_letters(self, limit: int = 100) -> List[Dict]:
+        conn = self.get_connection()
+        rows = conn.execute("""
+        SELECT id, idempotency_key, to_email, subject, attempts, last_error, created_at
+        FROM email_outbox WHERE status = 'dead'
+        ORDER BY id DESC LIMIT ?
+        """, (limit,)).fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def requeue_dead(self, message_ids: List[int]) -> int:
+        """Give dead-lettered messages a fresh set of attempts"""
+        if not message_ids:
+            return 0
+        conn = self.get_connection()
+        cursor = conn.execute(f"""
+        UPDATE email_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+        WHERE status = 'dead' AND id IN ({','.join('?' * len(message_ids))})
+        """, [time.time(), *message_ids])
+        conn.commit()
+        requeued = cursor.rowcount
+        conn.close()
+        self._wake.set()
+        return requeued
+
+    def purge_sent(self, older_than: float = 7 * 24 * 3600) -> int:
+        """Delete sent messages older than this and attachments nothing references"""
+        conn = self.get_connection()
+        cursor = conn.execute("DELETE FROM email_outbox WHERE status = 'sent' AND sent_at < ?",
+                              (time.time() - older_than,))
+        removed = cursor.rowcount
+        referenced = set()
+        for row in conn.execute("SELECT attachments FROM email_outbox WHERE attachments IS NOT NULL"):
+            referenced.update(r.get('sha256') for r in json.loads(row[0]))
+        stored = [row[0] for row in conn.execute("SELECT sha256 FROM email_attachments")]
+        conn.executemany("DELETE FROM email_attachments WHERE sha256 = ?",
+                         [(digest,) for digest in stored if digest not in referenced])
+        conn.commit()
+        conn.close()
+        return removed
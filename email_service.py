@@ -1,24 +1,60 @@
 """
 Email service using Brevo SMTP
 """
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
+from collections import OrderedDict
 from typing import Optional, List
 import os
+import html
+import hashlib
+import threading
 from datetime import datetime
 import logging
 
+from email_templates import TEMPLATES, BRAND_GRADIENT
+from smtp_pool import SMTPConnectionPool
+
 logger = logging.getLogger(__name__)
 
+SEVERITY_COLORS = {
+    'info': '#17a2b8',
+    'warning': '#ffc107',
+    'critical': '#dc3545'
+}
+
+# Base64-encoded attachment parts, reused when the same file goes to many recipients
+_ATTACHMENT_PARTS_MAX = 64
+_attachment_parts: "OrderedDict[tuple, MIMEApplication]" = OrderedDict()
+_attachment_parts_lock = threading.Lock()
+
+
+def attachment_part(filename: str, content) -> MIMEApplication:
+    """MIME part for an attachment, encoded once per (filename, content)"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    key = (filename, hashlib.sha256(content).hexdigest())
+    with _attachment_parts_lock:
+        part = _attachment_parts.get(key)
+        if part is not None:
+            _attachment_parts.move_to_end(key)
+            return part
+    part = MIMEApplication(content, Name=filename)
+    part['Content-Disposition'] = f'attachment; filename="{filename}"'
+    with _attachment_parts_lock:
+        _attachment_parts[key] = part
+        while len(_attachment_parts) > _ATTACHMENT_PARTS_MAX:
+            _attachment_parts.popitem(last=False)
+    return part
+
 
 class EmailService:
     """Email service for sending itineraries and alerts"""
     
     def __init__(self):
         """Initialize email service with Brevo credentials"""
-        self.smtp_host = "smtp-relay.brevo.com"
+        self.smtp_host = os.getenv("SMTP_HOST", "smtp-relay.brevo.com")
         self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
         self.sender_email = os.getenv("SENDER_EMAIL", "a1afbb001@smtp-brevo.com")
         self.sender_password = os.getenv("SENDER_PASSWORD", "")
@@ -26,9 +62,57 @@ class EmailService:
         self.email_from_name = os.getenv("EMAIL_FROM_NAME", "MyAgent Booking")
         self.email_reply_to = os.getenv("EMAIL_REPLY_TO", "support@myagentbooking.com")
         self.use_tls = os.getenv("EMAIL_USE_TLS", "True").lower() == "true"
+        
+        # Persistent SMTP sessions shared by all sends
+        self.pool = SMTPConnectionPool(
+            self.smtp_host, self.smtp_port,
+            username=self.sender_email,
+            password=self.sender_password,
+            use_tls=self.use_tls,
+            max_connections=int(os.getenv("SMTP_POOL_SIZE", "4")),
+            max_messages_per_connection=int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+        )
+        
+        # When set, send_email() enqueues instead of sending inline
+        self.outbox = None
+    
+    def enable_outbox(self, outbox):
+        """Route send_email() through an EmailOutbox and start its workers"""
+        self.outbox = outbox
+        outbox.start()
+    
+    def _build_message(self, to_email: str, subject: str, html_body: str,
+                       attachments: Optional[List[dict]] = None) -> MIMEMultipart:
+        """Build the MIME message for send_email"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = f"{self.email_from_name} <{self.email_from}>"
+        msg['To'] = to_email
+        msg['Reply-To'] = self.email_reply_to
+        
+        # Attach HTML body
+        html_part = MIMEText(html_body, 'html', 'utf-8')
+        msg.attach(html_part)
+        
+        # Attach files if provided (shared, already-encoded parts)
+        if attachments:
+            for attachment in attachments:
+                msg.attach(attachment_part(attachment['filename'], attachment['content']))
+        
+        return msg
+    
+    def deliver(self, to_email: str, subject: str, html_body: str,
+                attachments: Optional[List[dict]] = None):
+        """Send inline over the SMTP pool; raises on failure"""
+        msg = self._build_message(to_email, subject, html_body, attachments)
+        
+        # Reuses an open session (no new TLS handshake / AUTH)
+        self.pool.send_message(msg)
     
     def send_email(self, to_email: str, subject: str, html_body: str,
-                   attachments: Optional[List[dict]] = None) -> bool:
+                   attachments: Optional[List[dict]] = None,
+                   idempotency_key: Optional[str] = None,
+                   queue: Optional[bool] = None) -> bool:
         """
         Send email via Brevo SMTP
         
@@ -37,42 +121,25 @@ class EmailService:
             subject: Email subject
             html_body: HTML email body
             attachments: List of dicts with 'filename' and 'content' keys
+            idempotency_key: Outbox dedup key (same key is only sent once)
+            queue: Enqueue to the outbox (default: whenever one is enabled);
+                False sends inline and reports the real SMTP result
             
         Returns:
-            True if sent successfully, False otherwise
+            True if sent (or queued) successfully, False otherwise
         """
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = f"{self.email_from_name} <{self.email_from}>"
-            msg['To'] = to_email
-            msg['Reply-To'] = self.email_reply_to
+            if queue is None:
+                queue = self.outbox is not None
+            if queue:
+                if self.outbox is None:
+                    raise RuntimeError("No email outbox enabled")
+                message_id = self.outbox.enqueue(to_email, subject, html_body,
+                                                 attachments, idempotency_key)
+                logger.info(f"Email to {to_email} queued (outbox id {message_id})")
+                return True
             
-            # Attach HTML body
-            html_part = MIMEText(html_body, 'html', 'utf-8')
-            msg.attach(html_part)
-            
-            # Attach files if provided
-            if attachments:
-                for attachment in attachments:
-                    part = MIMEApplication(
-                        attachment['content'],
-                        Name=attachment['filename']
-                    )
-                    part['Content-Disposition'] = f'attachment; filename="{attachment["filename"]}"'
-                    msg.attach(part)
-            
-            # Connect and send
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.set_debuglevel(0)
-            
-            if self.use_tls:
-                server.starttls()
-            
-            server.login(self.sender_email, self.sender_password)
-            server.send_message(msg)
-            server.quit()
+            self.deliver(to_email, subject, html_body, attachments)
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
@@ -84,159 +151,87 @@ class EmailService:
     def send_itinerary_email(self, to_email: str, user_name: str,
                             trip_name: str, destination: str,
                             depart_date: str, return_date: str,
-                            pdf_content: bytes, ics_content: bytes) -> bool:
+                            pdf_content: bytes, ics_content: bytes,
+                            idempotency_key: Optional[str] = None,
+                            locale: Optional[str] = None) -> bool:
         """Send trip itinerary with attachments"""
-        
-        subject = f"🎫 Your Trip Itinerary: {trip_name}"
-        
-        html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-        .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                   color: white; padding: 30px; text-align: center; border-radius: 10px; }}
-        .content {{ background: #f9f9f9; padding: 30px; margin: 20px 0; border-radius: 10px; }}
-        .trip-info {{ background: white; padding: 20px; margin: 15px 0; border-left: 4px solid #667eea; }}
-        .button {{ background: #667eea; color: white; padding: 12px 30px; text-decoration: none; 
-                   border-radius: 5px; display: inline-block; margin: 10px 0; }}
-        .footer {{ text-align: center; color: #666; font-size: 12px; margin-top: 30px; }}
-        .alert-box {{ background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 15px 0; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>✈️ Your Trip is Ready!</h1>
-            <p>Complete itinerary with booking links</p>
-        </div>
-        
-        <div class="content">
-            <h2>Hello {user_name},</h2>
-            <p>Your travel itinerary for <strong>{trip_name}</strong> is ready! We've attached your complete itinerary and calendar file.</p>
-            
-            <div class="trip-info">
-                <h3>📍 Trip Details</h3>
-                <p><strong>Destination:</strong> {destination}</p>
-                <p><strong>Departure:</strong> {depart_date}</p>
-                <p><strong>Return:</strong> {return_date}</p>
-            </div>
-            
-            <h3>📎 Attachments</h3>
-            <ul>
-                <li><strong>travel_itinerary.pdf</strong> - Complete trip details with booking links</li>
-                <li><strong>trip_calendar.ics</strong> - Import to your calendar app</li>
-            </ul>
-            
-            <h3>⚡ Quick Actions</h3>
-            <p>Open the PDF to find:</p>
-            <ul>
-                <li>✅ Flight comparison with direct booking links</li>
-                <li>🏨 Hotel recommendations with prices</li>
-                <li>🚖 Transportation estimates</li>
-                <li>📋 Pre-booking checklist</li>
-            </ul>
-            
-            <div class="alert-box">
-                <strong>🔔 Real-Time Monitoring Active</strong><br>
-                We'll monitor your flights and send alerts for any delays, gate changes, or price drops.
-            </div>
-            
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="https://myagentbooking.com/trips" class="button">View on Dashboard</a>
-            </div>
-        </div>
-        
-        <div class="footer">
-            <p>© 2025 MyAgent Booking | Powered by Gemini AI</p>
-            <p>Need help? Reply to this email or visit our support center.</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
+        subject, html_body = TEMPLATES.render(
+            'itinerary', locale,
+            header_bg=BRAND_GRADIENT, accent='#667eea',
+            user_name=user_name, trip_name=trip_name, destination=destination,
+            depart_date=depart_date, return_date=return_date
+        )
         
         attachments = [
             {'filename': 'travel_itinerary.pdf', 'content': pdf_content},
             {'filename': 'trip_calendar.ics', 'content': ics_content}
         ]
         
-        return self.send_email(to_email, subject, html_body, attachments)
+        return self.send_email(to_email, subject, html_body, attachments,
+                               idempotency_key=idempotency_key)
+    
+    @staticmethod
+    def _flight_alert_fields(alert_type: str, flight_info: dict, message: str) -> dict:
+        """Template fields shared by everyone on the flight"""
+        severity = alert_type.split('_')[0] if '_' in alert_type else 'info'
+        color = SEVERITY_COLORS.get(severity, '#17a2b8')
+        updated = flight_info.get('updated_time')
+        return {
+            'header_bg': color, 'accent': color, 'message': message,
+            'subject_flight': flight_info.get('flight_number', 'Your Flight'),
+            'flight_number': flight_info.get('flight_number', 'N/A'),
+            'route': flight_info.get('route', 'N/A'),
+            'scheduled_time': flight_info.get('scheduled_time', 'N/A'),
+            'updated_time_html': (f"<p><strong>Updated Time:</strong> {html.escape(str(updated))}</p>"
+                                  if updated else ""),
+        }
     
     def send_flight_alert(self, to_email: str, user_name: str, 
                          alert_type: str, flight_info: dict, 
-                         message: str) -> bool:
+                         message: str, idempotency_key: Optional[str] = None,
+                         locale: Optional[str] = None) -> bool:
         """Send flight status alert"""
+        subject, html_body = TEMPLATES.render(
+            'flight_alert', locale, user_name=user_name,
+            **self._flight_alert_fields(alert_type, flight_info, message)
+        )
         
-        severity_colors = {
-            'info': '#17a2b8',
-            'warning': '#ffc107',
-            'critical': '#dc3545'
-        }
-        
-        severity = alert_type.split('_')[0] if '_' in alert_type else 'info'
-        color = severity_colors.get(severity, '#17a2b8')
-        
-        subject = f"⚠️ Flight Alert: {flight_info.get('flight_number', 'Your Flight')}"
+        return self.send_email(to_email, subject, html_body,
+                               idempotency_key=idempotency_key)
+    
+    def send_flight_alert_bulk(self, recipients: List[tuple], alert_type: str,
+                               flight_info: dict, message: str,
+                               idempotency_prefix: Optional[str] = None,
+                               locale: Optional[str] = None) -> int:
+        """
+        Send one flight alert to every passenger on the flight
         
-        html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-        .header {{ background: {color}; color: white; padding: 20px; text-align: center; border-radius: 10px; }}
-        .content {{ background: #f9f9f9; padding: 30px; margin: 20px 0; border-radius: 10px; }}
-        .alert-box {{ background: white; border-left: 4px solid {color}; padding: 20px; margin: 15px 0; }}
-        .button {{ background: {color}; color: white; padding: 12px 30px; text-decoration: none; 
-                   border-radius: 5px; display: inline-block; margin: 10px 0; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>⚠️ Flight Status Update</h1>
-        </div>
+        The shared fields are rendered once; each recipient only costs
+        their name substitution.
         
-        <div class="content">
-            <h2>Hello {user_name},</h2>
-            
-            <div class="alert-box">
-                <h3>{message}</h3>
-                <p><strong>Flight:</strong> {flight_info.get('flight_number', 'N/A')}</p>
-                <p><strong>Route:</strong> {flight_info.get('route', 'N/A')}</p>
-                <p><strong>Scheduled:</strong> {flight_info.get('scheduled_time', 'N/A')}</p>
-                {f"<p><strong>Updated Time:</strong> {flight_info.get('updated_time', 'N/A')}</p>" if flight_info.get('updated_time') else ""}
-            </div>
-            
-            <h3>💡 Recommended Actions:</h3>
-            <ul>
-                <li>Check airline website for latest updates</li>
-                <li>Contact your airline if rebooking is needed</li>
-                <li>Monitor our dashboard for real-time updates</li>
-            </ul>
+        Args:
+            recipients: (email, user_name) pairs
+            idempotency_prefix: Per-recipient key is f"{prefix}:{email}"
             
-            <div style="text-align: center; margin: 30px 0;">
-                <a href="https://myagentbooking.com/trips" class="button">View Dashboard</a>
-            </div>
-        </div>
-        
-        <div style="text-align: center; color: #666; font-size: 12px; margin-top: 30px;">
-            <p>© 2025 MyAgent Booking | Real-Time Flight Monitoring</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
-        
-        return self.send_email(to_email, subject, html_body)
+        Returns:
+            Number of emails sent (or queued)
+        """
+        subject_tpl, body_tpl = TEMPLATES.bind(
+            'flight_alert', locale, **self._flight_alert_fields(alert_type, flight_info, message))
+        subject = subject_tpl.render()
+        sent = 0
+        for to_email, user_name in recipients:
+            key = f"{idempotency_prefix}:{to_email}" if idempotency_prefix else None
+            if self.send_email(to_email, subject, body_tpl.render(user_name=user_name),
+                               idempotency_key=key):
+                sent += 1
+        return sent
     
     def send_budget_alert(self, to_email: str, user_name: str,
                          trip_name: str, budget: float, 
-                         current_cost: float, over_budget: bool) -> bool:
+                         current_cost: float, over_budget: bool,
+                         idempotency_key: Optional[str] = None,
+                         locale: Optional[str] = None) -> bool:
         """Send budget warning email"""
         
         percent = (current_cost / budget * 100) if budget > 0 else 0
@@ -250,62 +245,78 @@ class EmailService:
             alert_msg = f"You've used {percent:.0f}% of your ${budget:.2f} budget"
             color = "#ffc107"
         
-        html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-        .header {{ background: {color}; color: white; padding: 20px; text-align: center; border-radius: 10px; }}
-        .content {{ background: #f9f9f9; padding: 30px; margin: 20px 0; border-radius: 10px; }}
-        .budget-box {{ background: white; padding: 20px; margin: 15px 0; border-left: 4px solid {color}; }}
-        .progress-bar {{ background: #e9ecef; height: 30px; border-radius: 15px; overflow: hidden; }}
-        .progress-fill {{ background: {color}; height: 100%; text-align: center; line-height: 30px; 
-                          color: white; font-weight: bold; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>💰 Budget Alert</h1>
-        </div>
+        subject, html_body = TEMPLATES.render(
+            'budget_alert', locale,
+            subject=subject, header_bg=color, accent=color,
+            user_name=user_name, alert_msg=alert_msg, trip_name=trip_name,
+            budget=f"{budget:.2f}", current_cost=f"{current_cost:.2f}",
+            remaining=f"{max(0, budget - current_cost):.2f}",
+            percent=f"{percent:.0f}", bar_percent=f"{min(100, percent):.0f}"
+        )
         
-        <div class="content">
-            <h2>Hello {user_name},</h2>
-            
-            <div class="budget-box">
-                <h3>{alert_msg}</h3>
-                <p><strong>Trip:</strong> {trip_name}</p>
-                <p><strong>Budget:</strong> ${budget:.2f}</p>
-                <p><strong>Current Spending:</strong> ${current_cost:.2f}</p>
-                <p><strong>Remaining:</strong> ${max(0, budget - current_cost):.2f}</p>
-                
-                <div class="progress-bar">
-                    <div class="progress-fill" style="width: {min(100, percent):.0f}%">
-                        {percent:.0f}%
-                    </div>
-                </div>
-            </div>
-            
-            <h3>💡 Tips to Stay on Budget:</h3>
-            <ul>
-                <li>Review your upcoming bookings</li>
-                <li>Consider budget-friendly alternatives</li>
-                <li>Look for discounts and deals</li>
-                <li>Adjust your itinerary if needed</li>
-            </ul>
-        </div>
+        return self.send_email(to_email, subject, html_body,
+                               idempotency_key=idempotency_key)
+    
+    def send_alert_digest(self, to_email: str, user_name: str, trip_name: str,
+                          alerts: List[dict], idempotency_key: Optional[str] = None,
+                          locale: Optional[str] = None,
+                          attachments: Optional[List[dict]] = None) -> bool:
+        """
+        Send several coalesced alerts for one trip as a single email
         
-        <div style="text-align: center; color: #666; font-size: 12px; margin-top: 30px;">
-            <p>© 2025 MyAgent Booking</p>
-        </div>
-    </div>
-</body>
-</html>
-"""
+        Args:
+            alerts: alert_digest pending alerts ('kind', 'severity', 'payload')
+            attachments: e.g. the rebooking alerts' trip-update.ics deltas
+        """
+        severity_order = {'critical': 0, 'warning': 1, 'high': 1, 'medium': 2}
+        alerts = sorted(alerts, key=lambda a: severity_order.get(a.get('severity'), 3))
+        
+        items = []
+        for alert in alerts:
+            p = alert['payload']
+            color = SEVERITY_COLORS.get(alert.get('severity'), '#17a2b8')
+            if alert['kind'] == 'flight':
+                info = p.get('flight_info', {})
+                details = f"<strong>Flight:</strong> {html.escape(str(info.get('flight_number', 'N/A')))} &middot; " \
+                          f"<strong>Route:</strong> {html.escape(str(info.get('route', 'N/A')))}"
+                if info.get('updated_time'):
+                    details += f" &middot; <strong>Updated Time:</strong> {html.escape(str(info['updated_time']))}"
+                title = p.get('message', 'Flight status update')
+            elif alert['kind'] == 'budget':
+                budget, cost = p.get('budget', 0), p.get('current_cost', 0)
+                percent = (cost / budget * 100) if budget > 0 else 0
+                title = "Over budget" if p.get('over_budget') else f"Budget at {percent:.0f}%"
+                details = f"<strong>Spent:</strong> ${cost:.2f} of ${budget:.2f}"
+            else:
+                title = p.get('summary') or p.get('subject', 'Rebooking suggestion')
+                details = (f'<a href="{html.escape(p["link"])}">Rebook now →</a>'
+                           if p.get('link') else '')
+            items.append(f"""
+            <div class="alert-box" style="border-left-color: {color};">
+                <h3>{html.escape(str(title))}</h3>
+                <p>{details}</p>
+            </div>""")
         
-        return self.send_email(to_email, subject, html_body)
+        worst = alerts[0].get('severity') if alerts else 'info'
+        color = SEVERITY_COLORS.get(worst, '#17a2b8')
+        subject, html_body = TEMPLATES.render(
+            'alert_digest', locale,
+            header_bg=color, accent=color, count=len(alerts),
+            user_name=user_name, trip_name=trip_name, items_html=''.join(items)
+        )
+        
+        return self.send_email(to_email, subject, html_body, attachments,
+                               idempotency_key=idempotency_key)
+    
+    def flush(self, timeout: float = 30.0) -> int:
+        """Deliver queued mail that is due now; returns messages left queued"""
+        return self.outbox.flush(timeout) if self.outbox else 0
+    
+    def close(self):
+        """Stop outbox workers and close pooled SMTP sessions"""
+        if self.outbox:
+            self.outbox.stop()
+        self.pool.close()
 
 
 # Singleton instance
@@ -316,4 +327,8 @@ def get_email_service() -> EmailService:
     global _email_service
     if _email_service is None:
         _email_service = EmailService()
+        # Durable background delivery unless explicitly disabled
+        if os.getenv("EMAIL_OUTBOX", "true").lower() == "true":
+            from email_outbox import EmailOutbox
+            _email_service.enable_outbox(EmailOutbox(_email_service))
     return _email_service
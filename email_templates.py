@@ -0,0 +1,369 @@
+"""
+Precompiled HTML email templates
+
+Every template is composed with the shared layout (CSS, header, footer)
+and parsed into literal chunks and field slots once, at import. Rendering
+is a single join over the slots. bind() pre-fills the fields shared by a
+bulk send, so each recipient only pays for their own fields.
+
+Placeholders: {{name}} is HTML-escaped, {{{name}}} is inserted raw (for
+pre-rendered fragments). Subjects are plain text, so every placeholder in
+a subject is inserted raw. Templates are registered per locale and fall
+back to DEFAULT_LOCALE.
+"""
+import re
+import html
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCALE = 'en'
+
+_FIELD = re.compile(r'\{\{\{\s*(\w+)\s*\}\}\}|\{\{\s*(\w+)\s*\}\}')
+
+
+class CompiledTemplate:
+    """Template text split into literals and (field, escape) slots"""
+
+    def __init__(self, parts: List):
+        # str literal, or (name, escape) tuple
+        self.parts = parts
+        self.fields = {p[0] for p in parts if isinstance(p, tuple)}
+
+    @classmethod
+    def compile(cls, text: str, escape: bool = True) -> 'CompiledTemplate':
+        """escape=False inserts every field raw (plain-text templates)"""
+        parts = []
+        pos = 0
+        for match in _FIELD.finditer(text):
+            if match.start() > pos:
+                parts.append(text[pos:match.start()])
+            raw, escaped = match.group(1), match.group(2)
+            parts.append((raw or escaped, escape and escaped is not None))
+            pos = match.end()
+        if pos < len(text):
+            parts.append(text[pos:])
+        return cls(parts)
+
+    def bind(self, **fields) -> 'CompiledTemplate':
+        """New template with some fields filled in and adjacent literals merged"""
+        parts = []
+        for part in self.parts:
+            if isinstance(part, tuple) and part[0] in fields:
+                value = str(fields[part[0]])
+                part = html.escape(value) if part[1] else value
+            if isinstance(part, str) and parts and isinstance(parts[-1], str):
+                parts[-1] += part
+            else:
+                parts.append(part)
+        return CompiledTemplate(parts)
+
+    def render(self, **fields) -> str:
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                value = fields.get(part[0], '')
+                value = '' if value is None else str(value)
+                out.append(html.escape(value) if part[1] else value)
+        return ''.join(out)
+
+
+# Shared by every email
+BASE_CSS = """
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: {{{header_bg}}}; color: white; padding: 30px; text-align: center; border-radius: 10px; }
+        .content { background: #f9f9f9; padding: 30px; margin: 20px 0; border-radius: 10px; }
+        .alert-box { background: white; border-left: 4px solid {{{accent}}}; padding: 20px; margin: 15px 0; }
+        .button { background: {{{accent}}}; color: white; padding: 12px 30px; text-decoration: none;
+                  border-radius: 5px; display: inline-block; margin: 10px 0; }
+        .footer { text-align: center; color: #666; font-size: 12px; margin-top: 30px; }"""
+
+LAYOUT = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>%(css)s%(extra_css)s
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            %(header)s
+        </div>
+        %(body)s
+        <div class="footer">
+            %(footer)s
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+BRAND_GRADIENT = 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)'
+
+DASHBOARD_BUTTON = """
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="https://myagentbooking.com/trips" class="button">%s</a>
+            </div>"""
+
+
+class TemplateRegistry:
+    """(name, locale) -> compiled subject and body"""
+
+    def __init__(self):
+        self._templates: Dict[Tuple[str, str], Tuple[CompiledTemplate, CompiledTemplate]] = {}
+
+    def register(self, name: str, locale: str, subject: str, header: str, body: str,
+                 footer: str, extra_css: str = ''):
+        text = LAYOUT % {'css': BASE_CSS, 'extra_css': extra_css, 'header': header,
+                         'body': body, 'footer': footer}
+        self._templates[(name, locale)] = (CompiledTemplate.compile(subject, escape=False),
+                                           CompiledTemplate.compile(text))
+
+    def get(self, name: str, locale: Optional[str] = None) -> Tuple[CompiledTemplate, CompiledTemplate]:
+        """(subject, body) templates, falling back to DEFAULT_LOCALE"""
+        template = self._templates.get((name, locale or DEFAULT_LOCALE))
+        if template is None:
+            template = self._templates[(name, DEFAULT_LOCALE)]
+        return template
+
+    def render(self, name: str, locale: Optional[str] = None, **fields) -> Tuple[str, str]:
+        subject, body = self.get(name, locale)
+        return subject.render(**fields), body.render(**fields)
+
+    def bind(self, name: str, locale: Optional[str] = None,
+             **shared) -> Tuple[CompiledTemplate, CompiledTemplate]:
+        """Templates with the fields shared by all recipients already filled in"""
+        subject, body = self.get(name, locale)
+        return subject.bind(**shared), body.bind(**shared)
+
+
+def _build_registry() -> TemplateRegistry:
+    registry = TemplateRegistry()
+
+    registry.register(
+        'itinerary', 'en',
+        subject="🎫 Your Trip Itinerary: {{trip_name}}",
+        extra_css="""
+        .trip-info { background: white; padding: 20px; margin: 15px 0; border-left: 4px solid #667eea; }
+        .notice { background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 15px 0; }""",
+        header="""<h1>✈️ Your Trip is Ready!</h1>
+            <p>Complete itinerary with booking links</p>""",
+        body="""
+        <div class="content">
+            <h2>Hello {{user_name}},</h2>
+            <p>Your travel itinerary for <strong>{{trip_name}}</strong> is ready! We've attached your complete itinerary and calendar file.</p>
+
+            <div class="trip-info">
+                <h3>📍 Trip Details</h3>
+                <p><strong>Destination:</strong> {{destination}}</p>
+                <p><strong>Departure:</strong> {{depart_date}}</p>
+                <p><strong>Return:</strong> {{return_date}}</p>
+            </div>
+
+            <h3>📎 Attachments</h3>
+            <ul>
+                <li><strong>travel_itinerary.pdf</strong> - Complete trip details with booking links</li>
+                <li><strong>trip_calendar.ics</strong> - Import to your calendar app</li>
+            </ul>
+
+            <h3>⚡ Quick Actions</h3>
+            <p>Open the PDF to find:</p>
+            <ul>
+                <li>✅ Flight comparison with direct booking links</li>
+                <li>🏨 Hotel recommendations with prices</li>
+                <li>🚖 Transportation estimates</li>
+                <li>📋 Pre-booking checklist</li>
+            </ul>
+
+            <div class="notice">
+                <strong>🔔 Real-Time Monitoring Active</strong><br>
+                We'll monitor your flights and send alerts for any delays, gate changes, or price drops.
+            </div>
+            """ + DASHBOARD_BUTTON % "View on Dashboard" + """
+        </div>""",
+        footer="""<p>© 2025 MyAgent Booking | Powered by Gemini AI</p>
+            <p>Need help? Reply to this email or visit our support center.</p>""",
+    )
+
+    registry.register(
+        'flight_alert', 'en',
+        subject="⚠️ Flight Alert: {{subject_flight}}",
+        header="<h1>⚠️ Flight Status Update</h1>",
+        body="""
+        <div class="content">
+            <h2>Hello {{user_name}},</h2>
+
+            <div class="alert-box">
+                <h3>{{message}}</h3>
+                <p><strong>Flight:</strong> {{flight_number}}</p>
+                <p><strong>Route:</strong> {{route}}</p>
+                <p><strong>Scheduled:</strong> {{scheduled_time}}</p>
+                {{{updated_time_html}}}
+            </div>
+
+            <h3>💡 Recommended Actions:</h3>
+            <ul>
+                <li>Check airline website for latest updates</li>
+                <li>Contact your airline if rebooking is needed</li>
+                <li>Monitor our dashboard for real-time updates</li>
+            </ul>
+            """ + DASHBOARD_BUTTON % "View Dashboard" + """
+        </div>""",
+        footer="<p>© 2025 MyAgent Booking | Real-Time Flight Monitoring</p>",
+    )
+
+    registry.register(
+        'budget_alert', 'en',
+        subject="{{subject}}",
+        extra_css="""
+        .progress-bar { background: #e9ecef; height: 30px; border-radius: 15px; overflow: hidden; }
+        .progress-fill { background: {{{accent}}}; height: 100%; text-align: center; line-height: 30px;
+                         color: white; font-weight: bold; }""",
+        header="<h1>💰 Budget Alert</h1>",
+        body="""
+        <div class="content">
+            <h2>Hello {{user_name}},</h2>
+
+            <div class="alert-box">
+                <h3>{{alert_msg}}</h3>
+                <p><strong>Trip:</strong> {{trip_name}}</p>
+                <p><strong>Budget:</strong> ${{budget}}</p>
+                <p><strong>Current Spending:</strong> ${{current_cost}}</p>
+                <p><strong>Remaining:</strong> ${{remaining}}</p>
+
+                <div class="progress-bar">
+                    <div class="progress-fill" style="width: {{bar_percent}}%">
+                        {{percent}}%
+                    </div>
+                </div>
+            </div>
+
+            <h3>💡 Tips to Stay on Budget:</h3>
+            <ul>
+                <li>Review your upcoming bookings</li>
+                <li>Consider budget-friendly alternatives</li>
+                <li>Look for discounts and deals</li>
+                <li>Adjust your itinerary if needed</li>
+            </ul>
+        </div>""",
+        footer="<p>© 2025 MyAgent Booking</p>",
+    )
+
+    registry.register(
+        'alert_digest', 'en',
+        subject="🔔 {{count}} updates for your trip: {{trip_name}}",
+        header="""<h1>🔔 Trip Updates</h1>
+            <p>{{trip_name}}</p>""",
+        body="""
+        <div class="content">
+            <h2>Hello {{user_name}},</h2>
+            <p>Here is the latest on your trip since our last message:</p>
+            {{{items_html}}}
+            """ + DASHBOARD_BUTTON % "View Dashboard" + """
+        </div>""",
+        footer="<p>© 2025 MyAgent Booking | Real-Time Flight Monitoring</p>",
+    )
+
+    rebooking_css = """
+        .notice { background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; }
+        .flight-card { background: #f8f9fa; padding: 20px; margin: 15px 0; border-radius: 8px; }
+        .price { font-size: 1.5em; font-weight: bold; color: #28a745; }"""
+
+    registry.register(
+        'rebooking', 'zh',
+        subject="🔄 改签建议: {{original_flight}} → {{new_flight}}",
+        extra_css=rebooking_css,
+        header="""<h1>🔄 航班改签建议</h1>
+            <p>我们为您找到了更好的替代航班</p>""",
+        body="""
+        <div class="notice">
+            <strong>⚠️ 原航班状态:</strong> {{original_status}}<br>
+            需要在 {{deadline}} 前采取行动
+        </div>
+
+        <h2>📍 原航班信息</h2>
+        <div class="flight-card">
+            <strong>航班号:</strong> {{original_flight}}<br>
+            <strong>航空公司:</strong> {{original_airline}}<br>
+            <strong>状态:</strong> ❌ {{original_status}}
+        </div>
+
+        <h2>✅ 推荐替代航班</h2>
+        <div class="flight-card" style="border-left: 4px solid #28a745;">
+            <strong>航班号:</strong> {{new_flight}}<br>
+            <strong>航空公司:</strong> {{new_airline}}<br>
+            <strong>起飞时间:</strong> {{departure_time}}<br>
+            <strong>到达时间:</strong> {{arrival_time}}<br>
+            <strong>可用座位:</strong> {{available_seats}} 个<br>
+            <div class="price">差价: {{price_estimate}}</div>
+        </div>
+
+        <h3>📋 改签步骤:</h3>
+        <ol>
+            {{{steps_html}}}
+        </ol>
+
+        <div style="text-align: center; margin: 30px 0;">
+            <a href="{{booking_link}}" class="button">立即改签 →</a>
+        </div>
+
+        <p style="color: #666; font-size: 0.9em;">
+            💡 提示: 改签通常免费,只需支付差价。建议尽快操作以确保座位。
+        </p>""",
+        footer="<p>© 2025 MyAgent Booking</p>",
+    )
+
+    registry.register(
+        'rebooking', 'en',
+        subject="🔄 Rebooking suggestion: {{original_flight}} → {{new_flight}}",
+        extra_css=rebooking_css,
+        header="""<h1>🔄 Rebooking Suggestion</h1>
+            <p>We found a better alternative flight for you</p>""",
+        body="""
+        <div class="notice">
+            <strong>⚠️ Original flight status:</strong> {{original_status}}<br>
+            Please act before {{deadline}}
+        </div>
+
+        <h2>📍 Original Flight</h2>
+        <div class="flight-card">
+            <strong>Flight:</strong> {{original_flight}}<br>
+            <strong>Airline:</strong> {{original_airline}}<br>
+            <strong>Status:</strong> ❌ {{original_status}}
+        </div>
+
+        <h2>✅ Recommended Alternative</h2>
+        <div class="flight-card" style="border-left: 4px solid #28a745;">
+            <strong>Flight:</strong> {{new_flight}}<br>
+            <strong>Airline:</strong> {{new_airline}}<br>
+            <strong>Departure:</strong> {{departure_time}}<br>
+            <strong>Arrival:</strong> {{arrival_time}}<br>
+            <strong>Seats available:</strong> {{available_seats}}<br>
+            <div class="price">Fare difference: {{price_estimate}}</div>
+        </div>
+
+        <h3>📋 Steps:</h3>
+        <ol>
+            {{{steps_html}}}
+        </ol>
+
+        <div style="text-align: center; margin: 30px 0;">
+            <a href="{{booking_link}}" class="button">Rebook now →</a>
+        </div>
+
+        <p style="color: #666; font-size: 0.9em;">
+            💡 Tip: Changes are usually free apart from the fare difference. Act soon to keep the seat.
+        </p>""",
+        footer="<p>© 2025 MyAgent Booking</p>",
+    )
+
+    return registry
+
+
+# Compiled once per process
+TEMPLATES = _build_registry()
@@ -0,0 +1,274 @@
+"""
+Flight status diff engine and append-only change event log
+
+FlightStatusDiffer compares two FlightStatus snapshots field by field and
+emits typed change events (gate_change, delay_increase, cancellation, ...)
+only when a change passes its significance threshold. Events are appended
+to FlightEventLog, which consumers (email, rebooking, UI) read by offset.
+"""
+import json
+import sqlite3
+import logging
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from free_flight_monitor import FlightStatus
+
+logger = logging.getLogger(__name__)
+
+
+# Event types
+TRACKING_STARTED = 'tracking_started'
+STATUS_CHANGE = 'status_change'
+CANCELLATION = 'cancellation'
+DIVERSION = 'diversion'
+DEPARTED = 'departed'
+LANDED = 'landed'
+DELAY_INCREASE = 'delay_increase'
+DELAY_DECREASE = 'delay_decrease'
+GATE_CHANGE = 'gate_change'
+ARRIVAL_GATE_CHANGE = 'arrival_gate_change'
+SCHEDULE_CHANGE = 'schedule_change'
+
+EVENT_SEVERITY = {
+    TRACKING_STARTED: 'info',
+    STATUS_CHANGE: 'info',
+    CANCELLATION: 'critical',
+    DIVERSION: 'critical',
+    DEPARTED: 'info',
+    LANDED: 'info',
+    DELAY_INCREASE: 'warning',
+    DELAY_DECREASE: 'info',
+    GATE_CHANGE: 'warning',
+    ARRIVAL_GATE_CHANGE: 'info',
+    SCHEDULE_CHANGE: 'warning',
+}
+
+# Provider status spellings folded together before comparing
+_STATUS_ALIASES = {
+    'canceled': 'cancelled',
+    'canceleduncertain': 'cancelled',
+    'arrived': 'landed',
+    'departed': 'active',
+    'enroute': 'active',
+    'en-route': 'active',
+}
+
+
+@dataclass
+class StatusChangeEvent:
+    """One significant field-level change of a flight"""
+    event_type: str
+    flight_number: str
+    field: str
+    old_value: Optional[object]
+    new_value: Optional[object]
+    severity: str = 'info'
+    flight_date: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    offset: Optional[int] = None  # Assigned by FlightEventLog.append
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class ChangeThresholds:
+    """Significance thresholds for the diff engine"""
+    delay_change_minutes: int = 15  # Min delay movement that counts
+    report_delay_decrease: bool = True
+    report_arrival_gate: bool = True
+    report_schedule_change: bool = True
+
+
+def _norm_status(status: Optional[str]) -> str:
+    s = (status or '').strip().lower()
+    return _STATUS_ALIASES.get(s, s)
+
+
+class FlightStatusDiffer:
+    """Field-level diff of two FlightStatus snapshots"""
+
+    def __init__(self, thresholds: Optional[ChangeThresholds] = None):
+        self.thresholds = thresholds or ChangeThresholds()
+
+    def diff(self, old: Optional['FlightStatus'], new: 'FlightStatus') -> List[StatusChangeEvent]:
+        """
+        Return the significant changes from old to new
+
+        A None old snapshot yields a single tracking_started event.
+        """
+        def event(event_type, field_name, old_value, new_value):
+            return StatusChangeEvent(
+                event_type=event_type,
+                flight_number=new.flight_number,
+                field=field_name,
+                old_value=old_value,
+                new_value=new_value,
+                severity=EVENT_SEVERITY.get(event_type, 'info'),
+                flight_date=new.flight_date
+            )
+
+        if old is None:
+            return [event(TRACKING_STARTED, 'status', None, new.status)]
+
+        th = self.thresholds
+        events = []
+
+        old_status, new_status = _norm_status(old.status), _norm_status(new.status)
+        if old_status != new_status:
+            if new_status == 'cancelled':
+                events.append(event(CANCELLATION, 'status', old.status, new.status))
+            elif new_status == 'diverted':
+                events.append(event(DIVERSION, 'status', old.status, new.status))
+            elif new_status == 'landed':
+                events.append(event(LANDED, 'status', old.status, new.status))
+            elif new_status == 'active' and old_status in ('scheduled', 'expected', 'boarding', 'gateclosed', 'delayed'):
+                events.append(event(DEPARTED, 'status', old.status, new.status))
+            else:
+                events.append(event(STATUS_CHANGE, 'status', old.status, new.status))
+
+        delay_delta = (new.delay_minutes or 0) - (old.delay_minutes or 0)
+        if delay_delta >= th.delay_change_minutes:
+            events.append(event(DELAY_INCREASE, 'delay_minutes', old.delay_minutes, new.delay_minutes))
+        elif -delay_delta >= th.delay_change_minutes and th.report_delay_decrease:
+            events.append(event(DELAY_DECREASE, 'delay_minutes', old.delay_minutes, new.delay_minutes))
+
+        if new.departure_gate and old.departure_gate != new.departure_gate:
+            events.append(event(GATE_CHANGE, 'departure_gate', old.departure_gate, new.departure_gate))
+
+        if th.report_arrival_gate and new.arrival_gate and old.arrival_gate != new.arrival_gate:
+            events.append(event(ARRIVAL_GATE_CHANGE, 'arrival_gate', old.arrival_gate, new.arrival_gate))
+
+        if (th.report_schedule_change and old.scheduled_departure and new.scheduled_departure
+                and old.scheduled_departure != new.scheduled_departure):
+            events.append(event(SCHEDULE_CHANGE, 'scheduled_departure',
+                                old.scheduled_departure, new.scheduled_departure))
+
+        return events
+
+
+class FlightEventLog:
+    """
+    Append-only SQLite log of status change events
+
+    Offsets are monotonically increasing; each consumer keeps its own
+    committed offset and reads everything after it.
+    """
+
+    def __init__(self, db_path: str = "monitor_state.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize event log tables"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS flight_events (
+            offset INTEGER PRIMARY KEY AUTOINCREMENT,
+            flight_number TEXT NOT NULL,
+            flight_date TEXT,
+            event_type TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_flight_events_flight
+        ON flight_events (flight_number, offset)
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS event_consumers (
+            consumer TEXT PRIMARY KEY,
+            committed_offset INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        conn.commit()
+        conn.close()
+
+    def append(self, events: List[StatusChangeEvent]) -> List[int]:
+        """Append events in one transaction; sets and returns their offsets"""
+        if not events:
+            return []
+        conn = self.get_connection()
+        offsets = []
+        try:
+            for ev in events:
+                cursor = conn.execute("""
+                INSERT INTO flight_events (flight_number, flight_date, event_type, severity, payload)
+                VALUES (?, ?, ?, ?, ?)
+                """, (ev.flight_number, ev.flight_date, ev.event_type, ev.severity,
+                      json.dumps(ev.to_dict(), default=str)))
+                ev.offset = cursor.lastrowid
+                offsets.append(ev.offset)
+            conn.commit()
+        finally:
+            conn.close()
+        return offsets
+
+    def read(self, after_offset: int = 0, limit: int = 500,
+             event_types: Optional[List[str]] = None,
+             flight_number: Optional[str] = None) -> List[StatusChangeEvent]:
+        """Read events with offset > after_offset, oldest first"""
+        query = "SELECT offset, payload FROM flight_events WHERE offset > ?"
+        params: List = [after_offset]
+        if event_types:
+            query += f" AND event_type IN ({','.join('?' * len(event_types))})"
+            params.extend(event_types)
+        if flight_number:
+            query += " AND flight_number = ?"
+            params.append(flight_number)
+        query += " ORDER BY offset LIMIT ?"
+        params.append(limit)
+
+        conn = self.get_connection()
+        rows = conn.execute(query, params).fetchall()
+        conn.close()
+
+        events = []
+        for row in rows:
+            data = json.loads(row['payload'])
+            data['offset'] = row['offset']
+            events.append(StatusChangeEvent(**data))
+        return events
+
+    def get_committed_offset(self, consumer: str) -> int:
+        conn = self.get_connection()
+        row = conn.execute(
+            "SELECT committed_offset FROM event_consumers WHERE consumer = ?", (consumer,)
+        ).fetchone()
+        conn.close()
+        return row['committed_offset'] if row else 0
+
+    def commit_offset(self, consumer: str, offset: int):
+        """Record that a consumer has processed everything up to offset"""
+        conn = self.get_connection()
+        conn.execute("""
+        INSERT INTO event_consumers (consumer, committed_offset) VALUES (?, ?)
+        ON CONFLICT(consumer) DO UPDATE SET
+            committed_offset = MAX(committed_offset, excluded.committed_offset),
+            updated_at = CURRENT_TIMESTAMP
+        """, (consumer, offset))
+        conn.commit()
+        conn.close()
+
+    def poll(self, consumer: str, limit: int = 500,
+             event_types: Optional[List[str]] = None) -> List[StatusChangeEvent]:
+        """Read the next batch for a consumer (commit_offset after handling it)"""
+        return self.read(self.get_committed_offset(consumer), limit, event_types)
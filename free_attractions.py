@@ -4,11 +4,119 @@ Uses free public data sources instead of paid APIs
 """
 import requests
 import json
-from typing import List, Dict, Optional
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import List, Dict, Optional, Callable, Tuple
 import logging
 
+from attraction_index import get_attraction_index
+from attraction_ranking import AttractionRanker, filter_by_budget
+from cache_store import SQLiteCache, MISSING
+from keyword_matcher import KeywordMatcher
+from overpass_query import OverpassQueryPlanner, fetch_overpass_attractions
+from spatial_index import SpatialIndex
+
 logger = logging.getLogger(__name__)
 
+# Shared by all scorer instances so late sources outlive the request
+_SOURCE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="attraction-src")
+
+# Per-source freshness; "no results" is cached for NEGATIVE_TTL only
+SOURCE_TTLS = {
+    'wikipedia': 7 * 24 * 3600,
+    'openstreetmap': 24 * 3600
+}
+NEGATIVE_TTL = 3600
+SOURCE_CACHE_MAX_ENTRIES = 5000
+
+# Category keywords, checked in this order of priority
+CATEGORY_KEYWORDS = OrderedDict([
+    ('museum', ['museum', 'gallery', 'art']),
+    ('religious', ['temple', 'church', 'shrine', 'cathedral']),
+    ('nature', ['park', 'garden', 'nature']),
+    ('shopping', ['market', 'shopping', 'mall']),
+    ('food', ['restaurant', 'food', 'cafe']),
+    ('landmark', ['tower', 'building', 'observation']),
+])
+_CATEGORY_MATCHER = KeywordMatcher.from_groups(CATEGORY_KEYWORDS)
+
+_source_caches: Dict[str, SQLiteCache] = {}
+_source_caches_lock = threading.Lock()
+
+
+def _source_cache(source: str) -> SQLiteCache:
+    """Persistent per-source cache, shared by all processes using $MYAGENT_CACHE_DB"""
+    with _source_caches_lock:
+        if source not in _source_caches:
+            _source_caches[source] = SQLiteCache(
+                f"attractions:{source}",
+                default_ttl=SOURCE_TTLS.get(source, 24 * 3600),
+                max_entries=SOURCE_CACHE_MAX_ENTRIES,
+                negative_ttl=NEGATIVE_TTL
+            )
+        return _source_caches[source]
+
+
+# destination -> (SpatialIndex over its known attractions, expires_at) (small LRU);
+# empty indexes and ones built after a failed OSM lookup are not kept
+_spatial_indexes: "OrderedDict[str, Tuple[SpatialIndex, float]]" = OrderedDict()
+_spatial_indexes_lock = threading.Lock()
+
+
+def _destination_key(destination: str) -> str:
+    return " ".join(destination.lower().split())
+
+
+def _source_cache_get(source: str, destination: str) -> Optional[List[Dict]]:
+    """Cached source result ([] = cached "no results"), or None if not cached"""
+    try:
+        cached = _source_cache(source).get(_destination_key(destination))
+    except Exception as e:
+        logger.warning(f"Attraction cache read failed: {e}")
+        return None
+    return None if cached is MISSING else cached
+
+
+def _source_cache_put(source: str, destination: str, future: Future):
+    """Done-callback: persist the source result for later lookups (failures are not cached)"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        _source_cache(source).set(_destination_key(destination), future.result() or [])
+    except Exception as e:
+        logger.warning(f"Attraction cache write failed: {e}")
+
+
+# (source, destination key) -> fetch still running on _SOURCE_POOL
+_source_fetches: Dict[Tuple[str, str], Future] = {}
+_source_fetches_lock = threading.Lock()
+
+
+def _source_fetch_done(source: str, destination: str, future: Future):
+    """Done-callback: cache the result, then stop sharing the finished fetch"""
+    _source_cache_put(source, destination, future)
+    with _source_fetches_lock:
+        key = (source, _destination_key(destination))
+        if _source_fetches.get(key) is future:
+            del _source_fetches[key]
+
+
+def _fetch_source(source: str, destination: str, fetch: Callable[[str], List[Dict]]) -> Future:
+    """Fetch on _SOURCE_POOL, joining a fetch of the same source and destination in flight"""
+    key = (source, _destination_key(destination))
+    with _source_fetches_lock:
+        future = _source_fetches.get(key)
+        if future is not None:
+            return future
+        future = _SOURCE_POOL.submit(fetch, destination)
+        _source_fetches[key] = future
+    # Outside the lock: a fetch that already finished runs the callback right here
+    future.add_done_callback(partial(_source_fetch_done, source, destination))
+    return future
+
 
 class FreeAttractionScorer:
     """
@@ -21,8 +129,16 @@ class FreeAttractionScorer:
     3. Wikidata (free, no key needed)
     """
     
+    WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
+    
     def __init__(self):
         self.cache = {}
+        self._partial = set()  # cache keys built before every source answered
+        # One keep-alive session for all sources
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': 'MyAgentBooking/1.0'})
+        self.ranker = AttractionRanker()
+        self.overpass_planner = OverpassQueryPlanner()
     
     def get_attractions_from_wikipedia(self, location: str) -> List[Dict]:
         """
@@ -30,163 +146,261 @@ class FreeAttractionScorer:
         100% free, no API key needed
         """
         try:
-            # Search Wikipedia for location
-            search_url = "https://en.wikipedia.org/w/api.php"
-            search_params = {
-                'action': 'query',
-                'format': 'json',
-                'list': 'search',
-                'srsearch': f'tourist attractions in {location}',
-                'srlimit': 10
-            }
-            
-            response = requests.get(search_url, params=search_params, timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                attractions = []
-                
-                for result in data.get('query', {}).get('search', []):
-                    title = result['title']
-                    snippet = result['snippet']
-                    
-                    # Get page details
-                    page_url = "https://en.wikipedia.org/w/api.php"
-                    page_params = {
-                        'action': 'query',
-                        'format': 'json',
-                        'titles': title,
-                        'prop': 'extracts|pageimages',
-                        'exintro': True,
-                        'explaintext': True,
-                        'pithumbsize': 300
-                    }
-                    
-                    page_response = requests.get(page_url, params=page_params, timeout=10)
-                    
-                    if page_response.status_code == 200:
-                        page_data = page_response.json()
-                        pages = page_data.get('query', {}).get('pages', {})
-                        
-                        for page_id, page_info in pages.items():
-                            attractions.append({
-                                'name': page_info.get('title', title),
-                                'description': page_info.get('extract', snippet)[:200] + '...',
-                                'category': self._categorize_attraction(title, snippet),
-                                'source': 'wikipedia',
-                                'url': f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
-                            })
-                
-                return attractions[:10]
-            
-            return []
-            
+            return self._fetch_wikipedia(location)
         except Exception as e:
             logger.error(f"Wikipedia API error: {e}")
             return []
     
-    def get_attractions_from_osm(self, location: str) -> List[Dict]:
+    def _fetch_wikipedia(self, location: str) -> List[Dict]:
+        """
+        Wikipedia lookup that raises on network/HTTP errors, so a failure
+        is never cached as "no attractions"
+        
+        Uses generator=search so the search hits and their intro extracts
+        come back in a single request instead of one request per page.
+        """
+        params = {
+            'action': 'query',
+            'format': 'json',
+            'generator': 'search',
+            'gsrsearch': f'tourist attractions in {location}',
+            'gsrlimit': 10,
+            'prop': 'extracts|pageimages',
+            'exintro': True,
+            'explaintext': True,
+            'exlimit': 'max',
+            'pithumbsize': 300
+        }
+        
+        response = self.session.get(self.WIKIPEDIA_API, params=params, timeout=10)
+        response.raise_for_status()
+        
+        data = response.json()
+        pages = data.get('query', {}).get('pages', {}).values()
+        attractions = []
+        
+        # Pages come back keyed by id; 'index' is the search rank
+        pages = sorted(pages, key=lambda p: p.get('index', 0))
+        categories = self.categorize_many(
+            [(p.get('title', ''), p.get('extract', '')[:300]) for p in pages])
+        for page_info, category in zip(pages, categories):
+            title = page_info.get('title', '')
+            extract = page_info.get('extract', '')
+            attraction = {
+                'name': title,
+                'description': extract[:200] + '...',
+                'category': category,
+                'source': 'wikipedia',
+                'url': f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}"
+            }
+            if page_info.get('thumbnail', {}).get('source'):
+                attraction['image'] = page_info['thumbnail']['source']
+            attractions.append(attraction)
+        
+        return attractions[:10]
+    
+    def get_attractions_from_osm(self, location: str, limit: int = 200) -> List[Dict]:
         """
         Get attractions from OpenStreetMap Nominatim
         100% free, no API key needed
+        
+        Returns up to `limit` named attractions, nearest to the city centre first.
         """
         try:
-            # Geocode location first
-            geocode_url = "https://nominatim.openstreetmap.org/search"
-            geocode_params = {
-                'q': location,
-                'format': 'json',
-                'limit': 1
-            }
-            
-            headers = {
-                'User-Agent': 'MyAgentBooking/1.0'  # Required by OSM
-            }
-            
-            response = requests.get(geocode_url, params=geocode_params, 
-                                   headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                geo_data = response.json()
-                
-                if geo_data and len(geo_data) > 0:
-                    lat = geo_data[0]['lat']
-                    lon = geo_data[0]['lon']
-                    
-                    # Search for nearby attractions
-                    # Using Overpass API (free OSM query service)
-                    overpass_url = "https://overpass-api.de/api/interpreter"
-                    
-                    # Query for tourism attractions within 5km
-                    overpass_query = f"""
-                    [out:json];
-                    (
-                      node["tourism"](around:5000,{lat},{lon});
-                      way["tourism"](around:5000,{lat},{lon});
-                      relation["tourism"](around:5000,{lat},{lon});
-                    );
-                    out body;
-                    """
-                    
-                    overpass_response = requests.post(
-                        overpass_url, 
-                        data={'data': overpass_query},
-                        timeout=30
-                    )
-                    
-                    if overpass_response.status_code == 200:
-                        osm_data = overpass_response.json()
-                        attractions = []
-                        
-                        for element in osm_data.get('elements', [])[:20]:
-                            tags = element.get('tags', {})
-                            name = tags.get('name')
-                            
-                            if name:
-                                attractions.append({
-                                    'name': name,
-                                    'category': tags.get('tourism', 'attraction'),
-                                    'description': tags.get('description', ''),
-                                    'address': tags.get('addr:full', ''),
-                                    'source': 'openstreetmap',
-                                    'lat': element.get('lat'),
-                                    'lon': element.get('lon')
-                                })
-                        
-                        return attractions
-            
-            return []
-            
+            return self._fetch_osm(location, limit)
         except Exception as e:
             logger.error(f"OpenStreetMap API error: {e}")
             return []
     
+    def _fetch_osm(self, location: str, limit: int = 200) -> List[Dict]:
+        """OpenStreetMap lookup that raises on network/HTTP errors (see _fetch_wikipedia)"""
+        # Geocode location first
+        geocode_url = "https://nominatim.openstreetmap.org/search"
+        geocode_params = {
+            'q': location,
+            'format': 'json',
+            'limit': 1
+        }
+        
+        headers = {
+            'User-Agent': 'MyAgentBooking/1.0'  # Required by OSM
+        }
+        
+        response = self.session.get(geocode_url, params=geocode_params, 
+                                    headers=headers, timeout=10)
+        response.raise_for_status()
+        
+        geo_data = response.json()
+        if not geo_data:
+            return []  # Unknown place: a real "no results"
+        
+        lat = float(geo_data[0]['lat'])
+        lon = float(geo_data[0]['lon'])
+        
+        # Named, tag-filtered features, nearest rings first
+        attractions = fetch_overpass_attractions(
+            self.session, lat, lon, limit=limit, planner=self.overpass_planner)
+        
+        # Nearest to the city centre first (order within a page is arbitrary)
+        return SpatialIndex(attractions).nearest(
+            lat, lon, k=limit, max_radius_m=self.overpass_planner.radius_m)
+    
+    def get_attractions_near(self, destination: str, lat: Optional[float] = None,
+                             lon: Optional[float] = None, radius_m: float = 5000,
+                             k: int = 20, decay_m: Optional[float] = None) -> List[Dict]:
+        """
+        Attractions around a point (e.g. the hotel), answered locally
+        
+        Uses the cached OSM results for the destination plus the offline
+        index; only queries Overpass when neither has the destination.
+        
+        Args:
+            destination: City the point is in
+            lat, lon: Search centre; defaults to the city centre
+            radius_m: Search radius in meters
+            k: Max results
+            decay_m: Rank by score * exp(-distance/decay_m) instead of distance
+            
+        Returns:
+            Attractions with 'distance_m', nearest (or best decayed score) first
+        """
+        index = self._spatial_index(destination)
+        if index is None or not len(index):
+            return []
+        if lat is None or lon is None:
+            center = self._city_center(destination, index)
+            if center is None:
+                return []
+            lat, lon = center
+        return index.within_radius(lat, lon, radius_m, limit=k, decay_m=decay_m)
+    
+    def _spatial_index(self, destination: str) -> Optional[SpatialIndex]:
+        key = _destination_key(destination)
+        now = time.time()
+        with _spatial_indexes_lock:
+            entry = _spatial_indexes.get(key)
+            if entry is not None and entry[1] > now:
+                _spatial_indexes.move_to_end(key)
+                return entry[0]
+        
+        # Only an answered OSM lookup makes the index worth keeping
+        items = _source_cache_get('openstreetmap', destination)
+        fetched = items is not None
+        if not fetched:
+            try:
+                items = self._fetch_osm(destination)
+                _source_cache('openstreetmap').set(key, items)
+                fetched = True
+            except Exception as e:
+                logger.warning(f"OpenStreetMap lookup failed for {destination}: {e}")
+                items = []
+        items = list(items)
+        ttl = SOURCE_TTLS['openstreetmap'] if items else NEGATIVE_TTL
+        
+        offline = get_attraction_index()
+        if offline:
+            seen = {a['name'].lower() for a in items}
+            items.extend(a for a in offline.by_city(destination, limit=500)
+                         if a['name'].lower() not in seen)
+        
+        index = SpatialIndex(items)
+        if fetched and len(index):
+            # Expires with the OSM results it was built from
+            with _spatial_indexes_lock:
+                _spatial_indexes[key] = (index, now + ttl)
+                _spatial_indexes.move_to_end(key)
+                while len(_spatial_indexes) > 64:
+                    _spatial_indexes.popitem(last=False)
+        return index
+    
+    @staticmethod
+    def _city_center(destination: str, index: SpatialIndex) -> Optional[Tuple[float, float]]:
+        offline = get_attraction_index()
+        center = offline.city_center(destination) if offline else None
+        if center is None:
+            # Centroid of known attractions
+            center = index.centroid()
+        return center
+    
+    def _source_fetchers(self) -> Dict[str, Callable[[str], List[Dict]]]:
+        """Attraction sources in merge order; they raise on transport errors"""
+        return {
+            # Better for major attractions
+            'wikipedia': self._fetch_wikipedia,
+            # Better for local spots
+            'openstreetmap': self._fetch_osm
+        }
+    
+    def _all_sources_cached(self, destination: str) -> bool:
+        return all(_source_cache_get(name, destination) is not None
+                   for name in self._source_fetchers())
+    
+    def _gather_sources(self, destination: str, deadline: float) -> Tuple[List[Dict], bool, bool]:
+        """
+        Query all sources concurrently and stop waiting at the deadline
+        
+        Sources that miss the deadline keep running in the background and
+        store their result in the source cache, so the next lookup of the
+        same destination gets them instantly; a lookup made meanwhile waits
+        on the running fetch instead of starting another.
+        
+        Returns:
+            (attractions in source order, whether every source finished,
+             whether a source failed)
+        """
+        results = {}
+        pending = {}
+        for name, fetch in self._source_fetchers().items():
+            cached = _source_cache_get(name, destination)
+            if cached is not None:
+                results[name] = cached
+            else:
+                pending[_fetch_source(name, destination, fetch)] = name
+        
+        if pending:
+            done, not_done = wait(list(pending), timeout=deadline)
+            failed = set()
+            for future in done:
+                if future.exception() is not None:
+                    # Not cached either; the next lookup retries the source
+                    logger.warning(f"{pending[future]} failed for {destination}: {future.exception()}")
+                    failed.add(future)
+                else:
+                    results[pending[future]] = future.result() or []
+            for future in not_done:
+                logger.info(f"{pending[future]} missed {deadline}s deadline for {destination}; "
+                            f"result will be cached when it arrives")
+        else:
+            not_done, failed = set(), set()
+        
+        all_attractions = []
+        for name in self._source_fetchers():
+            all_attractions.extend(results.get(name, []))
+        return all_attractions, not not_done, bool(failed)
+    
     def get_popular_attractions(self, destination: str, 
-                               interests: List[str] = None) -> List[Dict]:
+                               interests: List[str] = None,
+                               deadline: float = 1.5) -> List[Dict]:
         """
         Get popular attractions using multiple free sources
         
         Args:
             destination: City or location
             interests: List of interest categories (optional)
+            deadline: Max seconds to wait for sources; late sources are
+                left out of this result but cached for the next call
             
         Returns:
             List of attractions with scores
         """
-        # Check cache first
+        # Check cache first; a partial result is reused (never waiting on
+        # the deadline twice) until the late sources have landed
         cache_key = f"{destination}:{','.join(interests or [])}"
         if cache_key in self.cache:
-            return self.cache[cache_key]
+            if cache_key not in self._partial or not self._all_sources_cached(destination):
+                return self.cache[cache_key]
         
-        all_attractions = []
-        
-        # Get from Wikipedia (better for major attractions)
-        wiki_attractions = self.get_attractions_from_wikipedia(destination)
-        all_attractions.extend(wiki_attractions)
-        
-        # Get from OpenStreetMap (better for local spots)
-        osm_attractions = self.get_attractions_from_osm(destination)
-        all_attractions.extend(osm_attractions)
+        all_attractions, complete, failed = self._gather_sources(destination, deadline)
         
         # Remove duplicates by name
         seen_names = set()
@@ -196,62 +410,41 @@ class FreeAttractionScorer:
             name_lower = attr['name'].lower()
             if name_lower not in seen_names:
                 seen_names.add(name_lower)
-                
-                # Add mock scoring (in real app, could use view counts, etc.)
-                attr['score'] = self._calculate_score(attr, interests)
                 attr['rating'] = 4.5  # Mock rating
                 attr['price_level'] = self._estimate_price_level(attr)
-                
                 unique_attractions.append(attr)
         
-        # Sort by score
-        unique_attractions.sort(key=lambda x: x['score'], reverse=True)
+        # Score and sort all candidates in one pass
+        result = self.ranker.rank(unique_attractions, interests, limit=10)
         
-        # Cache results
-        result = unique_attractions[:10]
+        # Cache results; a failed source is retried on the next call instead
+        if failed:
+            self.cache.pop(cache_key, None)
+            self._partial.discard(cache_key)
+            return result
         self.cache[cache_key] = result
+        if complete:
+            self._partial.discard(cache_key)
+        else:
+            self._partial.add(cache_key)
         
         return result
     
     def _categorize_attraction(self, title: str, description: str) -> str:
         """Categorize attraction based on title and description"""
-        text = (title + " " + description).lower()
-        
-        if any(word in text for word in ['museum', 'gallery', 'art']):
-            return 'museum'
-        elif any(word in text for word in ['temple', 'church', 'shrine', 'cathedral']):
-            return 'religious'
-        elif any(word in text for word in ['park', 'garden', 'nature']):
-            return 'nature'
-        elif any(word in text for word in ['market', 'shopping', 'mall']):
-            return 'shopping'
-        elif any(word in text for word in ['restaurant', 'food', 'cafe']):
-            return 'food'
-        elif any(word in text for word in ['tower', 'building', 'observation']):
-            return 'landmark'
-        else:
-            return 'attraction'
+        return _CATEGORY_MATCHER.classify(title + " " + description,
+                                          CATEGORY_KEYWORDS, 'attraction')
+    
+    def categorize_many(self, items: List[Tuple[str, str]]) -> List[str]:
+        """Categorize (title, description) pairs"""
+        return _CATEGORY_MATCHER.classify_many(
+            [title + " " + description for title, description in items],
+            CATEGORY_KEYWORDS, 'attraction')
     
     def _calculate_score(self, attraction: Dict, interests: List[str] = None) -> float:
         """Calculate attraction score (0-100)"""
-        score = 50.0  # Base score
-        
-        # Boost score if matches interests
-        if interests:
-            category = attraction.get('category', '').lower()
-            for interest in interests:
-                if interest.lower() in category:
-                    score += 20
-        
-        # Boost if from Wikipedia (usually more notable)
-        if attraction.get('source') == 'wikipedia':
-            score += 15
-        
-        # Boost if has description
-        if attraction.get('description'):
-            score += 10
-        
-        return min(100, score)
+        # Base 50, +20 per matching interest, +15 Wikipedia, +10 description
+        return float(self.ranker.score([attraction], interests)[0])
     
     def _estimate_price_level(self, attraction: Dict) -> str:
         """Estimate price level based on attraction type"""
@@ -326,9 +519,37 @@ class SimpleAttractionRecommender:
                  'price': '$', 'score': 85, 'description': 'Large royal park'},
             ],
         }
+        # Existing score + 30 per matching interest, uncapped
+        self.ranker = AttractionRanker(interest_boost=30.0, source_boosts={},
+                                       description_boost=0.0, base_score=None,
+                                       max_score=None)
+    
+    @staticmethod
+    def _from_index(record: Dict) -> Dict:
+        """Convert an offline index record to the recommender's format"""
+        category = record['category']
+        if category in ('park', 'garden', 'religious', 'viewpoint', 'artwork', 'monument', 'historic'):
+            price = '$'
+        elif category in ('museum', 'gallery', 'castle', 'landmark', 'attraction'):
+            price = '$$'
+        else:
+            price = '$$$'
+        popularity = record['popularity']
+        return {
+            'name': record['name'],
+            'category': category.replace('_', ' ').title(),
+            'rating': round(min(5.0, 3.5 + popularity / 8), 1),
+            'price': price,
+            'score': min(100, round(50 + popularity * 6)),
+            'description': '',
+            'source': record['source'],
+            'lat': record['lat'],
+            'lon': record['lon']
+        }
     
     def get_recommendations(self, destination: str, interests: List[str] = None,
-                          budget: str = 'medium') -> List[Dict]:
+                          budget: str = 'medium',
+                          interest_weights: Optional[Dict[str, float]] = None) -> List[Dict]:
         """
         Get attraction recommendations from pre-loaded database
         
@@ -336,6 +557,7 @@ class SimpleAttractionRecommender:
             destination: City name
             interests: List of interests (culture, food, nature, etc.)
             budget: low, medium, or high
+            interest_weights: Optional interest -> weight (default 1.0 each)
             
         Returns:
             List of recommended attractions
@@ -351,7 +573,13 @@ class SimpleAttractionRecommender:
                 break
         
         if not attractions:
-            # City not in database, try to fetch from free APIs
+            # City not in database, try the offline index (no network)
+            index = get_attraction_index()
+            if index:
+                attractions = [self._from_index(a) for a in index.by_city(destination, 20)]
+        
+        if not attractions:
+            # Not indexed either, try to fetch from free APIs
             free_scorer = FreeAttractionScorer()
             attractions = free_scorer.get_popular_attractions(destination, interests)
         
@@ -359,31 +587,15 @@ class SimpleAttractionRecommender:
             return []
         
         # Filter by budget
-        budget_map = {
-            'low': ['$'],
-            'medium': ['$', '$$'],
-            'high': ['$', '$$', '$$$', '$$$$']
-        }
-        allowed_prices = budget_map.get(budget, ['$', '$$'])
-        filtered = [a for a in attractions if a.get('price', '$') in allowed_prices]
-        
-        # Filter by interests if provided
-        if interests:
-            scored = []
-            for attr in filtered:
-                match_score = 0
-                category_lower = attr.get('category', '').lower()
-                for interest in interests:
-                    if interest.lower() in category_lower:
-                        match_score += 30
-                
-                attr['match_score'] = attr.get('score', 50) + match_score
-                scored.append(attr)
-            
-            scored.sort(key=lambda x: x.get('match_score', 0), reverse=True)
-            return scored[:10]
+        filtered = filter_by_budget(attractions, budget)
+        
+        # Without interests keep the source order
+        if not interests:
+            return filtered[:10]
         
-        return filtered[:10]
+        # Rank by score + 30 per matching interest
+        return self.ranker.rank(filtered, interests, interest_weights=interest_weights,
+                                limit=10, score_key='match_score')
 
 
 # Main interface - use this in your app
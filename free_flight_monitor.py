@@ -11,12 +11,20 @@ import time
 import threading
 import requests
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Callable
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Callable, ContextManager
 import logging
 import json
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, asdict
 import schedule
 
+from cache_store import SQLiteCache, MISSING
+from monitor_state import MonitorStateStore
+from weather_rules import ColumnarForecast, SevereWeatherEngine
+from flight_events import FlightStatusDiffer, FlightEventLog, ChangeThresholds, StatusChangeEvent
+
 logger = logging.getLogger(__name__)
 
 
@@ -244,6 +252,173 @@ class FlightRadarScraper:
             return None
 
 
+class FlightStatusCache:
+    """
+    Per-flight status cache keyed by (flight_number, date)
+
+    - TTL depends on flight phase (airborne flights go stale fast,
+      landed/cancelled flights barely change)
+    - Concurrent lookups of the same flight share one upstream fetch
+    - Stale entries can be served immediately while a background
+      refresh runs (stale-while-revalidate)
+    """
+
+    # Seconds an entry stays fresh, by normalized phase
+    PHASE_TTLS = {
+        'scheduled': 900,
+        'boarding': 120,
+        'active': 180,
+        'delayed': 300,
+        'diverted': 300,
+        'incident': 120,
+        'landed': 3600,
+        'cancelled': 6 * 3600,
+    }
+
+    # Provider status strings -> phase used for TTL selection
+    PHASE_ALIASES = {
+        'expected': 'scheduled',
+        'checkin': 'scheduled',
+        'gateclosed': 'boarding',
+        'departed': 'active',
+        'enroute': 'active',
+        'en-route': 'active',
+        'approaching': 'active',
+        'arrived': 'landed',
+        'canceled': 'cancelled',
+        'canceleduncertain': 'cancelled',
+    }
+
+    def __init__(self, ttls: Optional[Dict[str, int]] = None,
+                 default_ttl: int = 300, negative_ttl: int = 60,
+                 max_stale: int = 3600):
+        """
+        Args:
+            ttls: Override per-phase TTLs (seconds)
+            default_ttl: TTL for phases not listed in PHASE_TTLS
+            negative_ttl: How long an "all providers failed" result is cached
+            max_stale: How long past expiry an entry may still be served stale
+        """
+        self.ttls = dict(self.PHASE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.max_stale = max_stale
+
+        self._entries = {}  # (flight_number, date) -> (status, fetched_at, ttl)
+        self._inflight = {}  # (flight_number, date) -> Future
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'coalesced': 0}
+
+    def ttl_for(self, status: Optional[FlightStatus]) -> int:
+        """Pick a TTL based on the flight's phase"""
+        if status is None:
+            return self.negative_ttl
+        phase = (status.status or '').strip().lower()
+        phase = self.PHASE_ALIASES.get(phase, phase)
+        return self.ttls.get(phase, self.default_ttl)
+
+    def peek(self, key) -> Optional[tuple]:
+        """Return (status, age_seconds, ttl) without triggering a fetch"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        status, fetched_at, ttl = entry
+        return status, time.time() - fetched_at, ttl
+
+    def get_or_fetch(self, key, fetch: Callable[[], Optional[FlightStatus]],
+                     allow_stale: bool = False,
+                     max_age: Optional[float] = None) -> Optional[FlightStatus]:
+        """
+        Return a cached status or fetch it, coalescing concurrent fetches
+
+        Args:
+            key: (flight_number, date)
+            fetch: Zero-arg callable that queries the providers
+            allow_stale: Serve an expired entry right away and refresh
+                in the background instead of blocking
+            max_age: Caller-imposed freshness bound (seconds), tighter than TTL;
+                also caps how old a stale entry may be
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                status, fetched_at, ttl = entry
+                age = now - fetched_at
+                limit = ttl if max_age is None else min(ttl, max_age)
+                if age < limit:
+                    self.stats['hits'] += 1
+                    return status
+                if (allow_stale and age < ttl + self.max_stale
+                        and (max_age is None or age < max_age)):
+                    self.stats['stale_hits'] += 1
+                    self._start_fetch_locked(key, fetch, background=True)
+                    return status
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats['coalesced'] += 1
+            else:
+                self.stats['misses'] += 1
+                future = self._start_fetch_locked(key, fetch, background=False)
+
+        if future is None:
+            # We own the fetch - run it on this thread
+            return self._run_fetch(key, fetch)
+        return future.result()
+
+    def _start_fetch_locked(self, key, fetch, background: bool):
+        """Register an in-flight fetch (caller holds the lock)"""
+        if key in self._inflight:
+            return self._inflight[key]
+        self._inflight[key] = Future()
+        if background:
+            threading.Thread(target=self._run_fetch, args=(key, fetch),
+                             daemon=True).start()
+            return self._inflight[key]
+        return None
+
+    def _run_fetch(self, key, fetch) -> Optional[FlightStatus]:
+        with self._lock:
+            future = self._inflight[key]
+        try:
+            status = fetch()
+        except Exception as e:
+            logger.error(f"Status fetch failed for {key[0]}: {e}")
+            status = None
+
+        with self._lock:
+            if status is not None or key not in self._entries:
+                self._entries[key] = (status, time.time(), self.ttl_for(status))
+            self._inflight.pop(key, None)
+        future.set_result(status)
+        return status
+
+    def invalidate(self, flight_number: str, date: Optional[str] = None):
+        """Drop cached entries for a flight (all dates if date is None)"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == flight_number and (date is None or key[1] == date):
+                    del self._entries[key]
+
+    def purge_expired(self):
+        """Remove entries too old to be served even as stale"""
+        now = time.time()
+        with self._lock:
+            for key, (_, fetched_at, ttl) in list(self._entries.items()):
+                if now - fetched_at >= ttl + self.max_stale:
+                    del self._entries[key]
+
+
+@contextmanager
+def _always_owned(flight_number: str):
+    """Lease guard of an unsharded monitor: every flight is ours"""
+    yield True
+
+
 class FlightMonitor:
     """
     Multi-source flight monitor with free API fallback chain
@@ -254,14 +429,59 @@ class FlightMonitor:
     3. FlightRadar24 Scraping (unlimited but rate-limited)
     """
     
-    def __init__(self):
-        """Initialize with all free APIs"""
+    # Daily call budgets (with buffer); None means no hard limit
+    PROVIDER_DAILY_LIMITS = {
+        'aerodatabox': 140,
+        'aviationstack': 3,
+        'flightradar': None
+    }
+    
+    def __init__(self, status_cache: Optional[FlightStatusCache] = None,
+                 hedged: bool = False, hedge_after: Optional[float] = None,
+                 hedge_quota_fraction: float = 0.8,
+                 state_store: Optional[MonitorStateStore] = None,
+                 event_log: Optional[FlightEventLog] = None,
+                 thresholds: Optional[ChangeThresholds] = None):
+        """
+        Initialize with all free APIs
+        
+        Args:
+            status_cache: Shared status cache (a private one is created if omitted)
+            state_store: Durable watch list / last status (in-memory only if omitted)
+            event_log: Append-only log that receives typed change events
+            thresholds: Significance thresholds for the status diff engine
+            hedged: Race the next provider when the current one is slow
+            hedge_after: Seconds to wait before hedging; defaults to the
+                observed p95 latency of the slow provider
+            hedge_quota_fraction: Stop hedging into a provider once this
+                fraction of its daily budget is used (it is then only
+                tried as a plain fallback)
+        """
         self.aerodatabox = AeroDataBoxAPI()
         self.aviationstack = AviationStackAPI()
         self.flightradar = FlightRadarScraper()
         
-        self.monitored_flights = {}  # flight_number -> callback
+        # Shared by the monitor sweep, UI views and rebooking checks
+        self.status_cache = status_cache or FlightStatusCache()
+        
+        # Hedged-request mode
+        self.hedged = hedged
+        self.hedge_after = hedge_after
+        self.hedge_quota_fraction = hedge_quota_fraction
+        self.provider_latency = {name: deque(maxlen=200) for name in self.PROVIDER_DAILY_LIMITS}
+        self.provider_wins = {name: 0 for name in self.PROVIDER_DAILY_LIMITS}
+        self.hedges_fired = 0
+        self._usage_lock = threading.Lock()
+        self._hedge_pool = None
+        
+        self.monitored_flights = {}  # flight_number -> {callback, date, next_due}
         self.last_status = {}  # flight_number -> FlightStatus
+        self.state_store = state_store
+        
+        # Field-level change detection
+        self.differ = FlightStatusDiffer(thresholds)
+        self.event_log = event_log
+        self.event_listeners = []  # Callables receiving List[StatusChangeEvent]
         
         # Track API usage to avoid hitting limits
         self.api_calls_today = {
@@ -280,9 +500,31 @@ class FlightMonitor:
             logger.info("Reset daily API call counters")
     
     def get_flight_status(self, flight_number: str, 
-                         date: Optional[str] = None) -> Optional[FlightStatus]:
+                         date: Optional[str] = None,
+                         allow_stale: bool = False,
+                         max_age: Optional[float] = None) -> Optional[FlightStatus]:
         """
-        Get flight status with multi-source fallback
+        Get flight status, served from the per-flight cache when fresh
+        
+        Args:
+            flight_number: Flight number (e.g., "UA123")
+            date: Flight date (YYYY-MM-DD), defaults to today
+            allow_stale: Return an expired cached status immediately and
+                refresh in the background (for UI callers)
+            max_age: Require a status no older than this many seconds
+        """
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        return self.status_cache.get_or_fetch(
+            (flight_number, date),
+            lambda: self._fetch_flight_status(flight_number, date),
+            allow_stale=allow_stale,
+            max_age=max_age
+        )
+    
+    def _fetch_flight_status(self, flight_number: str,
+                             date: Optional[str] = None) -> Optional[FlightStatus]:
+        """
+        Query providers with multi-source fallback
         
         Uses free tier limits intelligently:
         - AeroDataBox: 150/day
@@ -291,6 +533,9 @@ class FlightMonitor:
         """
         self._reset_daily_counters()
         
+        if self.hedged:
+            return self._fetch_hedged(flight_number, date)
+        
         # Try AeroDataBox first (best free tier)
         if self.api_calls_today['aerodatabox'] < 140:  # Leave buffer
             logger.info(f"Trying AeroDataBox for {flight_number}")
@@ -320,8 +565,108 @@ class FlightMonitor:
         logger.warning(f"All APIs failed for {flight_number}")
         return None
     
+    def _provider_calls(self, flight_number: str, date: Optional[str]) -> List[tuple]:
+        """Providers in fallback order as (name, zero-arg call)"""
+        return [
+            ('aerodatabox', lambda: self.aerodatabox.get_flight_status(flight_number, date)),
+            ('aviationstack', lambda: self.aviationstack.get_flight_status(flight_number)),
+            ('flightradar', lambda: self.flightradar.get_flight_status(flight_number))
+        ]
+    
+    def _reserve_call(self, name: str, hedge: bool) -> bool:
+        """
+        Reserve one call against a provider's daily budget
+        
+        Reservations are refunded when the call returns nothing, so the
+        counters keep meaning "successful calls" as in the sequential chain.
+        """
+        limit = self.PROVIDER_DAILY_LIMITS[name]
+        with self._usage_lock:
+            used = self.api_calls_today[name]
+            if limit is not None:
+                cap = limit * self.hedge_quota_fraction if hedge else limit
+                if used >= cap:
+                    return False
+            self.api_calls_today[name] = used + 1
+            return True
+    
+    def _hedge_delay(self, name: str) -> float:
+        """Seconds to wait on a provider before firing the next one"""
+        if self.hedge_after is not None:
+            return self.hedge_after
+        samples = sorted(self.provider_latency[name])
+        if len(samples) < 20:
+            return 2.0
+        return samples[int(len(samples) * 0.95) - 1]
+    
+    def _timed_call(self, name: str, call: Callable[[], Optional[FlightStatus]]):
+        start = time.monotonic()
+        try:
+            status = call()
+        except Exception as e:
+            logger.error(f"{name} error: {e}")
+            status = None
+        with self._usage_lock:
+            self.provider_latency[name].append(time.monotonic() - start)
+            if status is None:
+                self.api_calls_today[name] -= 1
+        return name, status
+    
+    def _fetch_hedged(self, flight_number: str,
+                      date: Optional[str] = None) -> Optional[FlightStatus]:
+        """
+        Race providers: if the current one has not answered within its
+        hedge delay, fire the next in parallel and take the first valid answer
+        """
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="flight-hedge")
+        
+        remaining = self._provider_calls(flight_number, date)
+        pending = {}  # future -> provider name
+        
+        def launch_next(hedge: bool) -> Optional[str]:
+            while remaining:
+                name, call = remaining.pop(0)
+                if self._reserve_call(name, hedge):
+                    pending[self._hedge_pool.submit(self._timed_call, name, call)] = name
+                    return name
+            return None
+        
+        current = launch_next(hedge=False)
+        while pending:
+            done, _ = wait(list(pending), timeout=self._hedge_delay(current),
+                           return_when=FIRST_COMPLETED)
+            
+            if not done:
+                # Current provider is slow - hedge with the next one
+                hedged_into = launch_next(hedge=True)
+                if hedged_into:
+                    self.hedges_fired += 1
+                    logger.info(f"Hedging {flight_number}: {current} slow, racing {hedged_into}")
+                    current = hedged_into
+                else:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            
+            current_failed = False
+            for future in done:
+                del pending[future]
+                name, status = future.result()
+                if status:
+                    with self._usage_lock:
+                        self.provider_wins[name] += 1
+                    logger.info(f"✓ {name} won status race for {flight_number}")
+                    return status
+                current_failed = current_failed or name == current
+            
+            if current_failed:
+                # Plain fallback, same as the sequential chain
+                current = launch_next(hedge=False) or current
+        
+        logger.warning(f"All APIs failed for {flight_number}")
+        return None
+    
     def add_flight(self, flight_number: str, callback: Callable[[FlightStatus], None],
-                   flight_date: Optional[str] = None):
+                   flight_date: Optional[str] = None, callback_name: str = 'default'):
         """
         Add flight to monitoring list
         
@@ -329,11 +674,16 @@ class FlightMonitor:
             flight_number: Flight number (e.g., "UA123")
             callback: Function to call when status changes
             flight_date: Flight date (YYYY-MM-DD)
+            callback_name: Name the callback is re-bound by on warm restart
         """
+        flight_date = flight_date or datetime.now().strftime("%Y-%m-%d")
         self.monitored_flights[flight_number] = {
             'callback': callback,
-            'date': flight_date or datetime.now().strftime("%Y-%m-%d")
+            'date': flight_date,
+            'next_due': 0.0
         }
+        if self.state_store:
+            self.state_store.upsert_flight(flight_number, flight_date, callback_name)
         logger.info(f"Added flight {flight_number} to monitoring")
     
     def remove_flight(self, flight_number: str):
@@ -342,25 +692,113 @@ class FlightMonitor:
             del self.monitored_flights[flight_number]
             if flight_number in self.last_status:
                 del self.last_status[flight_number]
+            self.status_cache.invalidate(flight_number)
+            if self.state_store:
+                self.state_store.remove_flight(flight_number)
             logger.info(f"Removed flight {flight_number} from monitoring")
     
-    def check_status_changes(self):
-        """Check all monitored flights for status changes"""
-        for flight_number, data in self.monitored_flights.items():
+    def restore_state(self, callbacks: Dict[str, Callable[[FlightStatus], None]],
+                      flight_numbers: Optional[List[str]] = None) -> int:
+        """
+        Warm restart: reload the watch list, last statuses and due times
+        
+        Args:
+            callbacks: callback_name -> callable; flights whose name is not
+                found fall back to callbacks['default']
+            flight_numbers: Only restore these flights (sharded workers)
+            
+        Returns:
+            Number of flights restored
+        """
+        if not self.state_store:
+            return 0
+        
+        restored = 0
+        for row in self.state_store.load_flights(flight_numbers):
+            flight_number = row['flight_number']
+            callback = callbacks.get(row['callback_name']) or callbacks.get('default')
+            if callback is None:
+                logger.warning(f"No callback '{row['callback_name']}' for {flight_number}, skipping")
+                continue
+            
+            self.monitored_flights[flight_number] = {
+                'callback': callback,
+                'date': row['flight_date'],
+                'next_due': row['next_due'] or 0.0
+            }
+            if row['last_status']:
+                try:
+                    self.last_status[flight_number] = FlightStatus(**json.loads(row['last_status']))
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Discarding unreadable saved status for {flight_number}: {e}")
+            restored += 1
+        
+        logger.info(f"Restored {restored} monitored flights from state store")
+        return restored
+    
+    def forget_flights(self, flight_numbers: List[str]):
+        """Drop flights from memory only (e.g. lease handed to another worker)"""
+        for flight_number in flight_numbers:
+            self.monitored_flights.pop(flight_number, None)
+            self.last_status.pop(flight_number, None)
+    
+    def _next_poll_delay(self, status: Optional[FlightStatus]) -> float:
+        """Seconds until a flight should be polled again"""
+        return self.status_cache.ttl_for(status)
+    
+    def check_status_changes(self, lease_guard: Optional[Callable[[str], ContextManager[bool]]] = None):
+        """
+        Check monitored flights that are due for status changes
+        
+        Args:
+            lease_guard: Sharded workers: flight_number -> context manager
+                yielding whether this process still owns the flight; held
+                around the ownership check before polling and around
+                diffing/publishing the result
+        """
+        guard = lease_guard or _always_owned
+        now = time.time()
+        for flight_number, data in list(self.monitored_flights.items()):
+            if data.get('next_due', 0) > now:
+                continue
+            
             try:
+                with guard(flight_number) as owned:
+                    if not owned:
+                        continue
+                
                 callback = data['callback']
                 flight_date = data['date']
                 
                 current_status = self.get_flight_status(flight_number, flight_date)
                 
-                if current_status:
-                    last = self.last_status.get(flight_number)
+                with guard(flight_number) as owned:
+                    if not owned:
+                        # Lease moved during the poll; the new owner reports it
+                        logger.info(f"Lease on {flight_number} lost during poll, result dropped")
+                        continue
                     
-                    # Check if status changed
-                    if last is None or self._has_status_changed(last, current_status):
-                        logger.info(f"Status changed for {flight_number}: {current_status.status}")
-                        callback(current_status)
-                        self.last_status[flight_number] = current_status
+                    changed = False
+                    if current_status:
+                        last = self.last_status.get(flight_number)
+                        events = self.differ.diff(last, current_status)
+                        
+                        # Only significant changes reach callbacks; jitter below
+                        # the thresholds is measured against the last reported status
+                        if events:
+                            logger.info(f"Status changed for {flight_number}: "
+                                        f"{', '.join(e.event_type for e in events)}")
+                            self._publish_events(events)
+                            callback(current_status)
+                            self.last_status[flight_number] = current_status
+                            changed = True
+                    
+                    data['next_due'] = time.time() + self._next_poll_delay(current_status)
+                    if self.state_store:
+                        self.state_store.record_poll(
+                            flight_number, data['next_due'],
+                            json.dumps(asdict(current_status)) if changed else None
+                        )
                 
                 # Rate limiting - wait between flights
                 time.sleep(2)
@@ -370,13 +808,20 @@ class FlightMonitor:
     
     def _has_status_changed(self, old: FlightStatus, new: FlightStatus) -> bool:
         """Check if flight status has meaningfully changed"""
-        return (
-            old.status != new.status or
-            old.delay_minutes != new.delay_minutes or
-            old.departure_gate != new.departure_gate or
-            old.arrival_gate != new.arrival_gate or
-            abs(old.delay_minutes - new.delay_minutes) >= 15  # 15+ min change
-        )
+        return bool(self.differ.diff(old, new))
+    
+    def subscribe(self, listener: Callable[[List[StatusChangeEvent]], None]):
+        """Receive the typed change events of every significant update"""
+        self.event_listeners.append(listener)
+    
+    def _publish_events(self, events: List[StatusChangeEvent]):
+        if self.event_log:
+            self.event_log.append(events)
+        for listener in self.event_listeners:
+            try:
+                listener(events)
+            except Exception as e:
+                logger.error(f"Event listener failed: {e}")
     
     def get_api_usage_stats(self) -> Dict:
         """Get current API usage statistics"""
@@ -396,6 +841,12 @@ class FlightMonitor:
             'flightradar': {
                 'used': self.api_calls_today['flightradar'],
                 'limit': 'unlimited (rate-limited)'
+            },
+            'cache': dict(self.status_cache.stats),
+            'hedging': {
+                'enabled': self.hedged,
+                'hedges_fired': self.hedges_fired,
+                'wins': dict(self.provider_wins)
             }
         }
 
@@ -405,11 +856,96 @@ class WeatherMonitor:
     FREE Weather API - OpenWeatherMap
     Free tier: 1000 calls/day
     Sign up: https://openweathermap.org/api
+    
+    Geocoding results are cached permanently and forecasts are cached
+    per rounded coordinate for one 3-hour forecast step, so repeated
+    lookups of the same city cost no upstream calls.
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    FORECAST_TTL = 3 * 3600  # OWM forecast granularity
+    GEOCODE_MISS_TTL = 24 * 3600  # Unknown place names are retried daily
+    COORD_PRECISION = 2  # ~1 km; nearby lookups share a forecast
+    
+    def __init__(self, api_key: Optional[str] = None, cache_db: Optional[str] = None):
         self.api_key = api_key or os.getenv('OPENWEATHER_API_KEY')
         self.base_url = "http://api.openweathermap.org/data/2.5"
+        self.geocode_cache = SQLiteCache('owm_geocode', cache_db)
+        self.forecast_cache = SQLiteCache('owm_forecast', cache_db, default_ttl=self.FORECAST_TTL)
+        self.upstream_calls = {'geocode': 0, 'forecast': 0}
+    
+    @staticmethod
+    def _location_key(location: str) -> str:
+        return " ".join(location.lower().split())
+    
+    def _coord_key(self, lat: float, lon: float) -> str:
+        return f"{round(lat, self.COORD_PRECISION)},{round(lon, self.COORD_PRECISION)}"
+    
+    def geocode(self, location: str) -> Optional[tuple]:
+        """Resolve a location string to (lat, lon), cached permanently"""
+        key = self._location_key(location)
+        cached = self.geocode_cache.get(key)
+        if cached is not MISSING:
+            return tuple(cached) if cached else None
+        
+        geo_url = f"http://api.openweathermap.org/geo/1.0/direct"
+        geo_params = {
+            'q': location,
+            'limit': 1,
+            'appid': self.api_key
+        }
+        
+        self.upstream_calls['geocode'] += 1
+        geo_response = requests.get(geo_url, params=geo_params, timeout=10)
+        if geo_response.status_code != 200:
+            return None
+        
+        geo_data = geo_response.json()
+        if geo_data and len(geo_data) > 0:
+            coords = (geo_data[0]['lat'], geo_data[0]['lon'])
+            self.geocode_cache.set(key, list(coords), ttl=None)
+            return coords
+        
+        self.geocode_cache.set(key, None, ttl=self.GEOCODE_MISS_TTL)
+        return None
+    
+    def _fetch_forecast(self, lat: float, lon: float) -> Optional[List[Dict]]:
+        """Full 5-day forecast for a coordinate, cached for one forecast step"""
+        key = self._coord_key(lat, lon)
+        cached = self.forecast_cache.get(key)
+        if cached is not MISSING:
+            return cached
+        
+        forecast_url = f"{self.base_url}/forecast"
+        forecast_params = {
+            'lat': lat,
+            'lon': lon,
+            'appid': self.api_key,
+            'units': 'metric'
+        }
+        
+        self.upstream_calls['forecast'] += 1
+        forecast_response = requests.get(forecast_url, params=forecast_params, timeout=10)
+        if forecast_response.status_code != 200:
+            return None
+        
+        forecast_data = forecast_response.json()
+        
+        # Parse forecast (3-hour intervals)
+        forecasts = []
+        for item in forecast_data.get('list', []):
+            forecasts.append({
+                'date': item['dt_txt'],
+                'dt': item.get('dt'),
+                'temp': item['main']['temp'],
+                'conditions': item['weather'][0]['description'],
+                'condition_id': item['weather'][0].get('id', 800),
+                'precipitation': item.get('rain', {}).get('3h', 0) + item.get('snow', {}).get('3h', 0),
+                'wind_speed': item.get('wind', {}).get('speed', 0),
+                'alerts': []
+            })
+        
+        self.forecast_cache.set(key, forecasts)
+        return forecasts
     
     def get_weather_forecast(self, location: str, days: int = 7) -> List[Dict]:
         """Get weather forecast for location"""
@@ -418,60 +954,78 @@ class WeatherMonitor:
             return []
         
         try:
-            # Get city coordinates first
-            geo_url = f"http://api.openweathermap.org/geo/1.0/direct"
-            geo_params = {
-                'q': location,
-                'limit': 1,
-                'appid': self.api_key
-            }
+            coords = self.geocode(location)
+            if not coords:
+                return []
             
-            geo_response = requests.get(geo_url, params=geo_params, timeout=10)
-            
-            if geo_response.status_code == 200:
-                geo_data = geo_response.json()
-                if geo_data and len(geo_data) > 0:
-                    lat = geo_data[0]['lat']
-                    lon = geo_data[0]['lon']
-                    
-                    # Get forecast
-                    forecast_url = f"{self.base_url}/forecast"
-                    forecast_params = {
-                        'lat': lat,
-                        'lon': lon,
-                        'appid': self.api_key,
-                        'units': 'metric'
-                    }
-                    
-                    forecast_response = requests.get(forecast_url, params=forecast_params, timeout=10)
-                    
-                    if forecast_response.status_code == 200:
-                        forecast_data = forecast_response.json()
-                        
-                        # Parse forecast
-                        forecasts = []
-                        for item in forecast_data.get('list', [])[:days*8]:  # 3-hour intervals
-                            forecasts.append({
-                                'date': item['dt_txt'],
-                                'temp': item['main']['temp'],
-                                'conditions': item['weather'][0]['description'],
-                                'precipitation': item.get('rain', {}).get('3h', 0),
-                                'alerts': []
-                            })
-                        
-                        return forecasts
-            
-            return []
+            forecasts = self._fetch_forecast(*coords)
+            return (forecasts or [])[:days*8]
             
         except Exception as e:
             logger.error(f"Weather API error: {e}")
             return []
     
+    def get_weather_forecasts(self, locations: List[str], days: int = 7) -> Dict[str, List[Dict]]:
+        """
+        Batch forecast lookup for many trips
+        
+        Locations are de-duplicated by name and then by rounded coordinate,
+        so every trip to the same city shares a single forecast fetch.
+        
+        Returns:
+            location -> forecast list (same shape as get_weather_forecast)
+        """
+        if not self.api_key:
+            logger.warning("OpenWeatherMap API key not configured")
+            return {location: [] for location in locations}
+        
+        by_name = {}  # normalized name -> original spellings
+        for location in locations:
+            by_name.setdefault(self._location_key(location), []).append(location)
+        
+        by_coord = {}  # coord key -> (coords, [normalized names])
+        results = {location: [] for location in locations}
+        for key, spellings in by_name.items():
+            try:
+                coords = self.geocode(spellings[0])
+            except Exception as e:
+                logger.error(f"Geocode failed for {spellings[0]}: {e}")
+                continue
+            if coords:
+                entry = by_coord.setdefault(self._coord_key(*coords), (coords, []))
+                entry[1].append(key)
+        
+        for coords, names in by_coord.values():
+            try:
+                forecasts = self._fetch_forecast(*coords) or []
+            except Exception as e:
+                logger.error(f"Weather API error: {e}")
+                continue
+            for key in names:
+                for location in by_name[key]:
+                    results[location] = forecasts[:days*8]
+        
+        return results
+    
     def check_severe_weather(self, location: str) -> List[Dict]:
-        """Check for severe weather alerts"""
-        # OpenWeatherMap free tier doesn't include alerts
-        # Would need to upgrade or use another service
-        return []
+        """
+        Check the forecast for severe weather
+        
+        OpenWeatherMap's free tier doesn't include official alerts, so
+        the forecast is run through the local severe-weather rules.
+        """
+        forecasts = self.get_weather_forecast(location, days=5)
+        if not forecasts:
+            return []
+        
+        forecast = ColumnarForecast.from_forecast_list(forecasts)
+        window = {
+            'trip_id': None,
+            'location': location,
+            'window_start': int(forecast.time[0]),
+            'window_end': int(forecast.time[-1]) + 1
+        }
+        return SevereWeatherEngine().evaluate({location: forecast}, [window])
 
 
 # Keep the TripMonitoringAgent class from original implementation
@@ -0,0 +1,132 @@
+"""
+Multi-keyword matching (Aho-Corasick)
+
+All keywords are compiled once into one automaton, so scanning a text
+costs one pass over its characters no matter how many keywords there
+are. Matches must sit on word boundaries ("art" does not match "start",
+"event" does not match "prevent"). A plain plural suffix ("museums",
+"churches") is accepted by default.
+"""
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+PLURAL_SUFFIXES = ('es', 's')
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over labelled keywords"""
+
+    def __init__(self, keywords: Iterable[Tuple[str, str]], allow_plural: bool = True):
+        """
+        Args:
+            keywords: (keyword, label) pairs; several keywords may share a label
+            allow_plural: Also match keyword + 's'/'es'
+        """
+        self.allow_plural = allow_plural
+        self.keywords: List[Tuple[str, str]] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for keyword, label in keywords:
+            keyword = keyword.casefold().strip()
+            if not keyword:
+                continue
+            state = 0
+            for ch in keyword:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(len(self.keywords))
+            self.keywords.append((keyword, label))
+
+        self._build_failure_links()
+
+    @classmethod
+    def from_groups(cls, groups: Dict[str, Sequence[str]], **kwargs) -> 'KeywordMatcher':
+        """Build from label -> keywords"""
+        return cls(((kw, label) for label, kws in groups.items() for kw in kws), **kwargs)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # Inherit the outputs of the longest proper suffix
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _boundary_end(self, text: str, end: int) -> Optional[int]:
+        """End of the match if it stops on a word boundary, else None"""
+        if end == len(text) or not _is_word_char(text[end]):
+            return end
+        if self.allow_plural:
+            for suffix in PLURAL_SUFFIXES:
+                stop = end + len(suffix)
+                if text.startswith(suffix, end) and (stop == len(text) or not _is_word_char(text[stop])):
+                    return stop
+        return None
+
+    def find(self, text: str) -> List[Tuple[int, int, str, str]]:
+        """
+        All word-boundary matches in text
+
+        Returns:
+            (start, end, keyword, label) tuples in order of end position
+        """
+        text = (text or '').casefold()
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for k in out[state]:
+                keyword, label = self.keywords[k]
+                start = i + 1 - len(keyword)
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                end = self._boundary_end(text, i + 1)
+                if end is not None:
+                    matches.append((start, end, keyword, label))
+        return matches
+
+    def labels(self, text: str) -> Set[str]:
+        """Labels of every keyword found in text"""
+        return {m[3] for m in self.find(text)}
+
+    def contains_any(self, text: str) -> bool:
+        return bool(self.find(text))
+
+    def classify(self, text: str, priority: Sequence[str],
+                 default: Optional[str] = None) -> Optional[str]:
+        """First label in priority order that matches text, else default"""
+        found = self.labels(text)
+        for label in priority:
+            if label in found:
+                return label
+        return default
+
+    def labels_many(self, texts: Iterable[str]) -> List[Set[str]]:
+        return [self.labels(text) for text in texts]
+
+    def classify_many(self, texts: Iterable[str], priority: Sequence[str],
+                      default: Optional[str] = None) -> List[Optional[str]]:
+        return [self.classify(text, priority, default) for text in texts]
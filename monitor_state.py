@@ -0,0 +1,262 @@
+"""
+Durable flight monitor state (SQLite)
+
+Keeps the FlightMonitor watch list, the last known FlightStatus and the
+next time each flight is due for a poll, so a restarted monitoring
+service picks up where it left off instead of refetching everything.
+
+Also holds the worker/lease tables used by sharded monitoring: each
+worker process heartbeats, claims a fair share of flights through
+expiring leases and takes over leases left behind by crashed workers.
+"""
+import math
+import sqlite3
+import time
+import logging
+from typing import Optional, List, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorStateStore:
+    """SQLite-backed watch list and last-status store for FlightMonitor"""
+
+    def __init__(self, db_path: str = "monitor_state.db"):
+        self.db_path = db_path
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize state tables"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        # WAL lets the UI read while the monitor writes
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS monitored_flights (
+            flight_number TEXT PRIMARY KEY,
+            flight_date TEXT NOT NULL,
+            callback_name TEXT DEFAULT 'default',
+            next_due REAL DEFAULT 0,
+            last_status TEXT,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_monitored_flights_due
+        ON monitored_flights (next_due)
+        """)
+
+        # Sharded monitoring: live workers and per-flight ownership leases
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS monitor_workers (
+            worker_id TEXT PRIMARY KEY,
+            heartbeat_at REAL NOT NULL,
+            started_at REAL NOT NULL
+        )
+        """)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS flight_leases (
+            flight_number TEXT PRIMARY KEY,
+            worker_id TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """)
+
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_flight_leases_worker
+        ON flight_leases (worker_id)
+        """)
+
+        conn.commit()
+        conn.close()
+
+    def upsert_flight(self, flight_number: str, flight_date: str,
+                      callback_name: str = "default", next_due: float = 0):
+        """Add a flight to the watch list (or update its date/callback)"""
+        conn = self.get_connection()
+        conn.execute("""
+        INSERT INTO monitored_flights (flight_number, flight_date, callback_name, next_due)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(flight_number) DO UPDATE SET
+            flight_date = excluded.flight_date,
+            callback_name = excluded.callback_name,
+            updated_at = CURRENT_TIMESTAMP
+        """, (flight_number, flight_date, callback_name, next_due))
+        conn.commit()
+        conn.close()
+
+    def remove_flight(self, flight_number: str):
+        """Remove a flight from the watch list"""
+        conn = self.get_connection()
+        conn.execute("DELETE FROM monitored_flights WHERE flight_number = ?", (flight_number,))
+        conn.commit()
+        conn.close()
+
+    def record_poll(self, flight_number: str, next_due: float,
+                    last_status_json: Optional[str] = None):
+        """Store the poll outcome; last_status is only overwritten when given"""
+        conn = self.get_connection()
+        if last_status_json is None:
+            conn.execute("""
+            UPDATE monitored_flights
+            SET next_due = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE flight_number = ?
+            """, (next_due, flight_number))
+        else:
+            conn.execute("""
+            UPDATE monitored_flights
+            SET next_due = ?, last_status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE flight_number = ?
+            """, (next_due, last_status_json, flight_number))
+        conn.commit()
+        conn.close()
+
+    def load_flights(self, flight_numbers: Optional[List[str]] = None) -> List[Dict]:
+        """Load the watch list (optionally only the given flights)"""
+        conn = self.get_connection()
+        if flight_numbers is None:
+            rows = conn.execute("SELECT * FROM monitored_flights").fetchall()
+        else:
+            placeholders = ",".join("?" * len(flight_numbers))
+            rows = conn.execute(
+                f"SELECT * FROM monitored_flights WHERE flight_number IN ({placeholders})",
+                list(flight_numbers)
+            ).fetchall() if flight_numbers else []
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def due_flights(self, now: Optional[float] = None) -> List[str]:
+        """Flight numbers whose next poll time has passed"""
+        now = time.time() if now is None else now
+        conn = self.get_connection()
+        rows = conn.execute("""
+        SELECT flight_number FROM monitored_flights
+        WHERE next_due <= ?
+        ORDER BY next_due
+        """, (now,)).fetchall()
+        conn.close()
+        return [row['flight_number'] for row in rows]
+
+    def heartbeat_and_claim(self, worker_id: str, lease_ttl: float = 30.0,
+                            now: Optional[float] = None) -> List[str]:
+        """
+        Heartbeat, rebalance and renew leases for one worker
+
+        Runs as a single write transaction:
+        1. Record the worker's heartbeat and drop workers whose heartbeat
+           is older than lease_ttl
+        2. Compute the fair share ceil(flights / live workers)
+        3. Release leases above the fair share (so a joining worker gets work)
+        4. Renew the remaining leases
+        5. Claim unowned or expired leases up to the fair share, most
+           overdue flights first (takeover after a worker crash)
+
+        Returns:
+            Flight numbers currently leased to this worker
+        """
+        now = time.time() if now is None else now
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+            INSERT INTO monitor_workers (worker_id, heartbeat_at, started_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at
+            """, (worker_id, now, now))
+            conn.execute("DELETE FROM monitor_workers WHERE heartbeat_at < ?", (now - lease_ttl,))
+            conn.execute("""
+            DELETE FROM flight_leases
+            WHERE flight_number NOT IN (SELECT flight_number FROM monitored_flights)
+            """)
+
+            live_workers = conn.execute("SELECT COUNT(*) FROM monitor_workers").fetchone()[0]
+            total = conn.execute("SELECT COUNT(*) FROM monitored_flights").fetchone()[0]
+            share = math.ceil(total / max(1, live_workers))
+
+            owned = [row[0] for row in conn.execute("""
+            SELECT flight_number FROM flight_leases
+            WHERE worker_id = ? AND expires_at >= ?
+            ORDER BY flight_number
+            """, (worker_id, now))]
+
+            if len(owned) > share:
+                extra = owned[share:]
+                owned = owned[:share]
+                conn.executemany(
+                    "DELETE FROM flight_leases WHERE flight_number = ? AND worker_id = ?",
+                    [(flight_number, worker_id) for flight_number in extra]
+                )
+                logger.info(f"Worker {worker_id} released {len(extra)} leases (fair share {share})")
+
+            conn.execute("""
+            UPDATE flight_leases SET expires_at = ?
+            WHERE worker_id = ? AND expires_at >= ?
+            """, (now + lease_ttl, worker_id, now))
+
+            need = share - len(owned)
+            if need > 0:
+                claimable = [row[0] for row in conn.execute("""
+                SELECT f.flight_number FROM monitored_flights f
+                LEFT JOIN flight_leases l ON l.flight_number = f.flight_number
+                WHERE l.flight_number IS NULL OR l.expires_at < ?
+                ORDER BY f.next_due
+                LIMIT ?
+                """, (now, need))]
+                conn.executemany("""
+                INSERT INTO flight_leases (flight_number, worker_id, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(flight_number) DO UPDATE SET
+                    worker_id = excluded.worker_id,
+                    expires_at = excluded.expires_at
+                """, [(flight_number, worker_id, now + lease_ttl) for flight_number in claimable])
+                owned.extend(claimable)
+
+            conn.commit()
+            return owned
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def holds_lease(self, flight_number: str, worker_id: str,
+                    now: Optional[float] = None) -> bool:
+        """Whether worker_id holds an unexpired lease on the flight"""
+        now = time.time() if now is None else now
+        conn = self.get_connection()
+        row = conn.execute("""
+        SELECT 1 FROM flight_leases WHERE flight_number = ? AND worker_id = ? AND expires_at > ?
+        """, (flight_number, worker_id, now)).fetchone()
+        conn.close()
+        return row is not None
+
+    def release_worker(self, worker_id: str):
+        """Graceful leave: drop the worker and hand its leases back"""
+        conn = self.get_connection()
+        conn.execute("DELETE FROM flight_leases WHERE worker_id = ?", (worker_id,))
+        conn.execute("DELETE FROM monitor_workers WHERE worker_id = ?", (worker_id,))
+        conn.commit()
+        conn.close()
+
+    def get_lease_summary(self) -> Dict[str, int]:
+        """worker_id -> number of leased flights (for status output)"""
+        conn = self.get_connection()
+        rows = conn.execute("""
+        SELECT w.worker_id, COUNT(l.flight_number) AS leased
+        FROM monitor_workers w
+        LEFT JOIN flight_leases l ON l.worker_id = w.worker_id
+        GROUP BY w.worker_id
+        """).fetchall()
+        conn.close()
+        return {row['worker_id']: row['leased'] for row in rows}
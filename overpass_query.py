@@ -0,0 +1,194 @@
+"""
+Overpass API query planning and streaming response parsing
+
+Instead of one "every tourism feature within 5 km, full bodies" query,
+the planner builds tag-filtered queries (named features with selected
+tourism values only), asks for centers and tags only with a server-side
+result cap, and pages outward in rings so the nearest features arrive
+first and the search stops as soon as enough are found. Responses are
+parsed element by element while they download.
+"""
+import codecs
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import ijson
+    IJSON = True
+except Exception:
+    IJSON = False
+
+logger = logging.getLogger(__name__)
+
+OVERPASS_URL = "https://overpass-api.de/api/interpreter"
+
+DEFAULT_TOURISM_VALUES = (
+    'attraction', 'museum', 'gallery', 'artwork', 'viewpoint',
+    'zoo', 'aquarium', 'theme_park'
+)
+
+
+@dataclass
+class OverpassQueryPlanner:
+    """Builds tag-filtered, projected, ring-paged Overpass QL queries"""
+    radius_m: float = 5000
+    rings: int = 3  # pages: concentric rings out to radius_m
+    page_size: int = 100  # default server-side cap per page
+    tourism_values: Tuple[str, ...] = DEFAULT_TOURISM_VALUES
+    require_name: bool = True
+    extra_filters: List[str] = field(default_factory=list)  # e.g. ['["wheelchair"="yes"]']
+    timeout: int = 25  # Overpass [timeout:] in seconds
+
+    def _filters(self) -> str:
+        values = '|'.join(sorted(self.tourism_values))
+        filters = f'["tourism"~"^({values})$"]'
+        if self.require_name:
+            filters += '["name"]'
+        return filters + ''.join(self.extra_filters)
+
+    def ring_bounds(self) -> List[Tuple[float, float]]:
+        """(inner, outer) radius of each page; ring areas grow outward"""
+        rings = max(1, self.rings)
+        edges = [self.radius_m * (i / rings) ** 0.5 for i in range(rings + 1)]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def build(self, lat: float, lon: float, page: int = 0,
+              limit: Optional[int] = None) -> str:
+        """
+        Overpass QL for one page (ring) around (lat, lon)
+
+        Args:
+            page: Ring index, 0 is the innermost disc
+            limit: Max elements to return (default page_size)
+        """
+        inner, outer = self.ring_bounds()[page]
+        filters = self._filters()
+        outer_set = f"nwr{filters}(around:{outer:.0f},{lat},{lon});"
+        if inner > 0:
+            # Set difference drops what earlier pages already returned
+            body = f"(\n  {outer_set}\n  - nwr{filters}(around:{inner:.0f},{lat},{lon});\n);"
+        else:
+            body = outer_set
+        return (f"[out:json][timeout:{self.timeout}];\n"
+                f"{body}\n"
+                f"out center tags qt {limit or self.page_size};")
+
+    def pages(self, lat: float, lon: float) -> Iterator[str]:
+        for page in range(len(self.ring_bounds())):
+            yield self.build(lat, lon, page)
+
+
+def _iter_elements_text(chunks: Iterable[str]) -> Iterator[Dict]:
+    """Yield objects of the top-level "elements" array from text chunks"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    in_array = False
+    for chunk in chunks:
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        if not in_array:
+            key = buffer.find('"elements"')
+            if key < 0:
+                continue
+            start = buffer.find('[', key)
+            if start < 0:
+                continue
+            pos = start + 1
+            in_array = True
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # element not fully downloaded yet
+            yield element
+
+
+def iter_overpass_elements(response, chunk_size: int = 65536) -> Iterator[Dict]:
+    """
+    Stream elements from an Overpass JSON response (requests, stream=True)
+
+    Uses ijson when installed, otherwise an incremental decoder over the
+    raw byte stream. Closing the response stops the download early.
+    """
+    if IJSON:
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, 'elements.item', use_float=True)
+        return
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+    chunks = (decoder.decode(chunk) for chunk in response.iter_content(chunk_size=chunk_size))
+    yield from _iter_elements_text(chunks)
+
+
+def element_to_attraction(element: Dict) -> Optional[Dict]:
+    """Named OSM element -> attraction dict (None if unnamed or unplaced)"""
+    tags = element.get('tags', {})
+    name = tags.get('name')
+    # Ways/relations carry their position in 'center'
+    center = element.get('center', {})
+    lat = element.get('lat', center.get('lat'))
+    lon = element.get('lon', center.get('lon'))
+    if not name or lat is None or lon is None:
+        return None
+    return {
+        'name': name,
+        'category': tags.get('tourism', 'attraction'),
+        'description': tags.get('description', ''),
+        'address': tags.get('addr:full', ''),
+        'source': 'openstreetmap',
+        'lat': float(lat),
+        'lon': float(lon)
+    }
+
+
+def fetch_overpass_attractions(session, lat: float, lon: float, limit: int = 200,
+                               planner: Optional[OverpassQueryPlanner] = None,
+                               url: str = OVERPASS_URL,
+                               timeout: float = 30) -> List[Dict]:
+    """
+    Run the planner's pages nearest-first until `limit` attractions are found
+
+    Args:
+        session: requests.Session
+        lat, lon: Search center
+        limit: Stop after this many attractions
+        planner: Query planner (defaults to OverpassQueryPlanner())
+
+    Returns:
+        Attraction dicts (unsorted within a page); a failed page ends the
+        search, and raises IOError if nothing was found before it
+    """
+    planner = planner or OverpassQueryPlanner()
+    attractions = []
+    seen = set()
+    for page in range(len(planner.ring_bounds())):
+        # Cap each page at what is still needed
+        query = planner.build(lat, lon, page, limit=limit - len(attractions))
+        response = session.post(url, data={'data': query}, timeout=timeout, stream=True)
+        try:
+            if response.status_code != 200:
+                if not attractions:
+                    # Nothing to return; a failure must not look like "no attractions"
+                    raise IOError(f"Overpass page {page} failed: HTTP {response.status_code}")
+                logger.warning(f"Overpass page {page} failed: HTTP {response.status_code}")
+                break
+            for element in iter_overpass_elements(response):
+                key = (element.get('type'), element.get('id'))
+                attraction = element_to_attraction(element)
+                if attraction is None or key in seen:
+                    continue
+                seen.add(key)
+                attractions.append(attraction)
+                if len(attractions) >= limit:
+                    return attractions
+        finally:
+            response.close()
+    return attractions
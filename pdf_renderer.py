@@ -0,0 +1,432 @@
+"""
+Itinerary PDF rendering service
+
+Renders itinerary PDFs with reportlab in a small process pool, so PDF CPU
+does not hold the GIL of the Streamlit script. Each worker builds the
+paragraph and table styles once. Jobs are keyed by a content hash of
+(plan_md, meta, actions, budget_status), and identical jobs return the
+cached bytes, or share the in-flight render when one is already running.
+Rendered PDFs are also written to the artifact store, so they survive
+restarts and can be looked up by trip_history id.
+
+Usage:
+    renderer = get_pdf_renderer()
+    future = renderer.submit(plan_md, meta, actions, budget_status)  # non-blocking
+    pdf_bytes = future.result()
+"""
+import os
+import re
+import threading
+import logging
+import multiprocessing
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    REPORTLAB = True
+except Exception:
+    REPORTLAB = False
+
+from artifact_store import ArtifactStore, artifact_key
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so stored PDFs are not reused
+PDF_LAYOUT_VERSION = 2
+
+# Built once per process (worker or inline fallback)
+_STYLES: Optional[Dict[str, Any]] = None
+
+
+def _get_styles() -> Dict[str, Any]:
+    global _STYLES
+    if _STYLES is None:
+        styles = getSampleStyleSheet()
+        _STYLES = {
+            'title': ParagraphStyle("title", parent=styles["Title"], alignment=TA_CENTER,
+                                    fontSize=20, spaceAfter=14),
+            'h2': ParagraphStyle("h2", parent=styles["Heading2"], fontSize=13, spaceAfter=8),
+            'normal': ParagraphStyle("normal", parent=styles["BodyText"], fontSize=10.5, leading=14),
+            'section': ParagraphStyle("section", parent=styles["Heading3"], fontSize=11.5,
+                                      spaceBefore=8, spaceAfter=4, keepWithNext=1),
+            'table': TableStyle([
+                ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#667eea")),
+                ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                ("FONTSIZE", (0, 0), (-1, 0), 10),
+                ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
+                ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("FONTSIZE", (0, 1), (-1, -1), 9.5),
+                ("LEFTPADDING", (0, 0), (-1, -1), 6),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 6),
+                ("TOPPADDING", (0, 0), (-1, -1), 6),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+            ]),
+        }
+    return _STYLES
+
+
+def _warm_worker():
+    """Pool initializer: pay the stylesheet cost before the first job"""
+    if REPORTLAB:
+        _get_styles()
+
+
+def default_action_rows(actions: List[Dict]) -> List[List[str]]:
+    """Bookings table body: Type, Title, Price, Time/Notes"""
+    return [[
+        str(a.get("type", "")),
+        str(a.get("title", ""))[:60],
+        str(a.get("price", "")),
+        (str(a.get("departure", "")) + " " + str(a.get("duration", ""))).strip()[:70]
+    ] for a in actions]
+
+
+# Plan lines that start a new day / section
+_SECTION_RE = re.compile(r"^\s*(#{1,6}\s+|\**\s*(day\s*\d+|第\s*\d+\s*天))", re.IGNORECASE)
+
+# Plan lines per Paragraph and booking rows per Table; keeps every flowable
+# small enough that reportlab splits it at most once
+PLAN_LINES_PER_BLOCK = 30
+TABLE_ROWS_PER_BLOCK = 40
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def plan_flowables(plan_md: str, styles: Dict[str, Any]) -> Iterator:
+    """Plan as one heading per day/section and bounded paragraphs between them"""
+    block: List[str] = []
+
+    def flush():
+        if block:
+            yield Paragraph("<br/>".join(block), styles['normal'])
+            block.clear()
+
+    for raw in plan_md.splitlines():
+        line = raw.strip()
+        if _SECTION_RE.match(line):
+            yield from flush()
+            yield Paragraph(_escape(line.lstrip("#").replace("**", "").strip()), styles['section'])
+        elif not line:
+            yield from flush()
+        else:
+            block.append(_escape(line))
+            if len(block) >= PLAN_LINES_PER_BLOCK:
+                yield from flush()
+    yield from flush()
+
+
+def action_table_flowables(rows: List[List[str]], styles: Dict[str, Any]) -> Iterator:
+    """Bookings table in fixed-size row blocks, each repeating the header"""
+    header = ["Type", "Title", "Price", "Time/Notes"]
+    for start in range(0, len(rows), TABLE_ROWS_PER_BLOCK):
+        block = [header] + [list(row) for row in rows[start:start + TABLE_ROWS_PER_BLOCK]]
+        tbl = Table(block, colWidths=[0.9*inch, 3.2*inch, 1.1*inch, 1.8*inch], repeatRows=1)
+        tbl.setStyle(styles['table'])
+        yield tbl
+
+
+class _FlowableStream:
+    """
+    List-like view over a flowable generator for doc.build()
+
+    build() only reads, removes and re-inserts at the front of the story,
+    so flowables are created just before layout and released once drawn
+    instead of the whole story being held up front.
+    """
+
+    # Items kept buffered for keepWithNext lookahead
+    LOOKAHEAD = 8
+
+    def __init__(self, flowables: Iterable):
+        self._source = iter(flowables)
+        self._buffer: List[Any] = []
+
+    def _fill(self, n: Optional[int] = None):
+        while n is None or len(self._buffer) < n:
+            try:
+                self._buffer.append(next(self._source))
+            except StopIteration:
+                return
+
+    def _fill_for(self, index):
+        if isinstance(index, slice):
+            self._fill(index.stop if index.stop is not None and index.stop >= 0 else None)
+        else:
+            self._fill(index + 1 if index >= 0 else None)
+
+    def __len__(self):
+        self._fill(self.LOOKAHEAD)
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        self._fill_for(index)
+        return self._buffer[index]
+
+    def __setitem__(self, index, value):
+        self._fill_for(index)
+        self._buffer[index] = value
+
+    def __delitem__(self, index):
+        self._fill_for(index)
+        del self._buffer[index]
+
+    def insert(self, index: int, value):
+        self._buffer.insert(index, value)
+
+
+def build_itinerary_pdf(out, plan_md: str, meta: Dict, rows: List[List[str]],
+                        budget_status: Optional[Dict] = None):
+    """
+    Stream the itinerary PDF into a file path or writable binary stream
+
+    Flowables are generated lazily (per day/section and per row block), so
+    layout time and flowable memory grow linearly with the itinerary.
+
+    Args:
+        out: Filename or file-like object (e.g. an open file or HTTP response)
+        plan_md, meta, rows, budget_status: Itinerary content
+    """
+    styles = _get_styles()
+    title, h2, normal = styles['title'], styles['h2'], styles['normal']
+
+    doc = SimpleDocTemplate(
+        out,
+        pagesize=A4,
+        leftMargin=0.65 * inch,
+        rightMargin=0.65 * inch,
+        topMargin=0.65 * inch,
+        bottomMargin=0.65 * inch
+    )
+
+    def story():
+        yield Paragraph("MyAgent Booking — Travel Itinerary", title)
+        yield Paragraph(
+            f"<b>Destination:</b> {meta.get('destination_city','')} &nbsp;&nbsp; "
+            f"<b>From:</b> {meta.get('origin_city','')}<br/>"
+            f"<b>Depart:</b> {meta.get('depart_date','')} &nbsp;&nbsp; "
+            f"<b>Return:</b> {meta.get('return_date','')}",
+            normal
+        )
+        yield Spacer(1, 10)
+
+        if budget_status:
+            yield Paragraph("Budget Summary", h2)
+            yield Paragraph(
+                f"<b>Total:</b> ${budget_status.get('total_budget',0):.2f} &nbsp;&nbsp; "
+                f"<b>Spent:</b> ${budget_status.get('used',0):.2f} &nbsp;&nbsp; "
+                f"<b>Remaining:</b> ${budget_status.get('remaining',0):.2f} &nbsp;&nbsp; "
+                f"<b>Usage:</b> {budget_status.get('percentage',0):.1f}%",
+                normal
+            )
+            yield Spacer(1, 10)
+
+        yield Paragraph("Itinerary (AI Plan)", h2)
+        yield from plan_flowables(plan_md, styles)
+        yield Spacer(1, 14)
+
+        if rows:
+            yield Paragraph("Bookings / Actions", h2)
+            yield from action_table_flowables(rows, styles)
+
+    doc.build(_FlowableStream(story()))
+
+
+def render_itinerary_pdf(plan_md: str, meta: Dict, rows: List[List[str]],
+                         budget_status: Optional[Dict] = None) -> bytes:
+    """Render the itinerary PDF to bytes (runs inside a worker process)"""
+    if not REPORTLAB:
+        return b""
+    buf = BytesIO()
+    build_itinerary_pdf(buf, plan_md, meta, rows, budget_status)
+    return buf.getvalue()
+
+
+def itinerary_key(plan_md: str, meta: Dict, actions: List[Dict],
+                  budget_status: Optional[Dict] = None,
+                  rows: Optional[List[List[str]]] = None) -> str:
+    """Stable content hash of a render job"""
+    return artifact_key('pdf',
+                        {'plan_md': plan_md, 'meta': meta, 'actions': actions,
+                         'budget_status': budget_status},
+                        {'rows': rows, 'layout': PDF_LAYOUT_VERSION})
+
+
+class PDFRenderService:
+    """Process pool for itinerary PDFs with a content-hash result cache"""
+
+    def __init__(self, workers: int = 2, cache_size: int = 64,
+                 start_method: str = "spawn", store: Optional[ArtifactStore] = None):
+        """
+        Args:
+            workers: Worker processes (0 renders inline in the caller)
+            cache_size: Rendered PDFs kept in memory (LRU)
+            start_method: multiprocessing start method; spawn keeps workers
+                independent of the Streamlit server's threads
+            store: Persistent artifact store checked after the memory cache
+        """
+        self.workers = workers
+        self.cache_size = cache_size
+        self.start_method = start_method
+        self.store = store
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'renders': 0, 'cache_hits': 0, 'store_hits': 0, 'joined': 0,
+                      'inline': 0, 'errors': 0}
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            try:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_warm_worker)
+            except Exception as e:
+                logger.warning(f"PDF worker pool unavailable, rendering inline: {e}")
+                self.workers = 0
+        return self._pool
+
+    def _remember(self, key: str, pdf: bytes):
+        self._cache[key] = pdf
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _on_done(self, key: str, trip_id, future: Future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.stats['errors'] += 1
+                logger.error(f"PDF render failed: {future.exception()}")
+                return
+            pdf = future.result()
+            self._remember(key, pdf)
+        if self.store is not None and pdf:
+            try:
+                self.store.put(key, 'pdf', pdf, trip_id=trip_id)
+            except Exception as e:
+                logger.warning(f"Rendered PDF not persisted: {e}")
+
+    @staticmethod
+    def _done(pdf: bytes) -> Future:
+        future = Future()
+        future.set_result(pdf)
+        return future
+
+    def cached(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            pdf = self._cache.get(key)
+            if pdf is not None:
+                self._cache.move_to_end(key)
+            return pdf
+
+    def submit(self, plan_md: str, meta: Dict, actions: List[Dict],
+               budget_status: Optional[Dict] = None,
+               rows: Optional[List[List[str]]] = None, trip_id=None) -> Future:
+        """
+        Start rendering (or reuse a cached / stored / in-flight render)
+
+        Args:
+            plan_md, meta, actions, budget_status: Itinerary content
+            rows: Bookings table body; defaults to default_action_rows(actions)
+            trip_id: trip_history id to link the PDF to in the artifact store
+
+        Returns:
+            Future resolving to the PDF bytes (b"" without reportlab)
+        """
+        if rows is None:
+            rows = default_action_rows(actions or [])
+        key = itinerary_key(plan_md, meta, actions, budget_status, rows)
+
+        pdf = self.cached(key)
+        if pdf is not None:
+            self.stats['cache_hits'] += 1
+            if trip_id is not None and self.store is not None:
+                self.store.link_trip(trip_id, 'pdf', key)
+            return self._done(pdf)
+        if self.store is not None:
+            pdf = self.store.get(key)
+            if pdf is not None:
+                self.stats['store_hits'] += 1
+                with self._lock:
+                    self._remember(key, pdf)
+                if trip_id is not None:
+                    self.store.link_trip(trip_id, 'pdf', key)
+                return self._done(pdf)
+
+        with self._lock:
+            if key in self._inflight:
+                self.stats['joined'] += 1
+                return self._inflight[key]
+
+            self.stats['renders'] += 1
+            args = (plan_md, meta, rows, budget_status)
+            pool = self._get_pool()
+            future = None
+            if pool is not None:
+                try:
+                    future = pool.submit(render_itinerary_pdf, *args)
+                except (BrokenProcessPool, RuntimeError) as e:
+                    logger.warning(f"PDF worker pool broken, restarting: {e}")
+                    self._pool = None
+                    pool = self._get_pool()
+                    if pool is not None:
+                        future = pool.submit(render_itinerary_pdf, *args)
+            inline = future is None
+            if inline:
+                # Registered first so concurrent submits join it; rendered
+                # below, outside the lock, so cache hits are not held up
+                self.stats['inline'] += 1
+                future = Future()
+            self._inflight[key] = future
+
+        future.add_done_callback(lambda f: self._on_done(key, trip_id, f))
+        if inline:
+            try:
+                future.set_result(render_itinerary_pdf(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def render(self, plan_md: str, meta: Dict, actions: List[Dict],
+               budget_status: Optional[Dict] = None,
+               rows: Optional[List[List[str]]] = None, trip_id=None,
+               timeout: Optional[float] = None) -> bytes:
+        """Blocking counterpart of submit()"""
+        return self.submit(plan_md, meta, actions, budget_status, rows, trip_id).result(timeout)
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+
+# Singleton instance
+_pdf_renderer = None
+
+def get_pdf_renderer() -> PDFRenderService:
+    """Get singleton renderer (worker count from $PDF_RENDER_WORKERS), backed by the artifact store"""
+    global _pdf_renderer
+    if _pdf_renderer is None:
+        from artifact_store import get_artifact_store
+        _pdf_renderer = PDFRenderService(workers=int(os.getenv("PDF_RENDER_WORKERS", "2")),
+                                         store=get_artifact_store())
+    return _pdf_renderer
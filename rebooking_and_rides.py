@@ -7,7 +7,12 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import json
+import html
 from dotenv import load_dotenv
+
+from email_templates import TEMPLATES, BRAND_GRADIENT
+from trip_calendar import (apply_rebooking, build_calendar, get_calendar_state_store,
+                           publish_trip_calendar, trip_key_for)
 load_dotenv()
 logger = logging.getLogger(__name__)
 
@@ -24,8 +29,11 @@ class FlightRebookingAgent:
     - 一键改签(需要航空公司API)
     """
     
-    def __init__(self, email_service=None):
+    def __init__(self, email_service=None, alert_digester=None, locale: str = 'zh'):
         self.email_service = email_service
+        self.locale = locale  # 改签邮件语言 (zh / en)
+        # 设置后改签建议合并进行程提醒摘要,而不是单独发信
+        self.alert_digester = alert_digester
         self.rebooking_rules = {
             'delay_threshold': 120,  # 延误超过2小时触发改签
             'cancel_immediate': True,  # 取消立即改签
@@ -172,7 +180,7 @@ class FlightRebookingAgent:
         }
     
     def auto_rebook(self, original_booking: Dict, new_flight: Dict,
-                   user_email: str) -> Dict:
+                   user_email: str, itinerary: Optional[Dict] = None) -> Dict:
         """
         自动改签(需要航空公司API支持)
         
@@ -182,6 +190,11 @@ class FlightRebookingAgent:
         3. 支付处理
         
         当前实现: 生成改签指令并发送邮件
+        
+        Args:
+            itinerary: 行程 payload (meta/actions); 提供且有 trip_id 时,
+                邮件附带只含变更事件的日历更新 (trip-update.ics);
+                改签完成后由 confirm_rebooking 写回行程
         """
         rebooking_info = {
             'status': 'manual_action_required',
@@ -197,82 +210,94 @@ class FlightRebookingAgent:
             'deadline': (datetime.now() + timedelta(hours=2)).isoformat()
         }
         
+        if itinerary and original_booking.get('trip_id') is not None:
+            try:
+                meta = itinerary.get('meta', {})
+                actions = apply_rebooking(itinerary.get('actions', []),
+                                          str(original_booking.get('flight_number', '')), new_flight)
+                trip_key = trip_key_for(meta, original_booking['trip_id'])
+                # Delta against the published state, which is left as is
+                # until confirm_rebooking applies the change to the trip
+                rebooking_info['updated_actions'] = actions
+                rebooking_info['calendar_update'], _ = build_calendar(
+                    meta, actions, trip_key,
+                    state=get_calendar_state_store().load(trip_key), delta=True)
+            except Exception as e:
+                logger.error(f"Calendar update for rebooking failed: {e}")
+        
         # 发送改签通知邮件
-        if self.email_service:
+        if self.email_service or self.alert_digester:
             self._send_rebooking_email(user_email, original_booking, 
                                       new_flight, rebooking_info)
         
         return rebooking_info
     
+    def confirm_rebooking(self, trip_id: int, itinerary: Dict, rebooking_info: Dict,
+                          database) -> bytes:
+        """
+        Apply a completed rebooking to the saved trip
+
+        Stores the updated actions in trip_history and publishes the trip
+        calendar, so later exports keep the rebooked flight's SEQUENCE
+        
+        Args:
+            trip_id: trip_history id
+            itinerary: Itinerary payload auto_rebook was given
+            rebooking_info: auto_rebook result (needs 'updated_actions')
+            database: Database instance
+        
+        Returns:
+            Full trip calendar (ics bytes)
+        """
+        actions = rebooking_info['updated_actions']
+        database.update_trip_itinerary(trip_id, json.dumps({**itinerary, 'actions': actions}))
+        return publish_trip_calendar(itinerary.get('meta', {}), actions, trip_id=trip_id)
+    
     def _send_rebooking_email(self, user_email: str, original: Dict,
                              new_flight: Dict, rebooking_info: Dict):
         """发送改签通知邮件"""
-        subject = f"🔄 改签建议: {original.get('flight_number')} → {new_flight.get('flight_number')}"
-        
-        html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-        .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); 
-                   color: white; padding: 30px; text-align: center; border-radius: 10px; }}
-        .alert {{ background: #fff3cd; border-left: 4px solid #ffc107; padding: 15px; margin: 20px 0; }}
-        .flight-card {{ background: #f8f9fa; padding: 20px; margin: 15px 0; border-radius: 8px; }}
-        .button {{ background: #667eea; color: white; padding: 15px 30px; text-decoration: none; 
-                   border-radius: 5px; display: inline-block; margin: 10px 0; }}
-        .price {{ font-size: 1.5em; font-weight: bold; color: #28a745; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🔄 航班改签建议</h1>
-            <p>我们为您找到了更好的替代航班</p>
-        </div>
-        
-        <div class="alert">
-            <strong>⚠️ 原航班状态:</strong> {original.get('status', '延误/取消')}<br>
-            需要在 {rebooking_info.get('deadline', '2小时内')} 前采取行动
-        </div>
-        
-        <h2>📍 原航班信息</h2>
-        <div class="flight-card">
-            <strong>航班号:</strong> {original.get('flight_number')}<br>
-            <strong>航空公司:</strong> {original.get('airline')}<br>
-            <strong>状态:</strong> ❌ {original.get('status')}
-        </div>
-        
-        <h2>✅ 推荐替代航班</h2>
-        <div class="flight-card" style="border-left: 4px solid #28a745;">
-            <strong>航班号:</strong> {new_flight.get('flight_number')}<br>
-            <strong>航空公司:</strong> {new_flight.get('airline')}<br>
-            <strong>起飞时间:</strong> {new_flight.get('departure_time')}<br>
-            <strong>到达时间:</strong> {new_flight.get('arrival_time')}<br>
-            <strong>可用座位:</strong> {new_flight.get('available_seats')} 个<br>
-            <div class="price">差价: {new_flight.get('price_estimate')}</div>
-        </div>
-        
-        <h3>📋 改签步骤:</h3>
-        <ol>
-            {' '.join([f'<li>{step}</li>' for step in rebooking_info.get('action_required', [])])}
-        </ol>
-        
-        <div style="text-align: center; margin: 30px 0;">
-            <a href="{new_flight.get('booking_link')}" class="button">立即改签 →</a>
-        </div>
-        
-        <p style="color: #666; font-size: 0.9em;">
-            💡 提示: 改签通常免费,只需支付差价。建议尽快操作以确保座位。
-        </p>
-    </div>
-</body>
-</html>
-"""
-        
+        subject, html_body = TEMPLATES.render(
+            'rebooking', self.locale,
+            header_bg=BRAND_GRADIENT, accent='#667eea',
+            original_flight=original.get('flight_number'),
+            original_airline=original.get('airline'),
+            original_status=original.get('status', '延误/取消'),
+            deadline=rebooking_info.get('deadline', '2小时内'),
+            new_flight=new_flight.get('flight_number'),
+            new_airline=new_flight.get('airline'),
+            departure_time=new_flight.get('departure_time'),
+            arrival_time=new_flight.get('arrival_time'),
+            available_seats=new_flight.get('available_seats'),
+            price_estimate=new_flight.get('price_estimate'),
+            booking_link=new_flight.get('booking_link'),
+            steps_html=' '.join(f'<li>{html.escape(step)}</li>'
+                                for step in rebooking_info.get('action_required', []))
+        )
+        
+        if self.alert_digester:
+            # Newest suggestion per original flight wins within the digest window
+            self.alert_digester.add_rebooking(
+                user_email, original.get('user_name', 'Traveler'), original.get('trip_id'),
+                subject, html_body,
+                summary=f"{original.get('flight_number')} → {new_flight.get('flight_number')} "
+                        f"({new_flight.get('departure_time')}, {new_flight.get('price_estimate')})",
+                original_flight=str(original.get('flight_number')),
+                link=new_flight.get('booking_link'),
+                calendar_update=rebooking_info.get('calendar_update')
+            )
+            logger.info(f"Rebooking suggestion for {user_email} added to alert digest")
+            return
+        
+        attachments = None
+        if rebooking_info.get('calendar_update'):
+            attachments = [{'filename': 'trip-update.ics', 'content': rebooking_info['calendar_update']}]
         try:
-            self.email_service.send_email(user_email, subject, html_body)
+            # Same suggestion is only emailed once, even across monitor restarts
+            self.email_service.send_email(
+                user_email, subject, html_body, attachments,
+                idempotency_key=f"rebooking:{user_email}:{original.get('flight_number')}:"
+                                f"{new_flight.get('flight_number')}"
+            )
             logger.info(f"Rebooking email sent to {user_email}")
         except Exception as e:
             logger.error(f"Failed to send rebooking email: {e}")
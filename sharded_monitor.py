@@ -0,0 +1,134 @@
+"""
+Sharded multi-process flight monitoring
+
+Each worker process runs its own FlightMonitor over the flights it holds
+a lease on in the shared MonitorStateStore. A background thread
+heartbeats and rebalances leases, so:
+- a joining worker gets its fair share as others release extras
+- a crashed worker's leases expire and are taken over by the others
+"""
+import os
+import signal
+import socket
+import threading
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Set
+
+from flight_events import FlightEventLog
+from free_flight_monitor import FlightMonitor, FlightStatus
+from monitor_state import MonitorStateStore
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedMonitorWorker:
+    """One monitor worker that owns a lease-based shard of the watch list"""
+
+    def __init__(self, state_db: str,
+                 callbacks: Dict[str, Callable[[FlightStatus], None]],
+                 worker_id: Optional[str] = None,
+                 lease_ttl: float = 30.0,
+                 heartbeat_interval: float = 10.0,
+                 sweep_interval: float = 30.0,
+                 monitor_kwargs: Optional[Dict] = None):
+        """
+        Args:
+            state_db: Shared SQLite state database path
+            callbacks: callback_name -> callable for status changes
+            worker_id: Unique worker id (host:pid:random by default)
+            lease_ttl: Seconds a lease/heartbeat stays valid without renewal
+            heartbeat_interval: Seconds between heartbeats (keep well under lease_ttl)
+            sweep_interval: Seconds between status sweeps
+            monitor_kwargs: Extra FlightMonitor arguments (e.g. hedged=True)
+        """
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.store = MonitorStateStore(state_db)
+        self.callbacks = callbacks
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.sweep_interval = sweep_interval
+        self.monitor = FlightMonitor(state_store=self.store, **(monitor_kwargs or {}))
+
+        self.owned: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+
+    def sync_leases(self):
+        """Heartbeat, then load newly leased flights and drop lost ones"""
+        # Under the lock so no lease is released while a sweep publishes it
+        with self._lock:
+            owned = set(self.store.heartbeat_and_claim(self.worker_id, self.lease_ttl))
+            gained = owned - self.owned
+            lost = self.owned - owned
+            if lost:
+                self.monitor.forget_flights(list(lost))
+            if gained:
+                self.monitor.restore_state(self.callbacks, list(gained))
+            self.owned = owned
+        if gained or lost:
+            logger.info(f"Worker {self.worker_id}: +{len(gained)} -{len(lost)} flights, owns {len(owned)}")
+
+    @contextmanager
+    def lease_guard(self, flight_number: str):
+        """Hold the lease lock and yield whether this worker still owns the flight"""
+        with self._lock:
+            yield (flight_number in self.owned
+                   and self.store.holds_lease(flight_number, self.worker_id))
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.sync_leases()
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} heartbeat failed: {e}")
+
+    def run_forever(self):
+        """Sweep owned flights until stop() is called"""
+        logger.info(f"Monitor worker {self.worker_id} starting")
+        self.sync_leases()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._heartbeat_thread.start()
+
+        try:
+            while not self._stop.is_set():
+                self.monitor.check_status_changes(lease_guard=self.lease_guard)
+                self._stop.wait(self.sweep_interval)
+        finally:
+            self.store.release_worker(self.worker_id)
+            logger.info(f"Monitor worker {self.worker_id} stopped, leases released")
+
+    def stop(self):
+        self._stop.set()
+
+
+def log_status_change(status: FlightStatus):
+    """Default worker callback"""
+    logger.info(f"[{status.flight_number}] {status.status} "
+                f"(delay {status.delay_minutes} min, gate {status.departure_gate or '-'})")
+
+
+def run_worker(state_db: str, lease_ttl: float = 30.0, sweep_interval: float = 30.0):
+    """Process entry point: build callbacks in-process and run one worker"""
+    # A restarted worker is forked from the supervisor after it installed
+    # its shutdown handlers; they must not run in here
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = ShardedMonitorWorker(
+        state_db,
+        callbacks={'default': log_status_change},
+        lease_ttl=lease_ttl,
+        heartbeat_interval=lease_ttl / 3,
+        sweep_interval=sweep_interval,
+        monitor_kwargs={'event_log': FlightEventLog(state_db)}
+    )
+
+    def stop(sig, frame):
+        worker.stop()
+
+    # Finish the current sweep and release the leases instead of dying mid-sweep
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run_forever()
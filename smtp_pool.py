@@ -0,0 +1,173 @@
+"""
+Pooled SMTP transport
+
+Keeps authenticated SMTP sessions open between messages so a burst of
+emails pays the TCP/STARTTLS/AUTH setup once per connection instead of
+once per message:
+- idle connections are reused; ones idle for a while are checked with NOOP
+- a connection closed by the server is replaced and the send retried once
+- connections are retired after max_messages_per_connection messages
+"""
+import smtplib
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True if the session is dead, False if only the message was refused"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # SMTPException subclasses OSError; socket errors are plain OSErrors
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class PooledConnection:
+    """An authenticated SMTP session plus usage bookkeeping"""
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.messages_sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of persistent SMTP sessions"""
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "",
+                 use_tls: bool = True, max_connections: int = 4,
+                 max_messages_per_connection: int = 100,
+                 idle_timeout: float = 60.0, noop_after: float = 10.0,
+                 timeout: float = 30.0,
+                 smtp_factory: Callable[..., smtplib.SMTP] = smtplib.SMTP):
+        """
+        Args:
+            host, port: SMTP server
+            username, password: AUTH credentials (login skipped if no username)
+            use_tls: Run STARTTLS after connecting
+            max_connections: Max concurrent sessions (callers wait beyond this)
+            max_messages_per_connection: Retire a session after this many messages
+            idle_timeout: Close sessions idle longer than this (servers drop them anyway)
+            noop_after: NOOP-check sessions idle longer than this before reuse
+            timeout: Socket timeout in seconds
+            smtp_factory: smtplib.SMTP or compatible (e.g. smtplib.SMTP_SSL)
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.noop_after = noop_after
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory
+
+        self._idle: Deque[PooledConnection] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.stats = {'connections_opened': 0, 'reused': 0, 'reconnects': 0,
+                      'noop_failures': 0, 'retired': 0, 'messages': 0}
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _connect(self) -> PooledConnection:
+        smtp = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self._count('connections_opened')
+        return PooledConnection(smtp)
+
+    def _healthy(self, conn: PooledConnection) -> bool:
+        idle = time.monotonic() - conn.last_used
+        if idle > self.idle_timeout:
+            return False
+        if idle > self.noop_after:
+            try:
+                code, _ = conn.smtp.noop()
+            except Exception:
+                code = None
+            if code != 250:
+                self._count('noop_failures')
+                return False
+        return True
+
+    def _acquire(self) -> PooledConnection:
+        """Take a healthy idle session or open a new one (slot already held)"""
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            if self._healthy(conn):
+                self._count('reused')
+                return conn
+            conn.close()
+
+    def _release(self, conn: PooledConnection):
+        conn.last_used = time.monotonic()
+        if conn.messages_sent >= self.max_messages_per_connection:
+            self._count('retired')
+            conn.close()
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    def send_message(self, msg, from_addr: Optional[str] = None, to_addrs=None):
+        """
+        Send an email.message.Message over a pooled session
+
+        Raises the smtplib error if the message is refused or the server
+        is unreachable after one reconnect.
+        """
+        with self._slots:
+            conn = self._acquire()
+            try:
+                conn.smtp.send_message(msg, from_addr, to_addrs)
+            except Exception as e:
+                if not is_connection_error(e):
+                    # Refused message: the session itself is still fine
+                    self._release(conn)
+                    raise
+                # Server closed the session (timeout, restart): reconnect once
+                logger.info(f"SMTP session lost ({e}), reconnecting")
+                conn.close()
+                self._count('reconnects')
+                conn = self._connect()
+                try:
+                    conn.smtp.send_message(msg, from_addr, to_addrs)
+                except Exception:
+                    conn.close()
+                    raise
+            conn.messages_sent += 1
+            self._count('messages')
+            self._release(conn)
+
+    def close(self):
+        """Quit all idle sessions"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,266 @@
+"""
+Local SMTP sink for testing and benchmarks
+
+A small threaded SMTP server that accepts everything EmailService sends
+(EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, NOOP, RSET, QUIT) without
+relaying it anywhere. Per-message latency, temporary/permanent failures
+and dropped connections can be injected, and received messages are
+captured for inspection.
+
+Point the service at it with:
+    SMTP_HOST=127.0.0.1 SMTP_PORT=2525 EMAIL_USE_TLS=false
+
+Usage:
+    python smtp_sink.py --port 2525 --latency 0.05 --fail-rate 0.01
+"""
+import sys
+import time
+import random
+import socket
+import argparse
+import threading
+import socketserver
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CapturedMessage:
+    """One message accepted by the sink"""
+    mail_from: str
+    rcpt_tos: List[str]
+    data: bytes
+    received_at: float = field(default_factory=time.time)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """One SMTP session"""
+
+    def _reply(self, line: str):
+        self.wfile.write(line.encode('ascii') + b"\r\n")
+
+    def _readline(self) -> Optional[bytes]:
+        line = self.rfile.readline(1 << 20)
+        return line.rstrip(b"\r\n") if line else None
+
+    def handle(self):
+        sink: 'SMTPSink' = self.server.sink
+        self.connection.settimeout(sink.idle_timeout)
+        sink._count('connections')
+        mail_from, rcpt_tos = None, []
+        try:
+            if sink.connect_latency:
+                time.sleep(sink.connect_latency)
+            self._reply("220 smtp-sink ESMTP ready")
+            while True:
+                line = self._readline()
+                if line is None:
+                    return
+                command, _, arg = line.decode('utf-8', 'replace').partition(' ')
+                command = command.upper()
+
+                if command == 'EHLO':
+                    self.wfile.write(b"250-smtp-sink\r\n250-8BITMIME\r\n"
+                                     b"250-SIZE 52428800\r\n250 AUTH PLAIN LOGIN\r\n")
+                elif command == 'HELO':
+                    self._reply("250 smtp-sink")
+                elif command == 'AUTH':
+                    mechanism, _, initial = arg.partition(' ')
+                    if mechanism.upper() == 'PLAIN' and not initial:
+                        self._reply("334 ")
+                        self._readline()
+                    elif mechanism.upper() == 'LOGIN':
+                        if not initial:
+                            self._reply("334 VXNlcm5hbWU6")
+                            self._readline()
+                        self._reply("334 UGFzc3dvcmQ6")
+                        self._readline()
+                    sink._count('logins')
+                    self._reply("235 2.7.0 Authentication successful")
+                elif command == 'STARTTLS':
+                    self._reply("454 4.7.0 TLS not available on the sink")
+                elif command == 'MAIL':
+                    mail_from, rcpt_tos = arg.partition(':')[2].strip(), []
+                    self._reply("250 2.1.0 OK")
+                elif command == 'RCPT':
+                    rcpt_tos.append(arg.partition(':')[2].strip())
+                    self._reply("250 2.1.5 OK")
+                elif command == 'DATA':
+                    self._reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = self._read_data()
+                    if data is None:
+                        return
+                    if not self._finish_message(sink, mail_from, rcpt_tos, data):
+                        return  # injected drop
+                    mail_from, rcpt_tos = None, []
+                elif command == 'RSET':
+                    mail_from, rcpt_tos = None, []
+                    self._reply("250 2.0.0 OK")
+                elif command == 'NOOP':
+                    self._reply("250 2.0.0 OK")
+                elif command == 'QUIT':
+                    self._reply("221 2.0.0 Bye")
+                    return
+                else:
+                    self._reply("502 5.5.2 Command not recognized")
+        except (socket.timeout, ConnectionError):
+            return
+
+    def _read_data(self) -> Optional[bytes]:
+        lines = []
+        while True:
+            line = self.rfile.readline(1 << 20)
+            if not line:
+                return None
+            if line in (b".\r\n", b".\n"):
+                return b"".join(lines)
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b"..") else line)
+
+    def _finish_message(self, sink: 'SMTPSink', mail_from, rcpt_tos, data) -> bool:
+        delay = sink.latency + (random.uniform(0, sink.jitter) if sink.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        roll = sink._rng()
+        if roll < sink.drop_rate:
+            sink._count('dropped')
+            return False
+        roll -= sink.drop_rate
+        if roll < sink.perm_fail_rate:
+            sink._count('rejected')
+            self._reply("550 5.7.1 Injected permanent failure")
+            return True
+        roll -= sink.perm_fail_rate
+        if roll < sink.fail_rate:
+            sink._count('deferred')
+            self._reply("451 4.3.0 Injected temporary failure")
+            return True
+        sink._accept(CapturedMessage(mail_from, rcpt_tos, data))
+        self._reply("250 2.0.0 Message accepted")
+        return True
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class SMTPSink:
+    """Threaded SMTP sink with latency/failure injection and message capture"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 connect_latency: float = 0.0,
+                 fail_rate: float = 0.0, perm_fail_rate: float = 0.0,
+                 drop_rate: float = 0.0, capture: bool = True,
+                 max_captured: int = 10000, idle_timeout: float = 60.0,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            host, port: Listen address (port 0 picks a free port)
+            latency: Seconds added before replying to each message
+            jitter: Extra uniform random latency up to this many seconds
+            connect_latency: Seconds before the greeting of each new
+                connection (stands in for TLS handshake + AUTH round trips)
+            fail_rate: Probability of a 451 temporary failure per message
+            perm_fail_rate: Probability of a 550 permanent failure per message
+            drop_rate: Probability of closing the connection instead of replying
+            capture: Keep accepted messages in .messages
+            max_captured: Keep at most this many (oldest dropped first)
+            idle_timeout: Close sessions idle this long (like real servers)
+            seed: Random seed for reproducible failure injection
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.connect_latency = connect_latency
+        self.fail_rate = fail_rate
+        self.perm_fail_rate = perm_fail_rate
+        self.drop_rate = drop_rate
+        self.capture = capture
+        self.max_captured = max_captured
+        self.idle_timeout = idle_timeout
+
+        self.messages: List[CapturedMessage] = []
+        self.stats = {'connections': 0, 'logins': 0, 'accepted': 0,
+                      'deferred': 0, 'rejected': 0, 'dropped': 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._server = _ThreadingSMTPServer((host, port), _SMTPHandler)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _rng(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _accept(self, message: CapturedMessage):
+        with self._lock:
+            self.stats['accepted'] += 1
+            if self.capture:
+                self.messages.append(message)
+                if len(self.messages) > self.max_captured:
+                    del self.messages[0]
+
+    def start(self) -> 'SMTPSink':
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="smtp-sink", daemon=True)
+        self._thread.start()
+        logger.info(f"SMTP sink listening on {self.address[0]}:{self.port}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local SMTP sink for EmailService testing')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2525)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per message')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random seconds per message')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='Seconds per new connection')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='451 probability')
+    parser.add_argument('--perm-fail-rate', type=float, default=0.0, help='550 probability')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Connection drop probability')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    sink = SMTPSink(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                    connect_latency=args.connect_latency,
+                    fail_rate=args.fail_rate, perm_fail_rate=args.perm_fail_rate,
+                    drop_rate=args.drop_rate, capture=False).start()
+    print(f"📭 SMTP sink on {args.host}:{sink.port} "
+          f"(SMTP_HOST={args.host} SMTP_PORT={sink.port} EMAIL_USE_TLS=false)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"   {sink.stats}")
+    except KeyboardInterrupt:
+        sink.stop()
+        print(f"\n✅ Stopped: {sink.stats}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Spatial index for attraction radius / k-nearest queries
+
+Points are bucketed into a fixed lat/lon grid; a query only touches the
+cells that can intersect the search circle and computes great-circle
+distances for those candidates (vectorized with NumPy when available).
+Results come back sorted by distance, with score breaking ties, or by a
+distance-decayed score.
+"""
+import math
+import logging
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    NUMPY = True
+except Exception:
+    NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dlat = p2 - p1
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Grid index over attraction dicts that have 'lat' and 'lon'"""
+
+    def __init__(self, items: List[Dict], cell_deg: float = 0.01):
+        """
+        Args:
+            items: Attraction dicts; items without coordinates are ignored
+            cell_deg: Grid cell size in degrees (0.01° ≈ 1.1 km of latitude)
+        """
+        self.cell_deg = cell_deg
+        self.items = [it for it in items if it.get('lat') is not None and it.get('lon') is not None]
+        self._lat = [float(it['lat']) for it in self.items]
+        self._lon = [float(it['lon']) for it in self.items]
+        self._score = [float(it.get('score') or 0) for it in self.items]
+
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, (lat, lon) in enumerate(zip(self._lat, self._lon)):
+            self._cells.setdefault(self._cell(lat, lon), []).append(i)
+
+        if NUMPY:
+            self._lat_rad = np.radians(np.asarray(self._lat, dtype=np.float64))
+            self._lon_rad = np.radians(np.asarray(self._lon, dtype=np.float64))
+            self._score_arr = np.asarray(self._score, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def centroid(self) -> Optional[Tuple[float, float]]:
+        """Mean position of all items"""
+        if not self.items:
+            return None
+        return sum(self._lat) / len(self._lat), sum(self._lon) / len(self._lon)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def _candidates(self, lat: float, lon: float, radius_m: float) -> List[int]:
+        """Indices in every cell that can intersect the circle"""
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        coslat = max(math.cos(math.radians(lat)), 1e-6)
+        dlon = min(180.0, dlat / coslat)
+        lo_y, lo_x = self._cell(lat - dlat, lon - dlon)
+        hi_y, hi_x = self._cell(lat + dlat, lon + dlon)
+
+        # Huge radius: scanning all occupied cells is cheaper than the range
+        if (hi_y - lo_y + 1) * (hi_x - lo_x + 1) > len(self._cells):
+            return [i for (y, x), idx in self._cells.items()
+                    if lo_y <= y <= hi_y and lo_x <= x <= hi_x for i in idx]
+
+        out = []
+        for y in range(lo_y, hi_y + 1):
+            for x in range(lo_x, hi_x + 1):
+                out.extend(self._cells.get((y, x), ()))
+        return out
+
+    def _distances(self, lat: float, lon: float, idx: List[int]):
+        if NUMPY:
+            idx = np.asarray(idx, dtype=np.int64)
+            p1 = math.radians(lat)
+            dlat = self._lat_rad[idx] - p1
+            dlon = self._lon_rad[idx] - math.radians(lon)
+            a = np.sin(dlat / 2) ** 2 + math.cos(p1) * np.cos(self._lat_rad[idx]) * np.sin(dlon / 2) ** 2
+            return idx, 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+        return idx, [haversine_m(lat, lon, self._lat[i], self._lon[i]) for i in idx]
+
+    def _ranked(self, idx, dist, k: Optional[int], decay_m: Optional[float]) -> List[Dict]:
+        if NUMPY:
+            if decay_m:
+                order = np.argsort(-(self._score_arr[idx] * np.exp(-dist / decay_m)), kind='stable')
+            else:
+                order = np.lexsort((-self._score_arr[idx], dist))
+            if k is not None:
+                order = order[:k]
+            pairs = [(int(idx[o]), float(dist[o])) for o in order]
+        else:
+            if decay_m:
+                key = lambda p: -self._score[p[0]] * math.exp(-p[1] / decay_m)
+            else:
+                key = lambda p: (p[1], -self._score[p[0]])
+            pairs = sorted(zip(idx, dist), key=key)[:k]
+
+        results = []
+        for i, d in pairs:
+            item = dict(self.items[i])
+            item['distance_m'] = round(d)
+            results.append(item)
+        return results
+
+    def within_radius(self, lat: float, lon: float, radius_m: float,
+                      limit: Optional[int] = None, decay_m: Optional[float] = None) -> List[Dict]:
+        """
+        Items within radius_m of (lat, lon)
+
+        Sorted by distance (score breaks ties), or by score * exp(-d/decay_m)
+        when decay_m is given. Each result carries 'distance_m'.
+        """
+        if not self.items:
+            return []
+        idx, dist = self._distances(lat, lon, self._candidates(lat, lon, radius_m))
+        if NUMPY:
+            keep = dist <= radius_m
+            idx, dist = idx[keep], dist[keep]
+        else:
+            pairs = [(i, d) for i, d in zip(idx, dist) if d <= radius_m]
+            idx, dist = [p[0] for p in pairs], [p[1] for p in pairs]
+        return self._ranked(idx, dist, limit, decay_m)
+
+    def nearest(self, lat: float, lon: float, k: int = 10,
+                max_radius_m: float = 50000) -> List[Dict]:
+        """k nearest items, searching outward up to max_radius_m"""
+        if not self.items:
+            return []
+        radius = self.cell_deg * 111320.0
+        while True:
+            idx, dist = self._distances(lat, lon, self._candidates(lat, lon, radius))
+            found = int((dist <= radius).sum()) if NUMPY else sum(1 for d in dist if d <= radius)
+            if found >= k or radius >= max_radius_m:
+                break
+            radius = min(max_radius_m, radius * 2)
+        return self.within_radius(lat, lon, radius, limit=k)
+
+    def in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Dict]:
+        """Items inside a bounding box, best score first"""
+        lo_y, lo_x = self._cell(min_lat, min_lon)
+        hi_y, hi_x = self._cell(max_lat, max_lon)
+        hits = [i for (y, x), idx in self._cells.items()
+                if lo_y <= y <= hi_y and lo_x <= x <= hi_x for i in idx
+                if min_lat <= self._lat[i] <= max_lat and min_lon <= self._lon[i] <= max_lon]
+        hits.sort(key=lambda i: -self._score[i])
+        return [dict(self.items[i]) for i in hits]
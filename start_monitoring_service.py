@@ -7,12 +7,17 @@ Usage:
     python start_monitoring_service.py              # Start in foreground
     nohup python start_monitoring_service.py &      # Start in background
     python start_monitoring_service.py --demo       # Run demo mode
+    python start_monitoring_service.py --shards 4   # Sharded flight monitoring (4 worker processes)
+    python start_monitoring_service.py --worker     # Join an existing sharded pool as one worker
+    python start_monitoring_service.py --weather-interval 0   # No severe-weather sweeps
 """
 
 import sys
+import time
 import argparse
 import signal
 import logging
+import threading
 from datetime import datetime
 
 # Setup logging
@@ -37,7 +42,35 @@ def signal_handler(sig, frame):
     sys.exit(0)
 
 
-def start_service():
+def start_weather_sweeps(interval: float):
+    """
+    Run the severe-weather sweep over upcoming trips every `interval`
+    seconds in a daemon thread; alerts land in monitoring_alerts
+    """
+    if interval <= 0:
+        return None
+    from database import get_database
+    from free_flight_monitor import WeatherMonitor
+    from weather_rules import run_severe_weather_sweep, upcoming_trips
+    
+    db = get_database()
+    weather_monitor = WeatherMonitor()
+    
+    def loop():
+        while True:
+            try:
+                run_severe_weather_sweep(db, weather_monitor, upcoming_trips(db))
+            except Exception as e:
+                logger.error(f"Severe weather sweep failed: {e}")
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name="weather-sweep", daemon=True)
+    thread.start()
+    logger.info(f"Severe weather sweep every {interval:.0f}s")
+    return thread
+
+
+def start_service(weather_interval: float = 3600):
     """Start the monitoring service"""
     print("\n" + "="*70)
     print("🚀 MYAGENT BOOKING - 24/7 SMART MONITORING SERVICE")
@@ -69,6 +102,7 @@ def start_service():
     
     # Start monitoring
     agent.start()
+    start_weather_sweeps(weather_interval)
     
     print("\n✅ Service is now running 24/7")
     print("📡 Monitoring active flights for delays, cancellations, and rebooking opportunities")
@@ -80,7 +114,6 @@ def start_service():
     # Keep the main thread alive
     try:
         while True:
-            import time
             time.sleep(60)
             
             # Print status every hour
@@ -92,6 +125,61 @@ def start_service():
         signal_handler(None, None)
 
 
+def start_sharded_service(num_shards: int, state_db: str, lease_ttl: float,
+                          weather_interval: float = 3600):
+    """
+    Run N flight monitor worker processes sharing one lease table
+    
+    Crashed workers are restarted; until then their leases expire after
+    lease_ttl seconds and the surviving workers take the flights over.
+    """
+    import multiprocessing
+    from sharded_monitor import run_worker
+    
+    print("\n" + "="*70)
+    print(f"🚀 SHARDED FLIGHT MONITORING - {num_shards} workers")
+    print(f"State DB: {state_db}")
+    print("="*70 + "\n")
+    
+    def spawn():
+        proc = multiprocessing.Process(target=run_worker, args=(state_db, lease_ttl), daemon=True)
+        proc.start()
+        return proc
+    
+    workers = [spawn() for _ in range(num_shards)]
+    # Trip-level, not per-flight: runs once in the supervisor
+    start_weather_sweeps(weather_interval)
+    
+    def shutdown(sig, frame):
+        print("\n\n🛑 Stopping monitor workers...")
+        # SIGTERM lets each worker finish its sweep and release its leases
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            proc.join(timeout=lease_ttl)
+            if proc.is_alive():
+                logger.warning(f"Worker pid={proc.pid} did not stop, killing it")
+                proc.kill()
+                proc.join()
+        print("✅ Service stopped successfully")
+        sys.exit(0)
+    
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    
+    from monitor_state import MonitorStateStore
+    store = MonitorStateStore(state_db)
+    
+    while True:
+        time.sleep(lease_ttl)
+        for i, proc in enumerate(workers):
+            if not proc.is_alive():
+                logger.warning(f"Worker pid={proc.pid} exited ({proc.exitcode}), restarting")
+                workers[i] = spawn()
+        if datetime.now().minute == 0:  # Every hour
+            logger.info(f"Leases: {store.get_lease_summary()}")
+
+
 def run_demo():
     """Run demo mode"""
     from smart_monitoring_agent import run_demo
@@ -113,10 +201,45 @@ def main():
         help='Test email notifications (provide your email)'
     )
     
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=0,
+        help='Run sharded flight monitoring with this many worker processes'
+    )
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='Run a single sharded flight monitor worker (joins existing workers)'
+    )
+    parser.add_argument(
+        '--state-db',
+        type=str,
+        default='/tmp/monitor_state.db',
+        help='Shared SQLite database for monitor state and leases'
+    )
+    parser.add_argument(
+        '--lease-ttl',
+        type=float,
+        default=30.0,
+        help='Seconds before an unrenewed worker lease can be taken over'
+    )
+    parser.add_argument(
+        '--weather-interval',
+        type=float,
+        default=3600,
+        help='Seconds between severe-weather sweeps of upcoming trips (0 disables)'
+    )
+    
     args = parser.parse_args()
     
     if args.demo:
         run_demo()
+    elif args.worker:
+        from sharded_monitor import run_worker
+        run_worker(args.state_db, args.lease_ttl)
+    elif args.shards > 0:
+        start_sharded_service(args.shards, args.state_db, args.lease_ttl, args.weather_interval)
     elif args.test_email:
         # Test email functionality
         print(f"\n📧 Testing email to: {args.test_email}")
@@ -130,7 +253,8 @@ def main():
             <h2>✅ Email Service is Working!</h2>
             <p>This is a test email from your 24/7 monitoring service.</p>
             <p>If you received this, email notifications are configured correctly.</p>
-            """
+            """,
+            queue=False  # report the real SMTP result
         )
         
         if success:
@@ -138,7 +262,7 @@ def main():
         else:
             print("❌ Failed to send test email. Check your email service configuration.")
     else:
-        start_service()
+        start_service(args.weather_interval)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+"""
+AlertDigester: alerts superseded while their group is being sent, and
+calendar deltas carried by rebooking suggestions
+"""
+from alert_digest import AlertDigester
+
+
+class DedupingEmailService:
+    """Records deliveries; like the outbox, a repeated idempotency key is accepted but not sent"""
+
+    def __init__(self):
+        self.keys = set()
+        self.delivered = []
+        self.attachments = []
+        self.during_send = None
+
+    def _deliver(self, key, message):
+        if self.during_send:
+            hook, self.during_send = self.during_send, None
+            hook()
+        if key not in self.keys:
+            self.keys.add(key)
+            self.delivered.append(message)
+        return True
+
+    def send_flight_alert(self, to_email, user_name, alert_type, flight_info, message,
+                          idempotency_key=None, **kwargs):
+        return self._deliver(idempotency_key, message)
+
+    def send_email(self, to_email, subject, html_body, attachments=None,
+                   idempotency_key=None):
+        self.attachments.append(attachments)
+        return self._deliver(idempotency_key, subject)
+
+    def send_alert_digest(self, to_email, user_name, trip_name, alerts,
+                          idempotency_key=None, attachments=None, **kwargs):
+        self.attachments.append(attachments)
+        return self._deliver(idempotency_key, [a['payload'].get('message') or a['payload']['summary']
+                                               for a in alerts])
+
+
+def _delay(digester, minutes):
+    digester.send_flight_alert('user@example.com', 'User', 'delay_high',
+                               {'flight_number': 'AF7'}, f"delay {minutes} min", trip_id=1)
+
+
+def _pending(digester):
+    conn = digester.get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM pending_alerts").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_alert_superseded_while_sending_is_delivered(tmp_path):
+    email = DedupingEmailService()
+    digester = AlertDigester(email, window=0, db_path=str(tmp_path / "digest.db"))
+
+    _delay(digester, 30)
+    email.during_send = lambda: _delay(digester, 90)
+    assert digester.flush_due() == 1
+    assert _pending(digester) == 1  # the newer alert survived the send
+
+    assert digester.flush_due() == 1
+    assert email.delivered == ["delay 30 min", "delay 90 min"]
+    assert _pending(digester) == 0
+
+
+def test_retry_of_unchanged_group_reuses_key(tmp_path):
+    email = DedupingEmailService()
+    digester = AlertDigester(email, window=0, db_path=str(tmp_path / "digest.db"))
+    _delay(digester, 30)
+
+    alerts = list(digester._claim_due(float('inf'), 'token').values())[0]
+    first = digester._idempotency_key('user@example.com', '1', alerts)
+    digester._settle('token', 'user@example.com', '1', sent=False)
+    alerts = list(digester._claim_due(float('inf'), 'token').values())[0]
+    assert digester._idempotency_key('user@example.com', '1', alerts) == first
+
+
+def _rebooking(digester, calendar_update):
+    digester.add_rebooking('user@example.com', 'User', 1, 'Rebook AF7', '<p>AF7</p>',
+                           summary='AF7 → AF9', original_flight='AF7',
+                           calendar_update=calendar_update)
+
+
+def test_rebooking_email_carries_calendar_update(tmp_path):
+    email = DedupingEmailService()
+    digester = AlertDigester(email, window=0, db_path=str(tmp_path / "digest.db"))
+    ics = b"BEGIN:VCALENDAR\r\nEND:VCALENDAR\r\n"
+
+    _rebooking(digester, ics)
+    assert digester.flush_due() == 1
+    assert email.attachments == [[{'filename': 'trip-update.ics', 'content': ics}]]
+
+    _rebooking(digester, ics)
+    _delay(digester, 30)
+    assert digester.flush_due() == 1
+    assert email.attachments[-1] == [{'filename': 'trip-update.ics', 'content': ics}]
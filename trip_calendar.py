@@ -0,0 +1,524 @@
+"""
+Trip calendar (iCalendar) generation
+
+Every action with `start`/`end`/`timezone` (as produced by the agent's JSON
+schema) becomes its own VEVENT in local time, next to the all-day depart /
+return events. One VTIMEZONE is generated per distinct IANA zone, covering
+the years the trip spans.
+
+UIDs are derived from the action (trip, type, route or title, position among
+equal actions), so a rebooked flight keeps its UID. Each event carries a
+content fingerprint; when it changes, SEQUENCE is bumped. With delta=True,
+only new, changed and removed (STATUS:CANCELLED) events are emitted, so a
+calendar client can apply a rebooking as a small update instead of a full
+re-import. Per-trip fingerprints and sequences are kept in SQLite.
+"""
+import os
+import json
+import time
+import hashlib
+import shutil
+import sqlite3
+import tempfile
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from artifact_store import artifact_key
+
+logger = logging.getLogger(__name__)
+
+# Bump when the generated calendar changes shape so stored ICS files are rebuilt
+CALENDAR_FORMAT_VERSION = 2
+
+PRODID = "-//MyAgentBooking//EN"
+UID_DOMAIN = "myagentbooking"
+DEFAULT_EVENT_DURATION = timedelta(hours=1)
+
+DEFAULT_STATE_DB = os.getenv("CALENDAR_STATE_DB", "calendar_state.db")
+
+
+@dataclass
+class CalendarEvent:
+    """One VEVENT; start/end are dates (all-day) or naive local datetimes in tzid"""
+    uid: str
+    summary: str
+    start: Union[date, datetime]
+    end: Union[date, datetime]
+    tzid: Optional[str] = None
+    location: str = ""
+    description: str = ""
+    url: str = ""
+
+    @property
+    def all_day(self) -> bool:
+        return not isinstance(self.start, datetime)
+
+    def record(self) -> Dict:
+        """What is kept of a published event (enough to cancel it later)"""
+        return {'summary': self.summary, 'start': self.start.isoformat(),
+                'end': self.end.isoformat(), 'tzid': self.tzid}
+
+    @classmethod
+    def from_record(cls, uid: str, record: Dict) -> 'CalendarEvent':
+        parse = date.fromisoformat if len(record['start']) == 10 else datetime.fromisoformat
+        return cls(uid, record['summary'], parse(record['start']), parse(record['end']),
+                   record.get('tzid'))
+
+    def fingerprint(self) -> str:
+        content = [self.summary, self.start.isoformat(), self.end.isoformat(), self.tzid,
+                   self.location, self.description, self.url]
+        return hashlib.sha1(json.dumps(content).encode('utf-8')).hexdigest()
+
+
+def _escape(text: str) -> str:
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _fold(line: str) -> str:
+    """Fold a content line at 75 octets without splitting UTF-8 characters"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current, size, limit = [], [], 0, 75
+    for char in line:
+        n = len(char.encode('utf-8'))
+        if size + n > limit:
+            parts.append("".join(current))
+            current, size, limit = [], 0, 74  # continuation lines start with a space
+        current.append(char)
+        size += n
+    parts.append("".join(current))
+    return "\r\n ".join(parts)
+
+
+def _format_offset(offset: timedelta) -> str:
+    seconds = int(offset.total_seconds())
+    sign = "+" if seconds >= 0 else "-"
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{sign}{hours:02d}{minutes:02d}" + (f"{seconds:02d}" if seconds else "")
+
+
+def _zone(tzid: Optional[str]) -> Optional[ZoneInfo]:
+    if not tzid:
+        return None
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone {tzid!r}, using floating time")
+        return None
+
+
+@lru_cache(maxsize=128)
+def vtimezone(tzid: str, first_year: int, last_year: int) -> Tuple[str, ...]:
+    """
+    VTIMEZONE lines for an IANA zone, with one STANDARD/DAYLIGHT onset per
+    UTC offset change between first_year and last_year (inclusive)
+    """
+    zone = ZoneInfo(tzid)
+    start = datetime(first_year, 1, 1, tzinfo=timezone.utc)
+    end = datetime(last_year + 1, 1, 1, tzinfo=timezone.utc)
+
+    def local(instant: datetime) -> datetime:
+        return instant.astimezone(zone)
+
+    def component(instant: datetime, offset_from: timedelta) -> List[str]:
+        at = local(instant)
+        kind = "DAYLIGHT" if at.dst() else "STANDARD"
+        onset = (instant + offset_from).replace(tzinfo=None)
+        return [f"BEGIN:{kind}",
+                f"DTSTART:{onset.strftime('%Y%m%dT%H%M%S')}",
+                f"TZOFFSETFROM:{_format_offset(offset_from)}",
+                f"TZOFFSETTO:{_format_offset(at.utcoffset())}",
+                f"TZNAME:{at.tzname()}",
+                f"END:{kind}"]
+
+    previous = local(start).utcoffset()
+    lines = ["BEGIN:VTIMEZONE", f"TZID:{tzid}"] + component(start, previous)
+    day = start
+    while day < end:
+        next_day = day + timedelta(days=1)
+        offset = local(next_day).utcoffset()
+        if offset != previous:
+            # Narrow the change down to the minute
+            low, high = day, next_day
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if local(middle).utcoffset() == previous:
+                    low = middle
+                else:
+                    high = middle
+            lines += component(high.replace(second=0, microsecond=0), previous)
+            previous = offset
+        day = next_day
+    lines.append("END:VTIMEZONE")
+    return tuple(lines)
+
+
+def _parse_time(value, zone: Optional[ZoneInfo]) -> Optional[Union[date, datetime]]:
+    """ISO date -> date, ISO datetime -> naive local datetime in `zone`"""
+    if not value:
+        return None
+    text = str(value).strip()
+    try:
+        if len(text) == 10:
+            return date.fromisoformat(text)
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None and zone is not None:
+        parsed = parsed.astimezone(zone)
+    return parsed.replace(tzinfo=None, microsecond=0)
+
+
+def trip_key_for(meta: Dict, trip_id=None) -> str:
+    """UID namespace of a trip: its trip_history id, else origin/destination"""
+    if trip_id is not None:
+        return f"trip-{trip_id}"
+    return f"{meta.get('origin_city', '')}|{meta.get('destination_city', '')}"
+
+
+def _uid(trip_key: str, *parts) -> str:
+    digest = hashlib.sha1("|".join([trip_key] + [str(p) for p in parts]).encode('utf-8')).hexdigest()
+    return f"{digest[:20]}@{UID_DOMAIN}"
+
+
+def trip_events(meta: Dict, actions: List[Dict], trip_key: str) -> List[CalendarEvent]:
+    """All-day depart/return events plus one event per timed action"""
+    events = []
+    dest = meta.get("destination_city") or "Trip"
+    for identity, field, summary in (("depart", "depart_date", f"Depart for {dest}"),
+                                     ("return", "return_date", f"Return from {dest}")):
+        day = _parse_time(meta.get(field), None)
+        if isinstance(day, datetime):
+            day = day.date()
+        if day:
+            events.append(CalendarEvent(_uid(trip_key, "trip", identity), summary,
+                                        day, day + timedelta(days=1)))
+
+    seen: Dict[tuple, int] = {}
+    for action in actions or []:
+        kind = (action.get("type") or "item").lower()
+        # A rebooked flight keeps its route and position, hence its UID
+        identity = action.get("route") if kind == "flight" and action.get("route") else action.get("title", "")
+        ordinal = seen.get((kind, identity), 0)
+        seen[(kind, identity)] = ordinal + 1
+
+        tzid = action.get("timezone") or None
+        zone = _zone(tzid)
+        start = _parse_time(action.get("start") or action.get("check_in"), zone)
+        if start is None:
+            continue
+        end = _parse_time(action.get("end") or action.get("check_out"), zone)
+        if isinstance(start, datetime):
+            if not isinstance(end, datetime) or end <= start:
+                end = start + DEFAULT_EVENT_DURATION
+        elif not end or isinstance(end, datetime) or end <= start:
+            end = start + timedelta(days=1)
+
+        notes = [str(action.get(k)) for k in ("price", "notes") if action.get(k)]
+        events.append(CalendarEvent(
+            uid=_uid(trip_key, kind, identity, ordinal),
+            summary=action.get("title") or kind.title(),
+            start=start, end=end,
+            tzid=tzid if zone is not None and isinstance(start, datetime) else None,
+            location=action.get("location") or action.get("route") or "",
+            description="\n".join(notes),
+            url=action.get("link") or "",
+        ))
+    return events
+
+
+def _event_lines(event: CalendarEvent, sequence: int, dtstamp: str,
+                 cancelled: bool = False) -> List[str]:
+    lines = ["BEGIN:VEVENT", f"UID:{event.uid}", f"DTSTAMP:{dtstamp}", f"SEQUENCE:{sequence}"]
+    if event.all_day:
+        lines += [f"DTSTART;VALUE=DATE:{event.start.strftime('%Y%m%d')}",
+                  f"DTEND;VALUE=DATE:{event.end.strftime('%Y%m%d')}"]
+    else:
+        param = f";TZID={event.tzid}" if event.tzid else ""
+        lines += [f"DTSTART{param}:{event.start.strftime('%Y%m%dT%H%M%S')}",
+                  f"DTEND{param}:{event.end.strftime('%Y%m%dT%H%M%S')}"]
+    lines.append(f"SUMMARY:{_escape(event.summary)}")
+    if event.location:
+        lines.append(f"LOCATION:{_escape(event.location)}")
+    if event.description:
+        lines.append(f"DESCRIPTION:{_escape(event.description)}")
+    if event.url:
+        lines.append(f"URL:{event.url}")
+    lines.append("STATUS:CANCELLED" if cancelled else "STATUS:CONFIRMED")
+    lines.append("END:VEVENT")
+    return lines
+
+
+def _calendar_body(meta: Dict, actions: List[Dict], trip_key: str, state: Dict[str, Dict],
+                   delta: bool, dtstamp: str,
+                   zones: Dict[str, List[int]]) -> Tuple[List[str], Dict[str, Dict]]:
+    """VEVENT lines and new state of one trip; records the years used per zone in `zones`"""
+    new_state: Dict[str, Dict] = {}
+    body: List[str] = []
+
+    def emit(event: CalendarEvent, sequence: int, cancelled: bool = False):
+        body.extend(_event_lines(event, sequence, dtstamp, cancelled))
+        if event.tzid:
+            years = zones.setdefault(event.tzid, [event.start.year, event.end.year])
+            years[0] = min(years[0], event.start.year)
+            years[1] = max(years[1], event.end.year)
+
+    for event in trip_events(meta, actions, trip_key):
+        fingerprint = event.fingerprint()
+        previous = state.get(event.uid)
+        if previous is None:
+            sequence, changed = 0, True
+        elif previous['fingerprint'] != fingerprint:
+            sequence, changed = previous['sequence'] + 1, True
+        else:
+            sequence, changed = previous['sequence'], False
+        new_state[event.uid] = {'fingerprint': fingerprint, 'sequence': sequence,
+                                'event': event.record()}
+        if delta and not changed:
+            continue
+        emit(event, sequence)
+
+    # Events that disappeared (e.g. a dropped booking) are cancelled once
+    for uid, previous in state.items():
+        if uid in new_state:
+            continue
+        if previous['fingerprint'] == 'cancelled':
+            new_state[uid] = previous
+            continue
+        sequence = previous['sequence'] + 1
+        emit(CalendarEvent.from_record(uid, previous['event']), sequence, cancelled=True)
+        new_state[uid] = {'fingerprint': 'cancelled', 'sequence': sequence, 'event': previous['event']}
+    return body, new_state
+
+
+def _calendar_head(zones: Dict[str, List[int]]) -> List[str]:
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", f"PRODID:{PRODID}",
+             "CALSCALE:GREGORIAN", "METHOD:PUBLISH"]
+    for tzid, (first_year, last_year) in sorted(zones.items()):
+        lines += vtimezone(tzid, first_year, last_year)
+    return lines
+
+
+def _encode(lines: List[str]) -> bytes:
+    return "".join(_fold(line) + "\r\n" for line in lines).encode("utf-8")
+
+
+def _dtstamp(now: Optional[datetime]) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+
+
+def build_calendar(meta: Dict, actions: List[Dict], trip_key: Optional[str] = None,
+                   state: Optional[Dict[str, Dict]] = None, delta: bool = False,
+                   now: Optional[datetime] = None) -> Tuple[bytes, Dict[str, Dict]]:
+    """
+    Build the trip calendar
+
+    Args:
+        meta, actions: Itinerary payload
+        trip_key: UID namespace (see trip_key_for)
+        state: Previous {uid: {'fingerprint', 'sequence', 'event'}} for SEQUENCE bumps
+        delta: Emit only new / changed / removed events
+        now: DTSTAMP time (default: current UTC time)
+
+    Returns:
+        (ics bytes, new state); the bytes are b"" for a delta with no changes
+    """
+    zones: Dict[str, List[int]] = {}
+    body, new_state = _calendar_body(meta, actions, trip_key or trip_key_for(meta), state or {},
+                                     delta, _dtstamp(now), zones)
+    if delta and not body:
+        return b"", new_state
+    return _encode(_calendar_head(zones) + body + ["END:VCALENDAR"]), new_state
+
+
+class MergedCalendarWriter:
+    """
+    One calendar for many trips
+
+    Events are spooled to a temporary file as trips are added (VTIMEZONEs
+    are only known once every trip is in), so memory stays flat no matter
+    how many trips are merged.
+    """
+
+    def __init__(self, now: Optional[datetime] = None, spool_bytes: int = 4 * 1024 * 1024):
+        self.dtstamp = _dtstamp(now)
+        self.zones: Dict[str, List[int]] = {}
+        self.events = 0
+        self._spool = tempfile.SpooledTemporaryFile(max_size=spool_bytes)
+
+    def add(self, meta: Dict, actions: List[Dict], trip_key: Optional[str] = None,
+            state: Optional[Dict[str, Dict]] = None) -> int:
+        """Append a trip's events (SEQUENCE from `state` when given); returns events added"""
+        body, _ = _calendar_body(meta, actions, trip_key or trip_key_for(meta), state or {},
+                                 False, self.dtstamp, self.zones)
+        self._spool.write(_encode(body))
+        added = sum(1 for line in body if line == "BEGIN:VEVENT")
+        self.events += added
+        return added
+
+    def write_to(self, out):
+        """Write the merged calendar to a binary stream"""
+        out.write(_encode(_calendar_head(self.zones)))
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, out)
+        out.write(_encode(["END:VCALENDAR"]))
+
+    def close(self):
+        self._spool.close()
+
+
+class CalendarStateStore:
+    """Per-trip event fingerprints and SEQUENCE numbers (SQLite)"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or DEFAULT_STATE_DB
+        self.init_database()
+
+    def get_connection(self):
+        """Get database connection"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Initialize calendar state table"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS calendar_events (
+            trip_key TEXT NOT NULL,
+            uid TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            sequence INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (trip_key, uid)
+        )
+        """)
+        conn.commit()
+        conn.close()
+
+    def load(self, trip_key: str) -> Dict[str, Dict]:
+        conn = self.get_connection()
+        rows = conn.execute("SELECT * FROM calendar_events WHERE trip_key = ?", (trip_key,)).fetchall()
+        conn.close()
+        return {row['uid']: {'fingerprint': row['fingerprint'], 'sequence': row['sequence'],
+                             'event': json.loads(row['event'])}
+                for row in rows}
+
+    def save(self, trip_key: str, state: Dict[str, Dict]):
+        now = time.time()
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM calendar_events WHERE trip_key = ?", (trip_key,))
+            conn.executemany("""
+            INSERT INTO calendar_events (trip_key, uid, fingerprint, sequence, event, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, [(trip_key, uid, s['fingerprint'], s['sequence'], json.dumps(s['event']), now)
+                  for uid, s in state.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def publish_trip_calendar(meta: Dict, actions: List[Dict], trip_id=None, delta: bool = False,
+                          store: Optional[CalendarStateStore] = None) -> bytes:
+    """
+    build_calendar with per-trip state: SEQUENCE continues across exports
+    and delta=True yields only what changed since the last published calendar
+    """
+    trip_key = trip_key_for(meta, trip_id)
+    if trip_id is None:
+        return build_calendar(meta, actions, trip_key, delta=delta)[0]
+    store = store or get_calendar_state_store()
+    ics, state = build_calendar(meta, actions, trip_key, state=store.load(trip_key), delta=delta)
+    store.save(trip_key, state)
+    return ics
+
+
+def _state_digest(state: Dict[str, Dict]) -> str:
+    published = sorted((uid, s['fingerprint'], s['sequence']) for uid, s in state.items())
+    return hashlib.sha1(json.dumps(published).encode('utf-8')).hexdigest()
+
+
+def stored_trip_calendar(meta: Dict, actions: List[Dict], trip_id, artifacts,
+                         store: Optional[CalendarStateStore] = None) -> bytes:
+    """
+    Full trip calendar through an artifact store
+
+    The artifact is keyed on the trip's UID namespace and the published
+    state it was built from, so a hit is only served when the state store
+    already holds exactly what that file carries; a rebooking (new
+    SEQUENCEs) or a lost state db makes it a miss, which publishes again.
+    Unsaved trips (no trip_id) are built directly and never stored.
+
+    Args:
+        meta, actions: Itinerary payload
+        trip_id: trip_history id
+        artifacts: ArtifactStore
+        store: Calendar state store (default: singleton)
+    """
+    if trip_id is None:
+        return publish_trip_calendar(meta, actions)
+    store = store or get_calendar_state_store()
+    trip_key = trip_key_for(meta, trip_id)
+    payload = {'meta': meta, 'actions': actions}
+
+    def options(state):
+        return {'format': CALENDAR_FORMAT_VERSION, 'trip_key': trip_key, 'state': _state_digest(state)}
+
+    state = store.load(trip_key)
+    if state:
+        key = artifact_key('ics', payload, options(state))
+        data = artifacts.get(key)
+        if data is not None:
+            artifacts.link_trip(trip_id, 'ics', key)
+            return data
+    ics, state = build_calendar(meta, actions, trip_key, state=state)
+    store.save(trip_key, state)
+    artifacts.put(artifact_key('ics', payload, options(state)), 'ics', ics, trip_id=trip_id)
+    return ics
+
+
+def apply_rebooking(actions: List[Dict], original_flight: str, new_flight: Dict) -> List[Dict]:
+    """
+    Copy of `actions` with the flight `original_flight` replaced by `new_flight`
+    (keeps route and position so the calendar event keeps its UID)
+    """
+    updated = []
+    for action in actions:
+        text = f"{action.get('title', '')} {action.get('notes', '')}"
+        if (action.get("type") or "").lower() == "flight" and original_flight and original_flight in text:
+            action = dict(action)
+            number = new_flight.get('flight_number', '')
+            action['title'] = f"{new_flight.get('airline', '')} {number}".strip() or action.get('title')
+            for field, key in (('start', 'departure_time'), ('end', 'arrival_time'),
+                               ('link', 'booking_link'), ('price', 'price_estimate')):
+                if new_flight.get(key):
+                    action[field] = new_flight[key]
+            action['notes'] = f"Rebooked from {original_flight}"
+        updated.append(action)
+    return updated
+
+
+# Singleton instance
+_calendar_state_store = None
+
+def get_calendar_state_store() -> CalendarStateStore:
+    """Get singleton calendar state store ($CALENDAR_STATE_DB)"""
+    global _calendar_state_store
+    if _calendar_state_store is None:
+        _calendar_state_store = CalendarStateStore()
+    return _calendar_state_store
@@ -0,0 +1,298 @@
+"""
+Columnar forecasts and vectorized severe-weather evaluation
+
+A ColumnarForecast holds one location's 3-hour forecast slots as parallel
+arrays (time, temp, precip, wind, condition code). SevereWeatherEngine
+stacks the forecasts of every location, computes rule flags for all slots
+at once, and answers "did rule X fire inside trip T's arrival window" for
+all trips with prefix sums - no per-trip Python loop over forecast dicts.
+"""
+import bisect
+import datetime
+import logging
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    NUMPY = True
+except Exception:
+    NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+
+def _slot_time(item: Dict) -> int:
+    """Epoch seconds (UTC) of a forecast slot dict"""
+    if item.get('dt'):
+        return int(item['dt'])
+    dt = datetime.datetime.strptime(item['date'], "%Y-%m-%d %H:%M:%S")
+    return int(dt.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+@dataclass
+class ColumnarForecast:
+    """Forecast slots of one location as parallel arrays"""
+    time: object  # int64 epoch seconds, ascending
+    temp: object  # °C
+    precip: object  # mm per 3h
+    wind: object  # m/s
+    code: object  # OWM condition id
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    @classmethod
+    def from_forecast_list(cls, forecasts: List[Dict]) -> 'ColumnarForecast':
+        """Build from WeatherMonitor.get_weather_forecast() output"""
+        rows = sorted(forecasts, key=_slot_time)
+        columns = (
+            [_slot_time(f) for f in rows],
+            [float(f.get('temp') or 0) for f in rows],
+            [float(f.get('precipitation') or 0) for f in rows],
+            [float(f.get('wind_speed') or 0) for f in rows],
+            [int(f.get('condition_id') or 800) for f in rows],
+        )
+        if NUMPY:
+            return cls(
+                np.asarray(columns[0], dtype=np.int64),
+                np.asarray(columns[1], dtype=np.float32),
+                np.asarray(columns[2], dtype=np.float32),
+                np.asarray(columns[3], dtype=np.float32),
+                np.asarray(columns[4], dtype=np.int16),
+            )
+        return cls(array('q', columns[0]), array('f', columns[1]), array('f', columns[2]),
+                   array('f', columns[3]), array('h', columns[4]))
+
+
+@dataclass
+class SevereWeatherThresholds:
+    """Slot-level thresholds for severe weather"""
+    wind_speed: float = 17.0  # m/s, gale force
+    precip_3h: float = 10.0  # mm per 3h, heavy rain/snow
+    heat: float = 38.0  # °C
+    cold: float = -15.0  # °C
+
+
+# name -> (severity, message template); order is the flag bit order
+RULES = [
+    ('thunderstorm', 'high', "Thunderstorms forecast in {location}"),
+    ('extreme', 'critical', "Extreme weather (tornado/squall) forecast in {location}"),
+    ('high_wind', 'high', "High winds up to {value:.0f} m/s forecast in {location}"),
+    ('heavy_precip', 'medium', "Heavy precipitation ({value:.0f} mm/3h) forecast in {location}"),
+    ('heavy_snow', 'high', "Heavy snow forecast in {location}"),
+    ('extreme_heat', 'medium', "Extreme heat ({value:.0f}°C) forecast in {location}"),
+    ('extreme_cold', 'medium', "Extreme cold ({value:.0f}°C) forecast in {location}"),
+]
+
+
+class SevereWeatherEngine:
+    """Evaluate severe-weather rules for many trips in one pass"""
+
+    def __init__(self, thresholds: Optional[SevereWeatherThresholds] = None):
+        self.thresholds = thresholds or SevereWeatherThresholds()
+
+    def _flags(self, temp, precip, wind, code):
+        """Rule flag matrix, shape (len(RULES), n_slots)"""
+        th = self.thresholds
+        return np.stack([
+            (code >= 200) & (code < 300),
+            (code == 771) | (code == 781),
+            wind >= th.wind_speed,
+            precip >= th.precip_3h,
+            (code == 602) | (code == 622),
+            temp >= th.heat,
+            temp <= th.cold,
+        ])
+
+    @staticmethod
+    def _window_value(name, temp, precip, wind, lo: int, hi: int):
+        """Worst value of the rule's measure over slots [lo, hi)"""
+        if name == 'high_wind':
+            return float(max(wind[lo:hi]))
+        if name == 'heavy_precip':
+            return float(max(precip[lo:hi]))
+        if name == 'extreme_heat':
+            return float(max(temp[lo:hi]))
+        if name == 'extreme_cold':
+            return float(min(temp[lo:hi]))
+        return None
+
+    def evaluate(self, forecasts: Dict[str, ColumnarForecast],
+                 trips: List[Dict]) -> List[Dict]:
+        """
+        Args:
+            forecasts: location -> ColumnarForecast
+            trips: dicts with trip_id, location, window_start, window_end
+                (epoch seconds; the window is [start, end))
+
+        Returns:
+            One alert dict per (trip, fired rule) with trip_id, rule,
+            severity, message, slot_time (first triggering slot) and value
+            (worst value in the window)
+        """
+        if not NUMPY:
+            return self._evaluate_python(forecasts, trips)
+
+        locations = [loc for loc in forecasts if len(forecasts[loc])]
+        if not locations or not trips:
+            return []
+
+        # Stack all locations into one set of columns
+        offsets = np.cumsum([0] + [len(forecasts[loc]) for loc in locations])
+        loc_index = {loc: i for i, loc in enumerate(locations)}
+        time = np.concatenate([forecasts[loc].time for loc in locations])
+        temp = np.concatenate([forecasts[loc].temp for loc in locations])
+        precip = np.concatenate([forecasts[loc].precip for loc in locations])
+        wind = np.concatenate([forecasts[loc].wind for loc in locations])
+        code = np.concatenate([forecasts[loc].code for loc in locations])
+
+        flags = self._flags(temp, precip, wind, code)
+        n_slots = time.shape[0]
+
+        # Prefix sums -> "any flag in [lo, hi)" per trip in O(1)
+        prefix = np.zeros((len(RULES), n_slots + 1), dtype=np.int32)
+        np.cumsum(flags, axis=1, out=prefix[:, 1:])
+
+        # First flagged slot at or after each position (n_slots = none)
+        positions = np.where(flags, np.arange(n_slots), n_slots)
+        next_flag = np.minimum.accumulate(positions[:, ::-1], axis=1)[:, ::-1]
+        next_flag = np.concatenate([next_flag, np.full((len(RULES), 1), n_slots)], axis=1)
+
+        # Trip windows -> slot ranges within their location's block
+        known = [t for t in trips if t.get('location') in loc_index]
+        if not known:
+            return []
+        trip_loc = np.array([loc_index[t['location']] for t in known])
+        starts = np.array([t['window_start'] for t in known], dtype=np.int64)
+        ends = np.array([t['window_end'] for t in known], dtype=np.int64)
+        lo = np.empty(len(known), dtype=np.int64)
+        hi = np.empty(len(known), dtype=np.int64)
+        for i, loc in enumerate(locations):
+            sel = trip_loc == i
+            if sel.any():
+                block = forecasts[loc].time
+                lo[sel] = offsets[i] + np.searchsorted(block, starts[sel], side='left')
+                hi[sel] = offsets[i] + np.searchsorted(block, ends[sel], side='left')
+
+        hits = (prefix[:, hi] - prefix[:, lo]) > 0  # (rules, trips)
+        first = next_flag[:, lo]
+
+        alerts = []
+        for rule_i, trip_i in zip(*np.nonzero(hits)):
+            name, severity, template = RULES[rule_i]
+            slot = int(first[rule_i, trip_i])
+            trip = known[trip_i]
+            value = self._window_value(name, temp, precip, wind, int(lo[trip_i]), int(hi[trip_i]))
+            alerts.append(self._alert(trip, name, severity, template, int(time[slot]), value))
+        return alerts
+
+    def _evaluate_python(self, forecasts, trips):
+        """Fallback when NumPy is unavailable (same output, slower)"""
+        th = self.thresholds
+        checks = [
+            lambda t, p, w, c: 200 <= c < 300,
+            lambda t, p, w, c: c in (771, 781),
+            lambda t, p, w, c: w >= th.wind_speed,
+            lambda t, p, w, c: p >= th.precip_3h,
+            lambda t, p, w, c: c in (602, 622),
+            lambda t, p, w, c: t >= th.heat,
+            lambda t, p, w, c: t <= th.cold,
+        ]
+        alerts = []
+        for trip in trips:
+            fc = forecasts.get(trip.get('location'))
+            if not fc:
+                continue
+            lo = bisect.bisect_left(fc.time, trip['window_start'])
+            hi = bisect.bisect_left(fc.time, trip['window_end'])
+            for rule_i, (name, severity, template) in enumerate(RULES):
+                for s in range(lo, hi):
+                    if checks[rule_i](fc.temp[s], fc.precip[s], fc.wind[s], fc.code[s]):
+                        value = self._window_value(name, fc.temp, fc.precip, fc.wind, lo, hi)
+                        alerts.append(self._alert(trip, name, severity, template, fc.time[s], value))
+                        break
+        return alerts
+
+    @staticmethod
+    def _alert(trip, name, severity, template, slot_time, value):
+        when = datetime.datetime.fromtimestamp(slot_time, datetime.timezone.utc)
+        message = template.format(location=trip['location'], value=value or 0)
+        return {
+            'trip_id': trip.get('trip_id'),
+            'location': trip['location'],
+            'rule': name,
+            'severity': severity,
+            'message': f"{message} at {when:%Y-%m-%d %H:%M} UTC",
+            'slot_time': slot_time,
+            'value': value,
+        }
+
+
+def alert_type_for(rule: str) -> str:
+    """monitoring_alerts.alert_type of a rule, e.g. 'weather_high_wind'"""
+    return f"weather_{rule}"
+
+
+def trip_arrival_window(depart_date: str, hours: int = 36) -> tuple:
+    """[start, end) epoch window covering arrival on depart_date (UTC)"""
+    day = datetime.datetime.strptime(depart_date, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    start = int(day.timestamp())
+    return start, start + hours * 3600
+
+
+def upcoming_trips(db, days: int = 5, today: Optional[datetime.date] = None) -> List[Dict]:
+    """Planned trips departing within the forecast horizon (today .. today + days)"""
+    today = today or datetime.datetime.now(datetime.timezone.utc).date()
+    first, last = today.isoformat(), (today + datetime.timedelta(days=days)).isoformat()
+    return [trip for trip in db.iter_trips(status='planned')
+            if first <= (trip.get('depart_date') or '') <= last]
+
+
+def run_severe_weather_sweep(db, weather_monitor, trips: List[Dict],
+                             engine: Optional[SevereWeatherEngine] = None) -> int:
+    """
+    Check every trip's arrival window and write new alerts to monitoring_alerts
+
+    Alerts are stored with one alert_type per rule (alert_type_for) and a
+    trip gets at most one open alert per rule, so re-running the sweep on
+    a refreshed forecast does not repeat an alert whose value or slot
+    time moved.
+
+    Args:
+        db: database.Database
+        weather_monitor: free_flight_monitor.WeatherMonitor
+        trips: trip_history rows (id, destination, depart_date)
+
+    Returns:
+        Number of alerts created
+    """
+    engine = engine or SevereWeatherEngine()
+
+    windows = []
+    for trip in trips:
+        try:
+            start, end = trip_arrival_window(trip['depart_date'])
+        except (KeyError, ValueError):
+            continue
+        windows.append({'trip_id': trip['id'], 'location': trip['destination'],
+                        'window_start': start, 'window_end': end})
+
+    raw = weather_monitor.get_weather_forecasts([w['location'] for w in windows], days=5)
+    forecasts = {loc: ColumnarForecast.from_forecast_list(f) for loc, f in raw.items() if f}
+
+    alerts = engine.evaluate(forecasts, windows)
+    if not alerts:
+        return 0
+
+    # Skip rules that already have an open alert for the trip
+    existing = db.get_unresolved_alert_types([a['trip_id'] for a in alerts], prefix='weather_')
+    new_alerts = [
+        (a['trip_id'], alert_type_for(a['rule']), a['severity'], a['message'],
+         a['severity'] in ('high', 'critical'))
+        for a in alerts if (a['trip_id'], alert_type_for(a['rule'])) not in existing
+    ]
+    db.create_alerts_bulk(new_alerts)
+    logger.info(f"Severe weather sweep: {len(trips)} trips, {len(new_alerts)} new alerts")
+    return len(new_alerts)